@@ -0,0 +1,376 @@
+import argparse
+import contextlib
+import datetime
+import json
+import logging
+import os
+import platform
+import subprocess
+import sys
+import time
+import numpy as np
+from benchmarks.synthetic import MIXES, synthetic_system
+from operations.orbit_simulation import propagate
+from utils.broadcast import encode_json
+from utils.forces import FORCE_MODES, ForceModel
+from utils.frame_protocol import FRAME_ENCODERS, DeltaEncoder, Frame, static_table
+from utils.integrators import INTEGRATORS, create_integrator
+from utils.physics import angular_momentum, total_energy
+from utils.viewport import ClientView
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SIZES = (10, 100, 1000, 10000, 100000)
+DEFAULT_CLIENTS = (1, 4, 16)
+DEFAULT_HIERARCHICAL_SIZES = (100, 1000)
+HIERARCHICAL_MAX_MASSIVE = 100
+HIERARCHICAL_DURATION = 10 * 86400
+RESULTS_DIRECTORY = "benchmarks/results"
+DT = 3600
+SCENE = {
+    "scale": 250 / 1.496e11,
+    "offset": [960.0, 480.0],
+    "pause": False,
+    "time_scale": 1,
+    "tracked_body": None,
+    "integrator": "rk4",
+    "force_mode": "direct",
+    "playback": False,
+    "time": 0.0
+}
+
+
+def relative_drift(before, after):
+    if before == 0:
+        return abs(after - before)
+    return abs(after - before) / abs(before)
+
+
+def conserved_quantities(masses, positions, velocities):
+    sources = masses > 0
+    return (total_energy(masses[sources], positions[sources], velocities[sources]),
+            angular_momentum(masses[sources], positions[sources], velocities[sources]))
+
+
+def benchmark_physics(bodies, mix, integrator_name, force_mode, budget, max_steps=1000, hybrid=False):
+    force_model = ForceModel(force_mode, test_particles=mix == "test", hybrid=hybrid)
+    masses = force_model.source_masses(bodies)
+    positions, velocities = bodies.get_state()
+    integrator = create_integrator(integrator_name)
+    started = time.perf_counter()
+    positions, velocities, _, integrator = propagate(masses, positions, velocities, DT, 1, integrator, force_model)
+    warmup = max(time.perf_counter() - started, 1e-9)
+    steps = int(min(max(budget / warmup, 1), max_steps))
+    energy, momentum = conserved_quantities(masses, positions, velocities)
+    profile = {}
+    started = time.perf_counter()
+    positions, velocities, history, _ = propagate(masses, positions, velocities, DT, steps, integrator, force_model,
+                                                  profile)
+    seconds = time.perf_counter() - started
+    final_energy, final_momentum = conserved_quantities(masses, positions, velocities)
+    return {
+        "seconds": seconds,
+        "simulated_seconds": DT * steps,
+        "steps": len(history),
+        "steps_per_second": len(history) / seconds,
+        "body_steps_per_second": len(history) * len(bodies) / seconds,
+        "simulated_seconds_per_second": DT * steps / seconds,
+        "force_evaluations": profile["force_evaluations"],
+        "force_seconds": profile["force_seconds"],
+        "kepler_bodies": profile["kepler_bodies"],
+        "sources": int(np.count_nonzero(masses)),
+        "energy_drift": relative_drift(energy, final_energy),
+        "angular_momentum_drift": relative_drift(momentum, final_momentum),
+        "finite": bool(np.isfinite(positions).all() and np.isfinite(velocities).all())
+    }
+
+
+def timed_advance(integrator, accelerate, positions, velocities, duration, dt):
+    started = time.perf_counter()
+    for _, positions, velocities in integrator.advance(accelerate, positions, velocities, duration, dt):
+        pass
+    return time.perf_counter() - started, positions, velocities
+
+
+def benchmark_hierarchical(bodies, mix, duration=HIERARCHICAL_DURATION):
+    force_model = ForceModel(test_particles=mix == "test")
+    masses = force_model.source_masses(bodies)
+    positions, velocities = bodies.get_state()
+    block = create_integrator("block")
+    block_seconds, block_positions, _ = timed_advance(block, force_model.accelerator(masses), positions, velocities,
+                                                      duration, DT)
+    fine_dt = duration / block.substeps
+    leapfrog_seconds, leapfrog_positions, _ = timed_advance(create_integrator("leapfrog"),
+                                                            force_model.accelerator(masses), positions, velocities,
+                                                            duration, fine_dt)
+    return {
+        "simulated_seconds": duration,
+        "substeps": block.substeps,
+        "leapfrog_dt": fine_dt,
+        "block_seconds": block_seconds,
+        "leapfrog_seconds": leapfrog_seconds,
+        "speedup": leapfrog_seconds / block_seconds,
+        "max_position_difference": float(np.linalg.norm(block_positions - leapfrog_positions, axis=1).max())
+    }
+
+
+def sample_frame(bodies):
+    positions, velocities = bodies.get_state()
+    return Frame(bodies.roster_version, static_table(bodies), positions, velocities, dict(SCENE),
+                 tracked_index=0, timestamp=time.monotonic(), index_of=bodies.index_of)
+
+
+def frame_encoders(bodies):
+    def delta_keyframe(frame):
+        return DeltaEncoder().encode(frame)
+
+    delta_encoder = DeltaEncoder(keyframe_interval=1 << 30)
+
+    def delta(frame):
+        return delta_encoder.encode(frame)
+
+    def culled_binary(frame):
+        view = ClientView(SCENE["scale"], SCENE["offset"])
+        return FRAME_ENCODERS["binary"](view.frame(frame))
+
+    def bodies_json(frame):
+        return encode_json(bodies.to_records())
+
+    return {
+        "json": FRAME_ENCODERS["json"],
+        "roster": FRAME_ENCODERS["roster"],
+        "binary": FRAME_ENCODERS["binary"],
+        "binary_f32": lambda frame: FRAME_ENCODERS["binary"](frame, False, True),
+        "delta_keyframe": delta_keyframe,
+        "delta": delta,
+        "culled_binary": culled_binary,
+        "bodies_json": bodies_json,
+    }
+
+
+def benchmark_encoding(bodies, budget, min_repeats=3):
+    results = []
+    for name, encoder in frame_encoders(bodies).items():
+        frame = sample_frame(bodies)
+        payload = encoder(frame)
+        repeats = 0
+        started = time.perf_counter()
+        while repeats < min_repeats or time.perf_counter() - started < budget:
+            payload = encoder(sample_frame(bodies))
+            repeats += 1
+        seconds = (time.perf_counter() - started) / repeats
+        results.append({"format": name, "seconds": seconds, "bytes": len(payload), "repeats": repeats})
+    return results
+
+
+def summarize(values):
+    if not values:
+        return {"mean": None, "p95": None, "max": None}
+    values = np.asarray(values, dtype=float)
+    return {"mean": float(values.mean()), "p95": float(np.percentile(values, 95)), "max": float(values.max())}
+
+
+def benchmark_fanout(bodies_count, clients, duration, protocol, seed):
+    import main
+    from fastapi.testclient import TestClient
+    name = f"benchmark-{os.getpid()}"
+    subprotocols = [protocol] if protocol != "json" else []
+    with TestClient(main.app) as client:
+        main.trace.resize(max(main.trace.capacity, int(duration * 40) + 100))
+        simulation = client.portal.call(main.sessions.create, name, synthetic_system(bodies_count, seed=seed))
+        try:
+            with contextlib.ExitStack() as stack:
+                sockets = [stack.enter_context(client.websocket_connect(
+                    f"/ws/simulation?session={name}&min_pixels=0&width=16384&height=16384",
+                    subprotocols=subprotocols)) for _ in range(clients)]
+                received = [0] * clients
+                received_bytes = [0] * clients
+                first_tick = simulation.clock.tick_count
+                dropped = simulation.hub.dropped_frames
+                started = time.perf_counter()
+                while time.perf_counter() - started < duration:
+                    for index, socket in enumerate(sockets):
+                        message = socket.receive()
+                        received[index] += 1
+                        received_bytes[index] += len(message.get("bytes") or message.get("text") or "")
+                elapsed = time.perf_counter() - started
+                ticks = simulation.clock.tick_count - first_tick
+                views = [view.stats() for view in simulation.views]
+            records = [record for record in main.trace.records
+                       if record["session"] == name and record["tick"] >= first_tick]
+        finally:
+            client.portal.call(main.sessions.delete, name)
+    frames = sum(view["frames"] for view in views)
+    return {
+        "seconds": elapsed,
+        "ticks": ticks,
+        "ticks_per_second": ticks / elapsed,
+        "target_ticks_per_second": 1 / simulation.clock.interval,
+        "jitter": summarize([record["jitter"] for record in records]),
+        "tick_seconds": summarize([record["tick_seconds"] for record in records]),
+        "frames_received": sum(received),
+        "frames_dropped": simulation.hub.dropped_frames - dropped,
+        "bytes_per_client_per_second": sum(received_bytes) / clients / elapsed,
+        "send_seconds_mean": sum(view["send_seconds"] for view in views) / frames if frames else None
+    }
+
+
+def environment():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    try:
+        import orjson
+        orjson_version = orjson.__version__
+    except ImportError:
+        orjson_version = None
+    return {
+        "created": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "commit": commit,
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "orjson": orjson_version,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count()
+    }
+
+
+def physics_key(case):
+    return case["mix"], case["bodies"], case["integrator"], case["force_mode"], case.get("hybrid", False)
+
+
+def encoding_key(case):
+    return case["bodies"], case["format"]
+
+
+def fanout_key(case):
+    return case["bodies"], case["clients"], case["protocol"]
+
+
+def hierarchical_key(case):
+    return case["mix"], case["bodies"]
+
+
+def compare(results, baseline):
+    comparison = []
+    sections = (("physics", physics_key, "steps_per_second", True),
+                ("encoding", encoding_key, "seconds", False),
+                ("fanout", fanout_key, "ticks_per_second", True),
+                ("hierarchical", hierarchical_key, "speedup", True))
+    for section, key, field, higher_is_better in sections:
+        previous = {key(case): case for case in baseline.get(section, []) if case.get(field)}
+        for case in results.get(section, []):
+            old = previous.get(key(case))
+            if old is None or not case.get(field):
+                continue
+            ratio = case[field] / old[field] if higher_is_better else old[field] / case[field]
+            entry = {"section": section, "case": list(key(case)), "field": field, "speedup": ratio}
+            for drift in ("energy_drift", "angular_momentum_drift"):
+                if drift in case and drift in old:
+                    entry[drift] = [old[drift], case[drift]]
+            comparison.append(entry)
+    return comparison
+
+
+def run_suite(args):
+    results = {"environment": environment(), "physics": [], "encoding": [], "fanout": [], "hierarchical": []}
+    for count in args.sizes:
+        bodies = synthetic_system(count, seed=args.seed)
+        for mix in args.mixes:
+            for integrator in args.integrators:
+                for force_mode in args.force_modes:
+                    for hybrid in (False, True) if args.hybrid and mix == "test" else (False,):
+                        case = {"mix": mix, "bodies": len(bodies), "integrator": integrator, "force_mode": force_mode,
+                                "hybrid": hybrid}
+                        if mix == "massive" and len(bodies) > args.max_massive:
+                            case["skipped"] = f"more than {args.max_massive} massive bodies"
+                        else:
+                            case.update(benchmark_physics(bodies, mix, integrator, force_mode, args.budget,
+                                                          hybrid=hybrid))
+                            logger.info(f"{mix} N={len(bodies)} {integrator}/{force_mode}"
+                                        f"{' hybrid' if hybrid else ''}: {case['steps_per_second']:.1f} steps/s, "
+                                        f"energy drift {case['energy_drift']:.2e}")
+                        results["physics"].append(case)
+        for case in benchmark_encoding(bodies, args.budget / 4):
+            case["bodies"] = len(bodies)
+            results["encoding"].append(case)
+            logger.info(f"encode N={len(bodies)} {case['format']}: "
+                        f"{case['seconds'] * 1e3:.3f} ms, {case['bytes']} bytes")
+    for count in args.hierarchical_sizes:
+        bodies = synthetic_system(count, seed=args.seed)
+        for mix in args.mixes:
+            case = {"mix": mix, "bodies": len(bodies)}
+            if mix == "massive" and len(bodies) > HIERARCHICAL_MAX_MASSIVE:
+                case["skipped"] = f"more than {HIERARCHICAL_MAX_MASSIVE} massive bodies"
+            else:
+                case.update(benchmark_hierarchical(bodies, mix))
+                logger.info(f"hierarchical {mix} N={len(bodies)}: block {case['block_seconds']:.3f}s, "
+                            f"leapfrog at dt={case['leapfrog_dt']:.0f}s {case['leapfrog_seconds']:.3f}s, "
+                            f"{case['speedup']:.2f}x")
+            results["hierarchical"].append(case)
+    if not args.skip_fanout:
+        for clients in args.clients:
+            case = {"bodies": args.fanout_bodies, "clients": clients, "protocol": args.fanout_protocol}
+            case.update(benchmark_fanout(args.fanout_bodies, clients, args.fanout_duration, args.fanout_protocol,
+                                         args.seed))
+            results["fanout"].append(case)
+            logger.info(f"fan-out N={args.fanout_bodies} K={clients}: {case['ticks_per_second']:.1f} ticks/s, "
+                        f"{case['frames_dropped']} dropped")
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark physics, frame encoding and WebSocket fan-out")
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(DEFAULT_SIZES))
+    parser.add_argument("--mixes", nargs="+", choices=MIXES, default=list(MIXES))
+    parser.add_argument("--integrators", nargs="+", choices=sorted(INTEGRATORS), default=sorted(INTEGRATORS))
+    parser.add_argument("--force-modes", nargs="+", choices=FORCE_MODES, default=list(FORCE_MODES))
+    parser.add_argument("--hybrid", action="store_true",
+                        help="also run test-particle cases with analytic Kepler propagation")
+    parser.add_argument("--budget", type=float, default=1.0, help="approximate wall seconds per case")
+    parser.add_argument("--max-massive", type=int, default=20000,
+                        help="skip all-massive systems larger than this (pairwise cost)")
+    parser.add_argument("--hierarchical-sizes", type=int, nargs="*", default=list(DEFAULT_HIERARCHICAL_SIZES),
+                        help="systems on which the block integrator must not be slower than leapfrog")
+    parser.add_argument("--clients", type=int, nargs="+", default=list(DEFAULT_CLIENTS))
+    parser.add_argument("--fanout-bodies", type=int, default=1000)
+    parser.add_argument("--fanout-duration", type=float, default=3.0)
+    parser.add_argument("--fanout-protocol", choices=("json", "solar.bin.v1", "solar.delta.v1"),
+                        default="solar.delta.v1")
+    parser.add_argument("--skip-fanout", action="store_true")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--baseline", help="earlier results file to compare against")
+    parser.add_argument("--output", help="results file (default: benchmarks/results/<timestamp>.json)")
+    args = parser.parse_args(argv)
+    if args.budget <= 0 or args.fanout_duration <= 0 or min(args.sizes + args.hierarchical_sizes) < 1 \
+            or min(args.clients) < 1:
+        parser.error("budget, durations, sizes and clients must be positive")
+    logging.basicConfig(level=logging.INFO)
+    results = run_suite(args)
+    if args.baseline:
+        with open(args.baseline, "r") as file:
+            results["comparison"] = compare(results, json.load(file))
+        for entry in results["comparison"]:
+            logger.info(f"{entry['section']} {entry['case']}: {entry['speedup']:.2f}x")
+    output = args.output
+    if output is None:
+        os.makedirs(RESULTS_DIRECTORY, exist_ok=True)
+        stamp = datetime.datetime.now().strftime("%Y%m%d-%H%M%S")
+        output = os.path.join(RESULTS_DIRECTORY, f"benchmark-{stamp}.json")
+    if output == "-":
+        json.dump(results, sys.stdout, indent=2)
+    else:
+        with open(output, "w") as file:
+            json.dump(results, file, indent=2)
+        logger.info(f"Results written to {output}")
+    slower = [case for case in results["hierarchical"] if case.get("speedup", 1.0) < 1.0]
+    for case in slower:
+        logger.error(f"Block integrator slower than leapfrog on hierarchical {case['mix']} N={case['bodies']}: "
+                     f"{case['speedup']:.2f}x")
+    if slower:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
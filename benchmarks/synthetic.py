@@ -0,0 +1,50 @@
+import json
+import numpy as np
+from utils.json_load import load_bodies_from_records
+from utils.physics import G
+from utils.trajectory import TrajectoryBuffer
+
+AU = 1.496e11
+BELT_INNER = 2.1 * AU
+BELT_OUTER = 3.3 * AU
+BELT_MASSES = (1e15, 1e20)
+BELT_RADII = (1e3, 5e5)
+MIXES = ("massive", "test")
+
+
+def synthetic_records(count, file_path="config/solar_system.json", seed=0):
+    with open(file_path, "r") as file:
+        records = json.load(file)
+    if count <= len(records):
+        return records[:count]
+    sun = next(record for record in records if record["type"] == "star")
+    rng = np.random.default_rng(seed)
+    extra = count - len(records)
+    radius = np.sqrt(rng.uniform(BELT_INNER ** 2, BELT_OUTER ** 2, extra))
+    phase = rng.uniform(0, 2 * np.pi, extra)
+    eccentric = 1 + rng.normal(0, 0.02, extra)
+    speed = np.sqrt(G * sun["mass"] / radius) * eccentric
+    directions = np.column_stack([np.cos(phase), np.sin(phase)])
+    positions = np.array(sun["position"], dtype=float) + directions * radius[:, None]
+    velocities = np.array(sun["velocity"], dtype=float) + directions[:, ::-1] * [-1, 1] * speed[:, None]
+    masses = np.exp(rng.uniform(*np.log(BELT_MASSES), extra))
+    radii = rng.uniform(*BELT_RADII, extra)
+    records = list(records)
+    for index in range(extra):
+        records.append({
+            "name": f"A{index:06d}",
+            "type": "asteroid",
+            "mass": float(masses[index]),
+            "position": positions[index].tolist(),
+            "velocity": velocities[index].tolist(),
+            "color": [128, 128, 128],
+            "radius": float(radii[index]),
+            "composition": "Synthetic"
+        })
+    return records
+
+
+def synthetic_system(count, file_path="config/solar_system.json", seed=0, trajectory_length=16):
+    records = synthetic_records(count, file_path, seed)
+    trajectories = TrajectoryBuffer(length=trajectory_length, capacity=max(len(records), 1))
+    return load_bodies_from_records(records, trajectories=trajectories)
@@ -0,0 +1,193 @@
+import numpy as np
+from entities.celestial_body import body_record
+from utils.trajectory import TrajectoryBuffer
+
+
+class BodySystem:
+    def __init__(self, bodies=(), capacity=16, trajectories=None, ephemeris=None):
+        self.bodies = []
+        self.roster_version = 0
+        self._index_by_name = {}
+        self._indices_by_type = {}
+        self.time = 0.0
+        self.trajectories = trajectories if trajectories is not None else TrajectoryBuffer(capacity=capacity)
+        self.trajectories.reserve(capacity)
+        self.ephemeris = ephemeris
+        self._masses = np.zeros(capacity)
+        self._positions = np.zeros((capacity, 2))
+        self._velocities = np.zeros((capacity, 2))
+        self._radii = np.zeros(capacity)
+        self._colors = np.zeros((capacity, 3), dtype=np.uint8)
+        self.extend(bodies)
+
+    @classmethod
+    def from_arrays(cls, bodies, masses, positions, velocities, radii=None, colors=None, trajectories=None,
+                    ephemeris=None):
+        count = len(bodies)
+        system = cls(capacity=max(count, 1), trajectories=trajectories, ephemeris=ephemeris)
+        system._masses[:count] = masses
+        system._positions[:count] = positions
+        system._velocities[:count] = velocities
+        system._radii[:count] = [body.radius for body in bodies] if radii is None else radii
+        system._colors[:count] = [body.color for body in bodies] if colors is None else colors
+        system.trajectories.heads[:count] = 0
+        system.trajectories.counts[:count] = 0
+        system.bodies = list(bodies)
+        for index, body in enumerate(system.bodies):
+            body.bind(system, index)
+        system._rebuild_index()
+        if len(system._index_by_name) != count:
+            raise ValueError("Body names must be unique")
+        system.roster_version += 1
+        if ephemeris is not None:
+            ephemeris.invalidate(system.time)
+        return system
+
+    @property
+    def masses(self):
+        return self._masses[:len(self.bodies)]
+
+    @property
+    def positions(self):
+        return self._positions[:len(self.bodies)]
+
+    @property
+    def velocities(self):
+        return self._velocities[:len(self.bodies)]
+
+    @property
+    def radii(self):
+        return self._radii[:len(self.bodies)]
+
+    @property
+    def colors(self):
+        return self._colors[:len(self.bodies)]
+
+    def __len__(self):
+        return len(self.bodies)
+
+    def __iter__(self):
+        return iter(self.bodies)
+
+    def __getitem__(self, index):
+        return self.bodies[index]
+
+    def __contains__(self, body):
+        return self.get(body.name) is body
+
+    def index_of(self, name):
+        return self._index_by_name.get(name)
+
+    def get(self, name):
+        index = self._index_by_name.get(name)
+        return None if index is None else self.bodies[index]
+
+    def indices_of_type(self, type):
+        return sorted(self._indices_by_type.get(type, ()))
+
+    def of_type(self, type):
+        return [self.bodies[index] for index in self.indices_of_type(type)]
+
+    def _rebuild_index(self):
+        self._index_by_name = {}
+        self._indices_by_type = {}
+        for index, body in enumerate(self.bodies):
+            self._index_by_name[body.name] = index
+            self._indices_by_type.setdefault(body.type, set()).add(index)
+
+    def _reserve(self, size):
+        capacity = len(self._masses)
+        if size <= capacity:
+            return
+        while capacity < size:
+            capacity *= 2
+        count = len(self.bodies)
+        masses = np.zeros(capacity)
+        positions = np.zeros((capacity, 2))
+        velocities = np.zeros((capacity, 2))
+        radii = np.zeros(capacity)
+        colors = np.zeros((capacity, 3), dtype=np.uint8)
+        masses[:count] = self.masses
+        positions[:count] = self.positions
+        velocities[:count] = self.velocities
+        radii[:count] = self.radii
+        colors[:count] = self.colors
+        self._masses = masses
+        self._positions = positions
+        self._velocities = velocities
+        self._radii = radii
+        self._colors = colors
+        self.trajectories.reserve(capacity)
+
+    def append(self, body):
+        if body.name in self._index_by_name:
+            raise ValueError(f"Body {body.name} already exists")
+        index = len(self.bodies)
+        self._reserve(index + 1)
+        self._masses[index] = body.mass
+        self._positions[index] = body.position
+        self._velocities[index] = body.velocity
+        self._radii[index] = body.radius
+        self._colors[index] = body.color
+        self.trajectories.reset(index)
+        self.bodies.append(body)
+        body.bind(self, index)
+        self._index_by_name[body.name] = index
+        self._indices_by_type.setdefault(body.type, set()).add(index)
+        self.roster_version += 1
+        if self.ephemeris is not None:
+            self.ephemeris.invalidate(self.time)
+
+    def extend(self, bodies):
+        bodies = list(bodies)
+        self._reserve(len(self.bodies) + len(bodies))
+        for body in bodies:
+            self.append(body)
+
+    def remove(self, body):
+        index = self._index_by_name.get(body.name)
+        if index is None or self.bodies[index] is not body:
+            raise ValueError(f"Body {body.name} is not in the system")
+        body.unbind()
+        del self.bodies[index]
+        count = len(self.bodies)
+        self._masses[index:count] = self._masses[index + 1:count + 1]
+        self._positions[index:count] = self._positions[index + 1:count + 1]
+        self._velocities[index:count] = self._velocities[index + 1:count + 1]
+        self._radii[index:count] = self._radii[index + 1:count + 1]
+        self._colors[index:count] = self._colors[index + 1:count + 1]
+        self.trajectories.remove(index, count + 1)
+        for i in range(index, count):
+            self.bodies[i].bind(self, i)
+        self._rebuild_index()
+        self.roster_version += 1
+        if self.ephemeris is not None:
+            self.ephemeris.invalidate(self.time)
+
+    def to_records(self, indices=None):
+        if indices is None:
+            indices = range(len(self.bodies))
+        indices = list(indices)
+        return [body_record(self.bodies[index], mass, position, velocity, color, radius)
+                for index, mass, position, velocity, color, radius in zip(
+                    indices, self.masses[indices].tolist(), self.positions[indices].tolist(),
+                    self.velocities[indices].tolist(), self.colors[indices].tolist(), self.radii[indices].tolist())]
+
+    def get_state(self):
+        return self.positions.copy(), self.velocities.copy()
+
+    def set_state(self, positions, velocities):
+        self.positions[:] = positions
+        self.velocities[:] = velocities
+
+    def commit_state(self, positions, velocities, history=()):
+        count = len(positions)
+        self._positions[:count] = positions
+        self._velocities[:count] = velocities
+        if history:
+            self.trajectories.record_many(np.stack([step_positions for _, step_positions, _ in history]),
+                                          [self.time + step_time for step_time, _, _ in history])
+        if self.ephemeris is not None:
+            self.ephemeris.record_history(self, self.time, history)
+        if history:
+            self.time += history[-1][0]
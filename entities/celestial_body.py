@@ -1,26 +1,142 @@
 import numpy as np
-import pygame
+
+
+def body_record(body, mass, position, velocity, color, radius):
+    record = {
+        "name": body.name,
+        "type": body.type,
+        "mass": mass,
+        "position": position,
+        "velocity": velocity,
+        "color": color,
+        "radius": radius
+    }
+    for field in body.FIELDS:
+        record[field] = getattr(body, field)
+    return record
+
 
 class CelestialBody:
+    __slots__ = ("name", "type", "_system", "_index", "_mass", "_position", "_velocity", "_color", "_radius")
+    FIELDS = ()
+
     def __init__(self, name, type, mass, position, velocity, color, radius):
+        self._system = None
+        self._index = None
         self.name = name
         self.type = type
-        self.mass = mass
-        self.position = np.array(position, dtype=float)
-        self.velocity = np.array(velocity, dtype=float)
-        self.color = color
-        self.radius = radius
-        self.trajectory = []
+        self._mass = float(mass)
+        self._position = np.array(position, dtype=float)
+        self._velocity = np.array(velocity, dtype=float)
+        self._color = [int(channel) for channel in color]
+        self._radius = float(radius)
+
+    @classmethod
+    def from_fields(cls, fields, mass, position, velocity):
+        body = cls.__new__(cls)
+        body._system = None
+        body._index = None
+        body.name = fields["name"]
+        body.type = fields["type"]
+        body._mass = mass
+        body._position = position
+        body._velocity = velocity
+        body._color = fields["color"]
+        body._radius = fields["radius"]
+        for field in cls.FIELDS:
+            setattr(body, field, fields[field])
+        return body
+
+    @property
+    def mass(self):
+        if self._system is None:
+            return self._mass
+        return float(self._system.masses[self._index])
+
+    @mass.setter
+    def mass(self, value):
+        if self._system is None:
+            self._mass = float(value)
+        else:
+            self._system.masses[self._index] = value
+
+    @property
+    def position(self):
+        if self._system is None:
+            return self._position
+        return self._system.positions[self._index]
+
+    @position.setter
+    def position(self, value):
+        if self._system is None:
+            self._position = np.array(value, dtype=float)
+        else:
+            self._system.positions[self._index] = value
+
+    @property
+    def velocity(self):
+        if self._system is None:
+            return self._velocity
+        return self._system.velocities[self._index]
+
+    @velocity.setter
+    def velocity(self, value):
+        if self._system is None:
+            self._velocity = np.array(value, dtype=float)
+        else:
+            self._system.velocities[self._index] = value
+
+    @property
+    def color(self):
+        if self._system is None:
+            return self._color
+        return self._system.colors[self._index].tolist()
+
+    @color.setter
+    def color(self, value):
+        if self._system is None:
+            self._color = [int(channel) for channel in value]
+        else:
+            self._system.colors[self._index] = value
+
+    @property
+    def radius(self):
+        if self._system is None:
+            return self._radius
+        return float(self._system.radii[self._index])
+
+    @radius.setter
+    def radius(self, value):
+        if self._system is None:
+            self._radius = float(value)
+        else:
+            self._system.radii[self._index] = value
+
+    def bind(self, system, index):
+        self._system = system
+        self._index = index
+        self._mass = self._position = self._velocity = self._color = self._radius = None
+
+    def unbind(self):
+        if self._system is None:
+            return
+        self._mass = self.mass
+        self._position = self.position.copy()
+        self._velocity = self.velocity.copy()
+        self._color = self.color
+        self._radius = self.radius
+        self._system = None
+        self._index = None
+
+    @property
+    def trajectory(self):
+        if self._system is None:
+            return np.empty((0, 2))
+        return self._system.trajectories.view(self._index)[0]
 
-    def update_position(self, new_position):
-        self.position = new_position
-        self.trajectory.append(self.position.copy())
+    def to_dict(self):
+        return body_record(self, self.mass, self.position.tolist(), self.velocity.tolist(), self.color, self.radius)
 
     def draw(self, screen, scale, offset, font):
-        x = int(self.position[0] * scale + offset[0])
-        y = int(self.position[1] * scale + offset[1])
-        display_radius = max(1, int(self.radius * scale * 2))
-        pygame.draw.circle(screen, self.color, (x, y), max(1, int(self.radius * scale * 2)))
-        if self.name:
-            text = font.render(self.name, True, (255,255,255))
-            screen.blit(text, (x + display_radius, y + display_radius))
\ No newline at end of file
+        from utils.pygame_frontend import draw_body
+        draw_body(self, screen, scale, offset, font)
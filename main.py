@@ -1,16 +1,31 @@
-import json
 import asyncio
+import json
 import logging
+import os
 import time
-from fastapi import FastAPI, WebSocket, HTTPException
-from fastapi.responses import HTMLResponse
+from fastapi import Depends, FastAPI, WebSocket, WebSocketDisconnect, HTTPException
+from fastapi.responses import HTMLResponse, PlainTextResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from pydantic import BaseModel
-import numpy as np
 from typing import List, Optional
-from utils.json_load import load_bodies_from_json, save_bodies_to_json
-from operations.orbit_simulation import simulate_orbits
-from utils.scene_interaction import SceneInteraction
+from utils.json_load import load_bodies_from_json
+from utils.integrators import INTEGRATORS
+from utils.forces import FORCE_MODES
+from utils.frame_protocol import DELTA_SUBPROTOCOL, SUBPROTOCOLS, DeltaEncoder
+from utils.physics_worker import PhysicsWorker
+from utils.simulation_session import (SESSION_NAME, SessionManager, SimulationSession, load_default_bodies,
+                                      new_trajectory_buffer)
+from utils.snapshot_store import SnapshotStore, load_bodies_from_snapshot
+from utils.metrics import (ACTIVE_SESSIONS, BODIES, ENCODE_SECONDS, EPHEMERIS_BYTES, FRAMES_SENT, KEPLER_BODIES,
+                           QUALITY_TIER, REGISTRY, SEND_SECONDS, SUBSCRIBERS, TRAJECTORY_BYTES, TickTrace)
+from utils.broadcast import encode_json
+from utils.events import APPROACH_RADII, EVENT_KINDS
+from utils.orbital_elements import orbit_records
+from utils.quality import QUALITY_NAMES
+from utils.viewport import MIN_PIXELS, VIEW_HEIGHT, VIEW_MARGIN, VIEW_WIDTH, ClientView
+from operations.batch_propagation import BATCH_FORMATS, BATCH_MEDIA_TYPES, propagate_samples, stream_ephemeris
+from operations.launch_ensemble import (default_offsets, ensemble_state, grid_variants, random_variants, run_ensemble,
+                                       shutdown_executor)
 from entities.spacecraft import Spacecraft
 
 logging.basicConfig(level=logging.INFO)
@@ -19,31 +34,61 @@ logger = logging.getLogger(__name__)
 app = FastAPI()
 app.mount("/static", StaticFiles(directory="static"), name="static")
 
-try:
-    bodies = load_bodies_from_json("config/solar_system.json")
-    logger.info(f"Loaded {len(bodies)} bodies from solar_system.json")
-    logger.info(f"Bodies: {[body.name for body in bodies]}")
-    sun = next((body for body in bodies if body.name.lower() == "sun"), None)
-    if sun:
-        logger.info(f"Sun position: {sun.position.tolist()}")
-    else:
-        logger.warning("Sun not found in bodies")
-except Exception as e:
-    logger.error(f"Failed to load solar_system.json: {e}")
-    bodies = []
-
-sun_position = sun.position if sun else np.array([0, 0], dtype=float)
-scene = SceneInteraction(
-    scale=250 / 1.496e11,
-    offset=np.array([960, 480], dtype=float) - sun_position * (250 / 1.496e11),
-    tracked_body="Sun" if sun else None,
-    dragging=False,
-    last_mouse_pos=(0, 0),
-    pause=False,
-    time_scale=1
-)
+MAX_PROPAGATE_SAMPLES = 100000
+MAX_PROPAGATE_STEPS = 1000000
+MAX_ENSEMBLE_VARIANTS = 10000
+MAX_ORBIT_POINTS = 1024
+SESSION_DIRECTORY = "sessions"
+EPHEMERIS_DIRECTORY = "cache/ephemeris"
+AUTOSAVE_INTERVAL = float(os.environ.get("SOLAR_AUTOSAVE_INTERVAL", 300))
+SESSION_IDLE_TIMEOUT = float(os.environ.get("SOLAR_SESSION_IDLE_TIMEOUT", 600))
+MAX_ACTIVE_SESSIONS = int(os.environ.get("SOLAR_MAX_SESSIONS", 16))
+TRACE_CAPACITY = int(os.environ.get("SOLAR_TRACE_CAPACITY", 0))
+EPHEMERIS_RECORDING = os.environ.get("SOLAR_EPHEMERIS_RECORDING", "0") == "1"
+EPHEMERIS_MAX_BYTES = int(os.environ.get("SOLAR_EPHEMERIS_MAX_BYTES", 256 << 20))
+RESOLVE_COLLISIONS = os.environ.get("SOLAR_RESOLVE_COLLISIONS", "0") == "1"
+MAX_TRACE_CAPACITY = 100000
 dt = 3600
 
+def load_default_session_bodies():
+    restore_name = os.environ.get("SOLAR_RESTORE_SNAPSHOT")
+    if restore_name:
+        snapshots = SnapshotStore(os.path.join(SESSION_DIRECTORY, "default", "snapshots"))
+        bodies = snapshots.load(restore_name, trajectories=new_trajectory_buffer())
+        if bodies is not None:
+            logger.info(f"Restored {len(bodies)} bodies from snapshot {restore_name} at t={bodies.time}")
+            return bodies
+        logger.warning(f"Snapshot {restore_name} not found, loading solar_system.json")
+    return load_default_bodies()
+
+trace = TickTrace(TRACE_CAPACITY)
+physics = PhysicsWorker(mode=os.environ.get("SOLAR_PHYSICS_MODE", "thread"),
+                        max_workers=int(os.environ.get("SOLAR_PHYSICS_WORKERS", 2)))
+sessions = SessionManager(
+    physics,
+    directory=SESSION_DIRECTORY,
+    default_loader=load_default_session_bodies,
+    idle_timeout=SESSION_IDLE_TIMEOUT,
+    max_active=MAX_ACTIVE_SESSIONS,
+    autosave_interval=AUTOSAVE_INTERVAL,
+    dt=dt,
+    cache_directory=EPHEMERIS_DIRECTORY,
+    trace=trace,
+    record_ephemeris=EPHEMERIS_RECORDING,
+    ephemeris_max_bytes=EPHEMERIS_MAX_BYTES,
+    resolve_collisions=RESOLVE_COLLISIONS
+)
+
+async def get_session(session: str = "default"):
+    try:
+        simulation = await sessions.get(session)
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Session not found")
+    except RuntimeError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    simulation.touch()
+    return simulation
+
 class BodyData(BaseModel):
     name: str
     type: str
@@ -65,6 +110,18 @@ class SceneData(BaseModel):
     offset: List[float]
     pause: bool
     time_scale: float
+    integrator: str
+    force_mode: str
+    theta: float
+    test_particles: bool
+    test_particle_mass: float
+    playback: bool
+    playback_time: float
+    playback_speed: float
+    hybrid: bool
+    kepler_tolerance: float
+    recording: bool
+    resolve_collisions: bool
     tracked_body: Optional[str] = None
 
 class SpacecraftLaunch(BaseModel):
@@ -74,66 +131,223 @@ class SpacecraftLaunch(BaseModel):
     velocity: List[float]
     radius: float
     mission: str
+    target: Optional[str] = None
+    approach_distance: Optional[float] = None
+
+class WatchRequest(BaseModel):
+    body: str
+    target: str
+    distance: Optional[float] = None
 
 class PanData(BaseModel):
     dx: float
     dy: float
 
-def bodies_to_dict(bodies):
-    return [{
-        "name": body.name,
-        "type": body.type,
-        "position": body.position.tolist(),
-        "velocity": body.velocity.tolist(),
-        "color": body.color,
-        "radius": body.radius,
-        "tail_length": getattr(body, 'tail_length', None)
-    } for body in bodies]
+class EnsembleRequest(BaseModel):
+    parent: str
+    target: str
+    duration: float
+    offsets: Optional[List[List[float]]] = None
+    velocities: List[List[float]]
+    samples: Optional[int] = None
+    seed: Optional[int] = None
+    dt: Optional[float] = None
+    integrator: Optional[str] = None
+    workers: int = 1
+
+class PropagateRequest(BaseModel):
+    duration: float
+    cadence: float = 86400
+    source: Optional[str] = None
+    format: str = "ndjson"
+    dt: Optional[float] = None
+    integrator: Optional[str] = None
+    velocities: bool = False
+
+@app.on_event("startup")
+async def start_simulation_clock():
+    physics.start()
+    sessions.start()
+    await sessions.get(sessions.default_name)
+
+@app.on_event("shutdown")
+async def stop_simulation_clock():
+    await sessions.stop()
+    physics.shutdown()
+    shutdown_executor()
+
+async def receive_view_messages(websocket, view):
+    while True:
+        message = await websocket.receive()
+        if message["type"] == "websocket.disconnect":
+            return
+        if message.get("text") is None:
+            continue
+        try:
+            view.apply(json.loads(message["text"]))
+        except (ValueError, TypeError, KeyError, AttributeError) as e:
+            logger.warning(f"Ignored view message: {e}")
+
+async def send_frame(websocket, payload, view, labels):
+    started = time.perf_counter()
+    if isinstance(payload, str):
+        await websocket.send_text(payload)
+    else:
+        await websocket.send_bytes(payload)
+    seconds = time.perf_counter() - started
+    view.record_send(seconds)
+    SEND_SECONDS.observe(seconds, labels[1:])
+    FRAMES_SENT.inc(1, labels)
 
 @app.websocket("/ws/simulation")
-async def simulation_websocket(websocket: WebSocket):
-    await websocket.accept()
+async def simulation_websocket(websocket: WebSocket, velocities: bool = True, precision: int = 64,
+                               keyframe_interval: int = 20, session: str = "default", width: int = VIEW_WIDTH,
+                               height: int = VIEW_HEIGHT, margin: int = VIEW_MARGIN, min_pixels: float = MIN_PIXELS):
+    requested = websocket.scope.get("subprotocols", [])
+    protocol = next((name for name in requested if name in SUBPROTOCOLS), None)
+    try:
+        simulation = await sessions.get(session)
+    except (KeyError, RuntimeError):
+        await websocket.close(code=4404)
+        return
+    await websocket.accept(subprotocol=protocol)
+    hub = simulation.hub
+    view = ClientView.from_scene(simulation.scene, width=max(1, width), height=max(1, height),
+                                 margin=max(0, margin), min_pixels=max(0.0, min_pixels))
+    simulation.views.add(view)
+    receiver = asyncio.create_task(receive_view_messages(websocket, view))
+    delta_encoder = DeltaEncoder(keyframe_interval=max(1, keyframe_interval),
+                                 center=tuple(view.center)) if protocol == DELTA_SUBPROTOCOL else None
+    frames = hub.subscribe()
+    event_cursor = simulation.events.next_id - 1
+    roster_version = None
+    scene_meta = None
+    labels = (simulation.name, protocol or "json")
     try:
+        await websocket.send_text(encode_json({"type": "view", "id": view.id}))
         while True:
-            start_time = time.time()
-            if not scene.pause:
-                effective_time_scale = min(scene.time_scale, 50)
-                simulate_orbits(bodies, dt, effective_time_scale)
-                for body in bodies:
-                    if hasattr(body, 'trajectory'):
-                        body.trajectory.append(body.position.copy())
-                        if len(body.trajectory) > 100:
-                            body.trajectory.pop(0)
-            if scene.tracked_body:
-                tracked_found = False
-                logger.debug(f"Available bodies: {[body.name for body in bodies]}")
-                for body in bodies:
-                    if body.name == scene.tracked_body:
-                        scene.offset[0] = 960 - body.position[0] * scene.scale
-                        scene.offset[1] = 480 - body.position[1] * scene.scale
-                        logger.debug(f"Tracking {scene.tracked_body}, offset: {scene.offset.tolist()}")
-                        tracked_found = True
-                        break
-                if not tracked_found:
-                    logger.warning(f"Tracked body {scene.tracked_body} not found")
-                    scene.tracked_body = None
-            await websocket.send_json({
-                "bodies": bodies_to_dict(bodies),
-                "scene": {
-                    "scale": scene.scale,
-                    "offset": scene.offset.tolist(),
-                    "pause": scene.pause,
-                    "time_scale": scene.time_scale,
-                    "tracked_body": scene.tracked_body
-                }
-            })
-            elapsed = time.time() - start_time
-            logger.debug(f"Simulation step took {elapsed:.3f}s")
-            await asyncio.sleep(0.05)
+            frame = await frames.get()
+            if frame is None:
+                logger.info(f"Session {simulation.name} stopped, closing WebSocket")
+                await websocket.close(code=1001)
+                break
+            if receiver.done():
+                logger.info("WebSocket client disconnected")
+                break
+            events = simulation.events.since(event_cursor)
+            if events:
+                await websocket.send_text(encode_json({"type": "events", "events": events}))
+                event_cursor = events[-1]["id"]
+            if not view.due():
+                continue
+            started = time.perf_counter()
+            frame = view.frame(frame)
+            if protocol is None:
+                await send_frame(websocket, hub.encode(frame, "json"), view, labels)
+                view.record_cost(time.perf_counter() - started)
+                continue
+            if frame.roster_version != roster_version:
+                await websocket.send_text(hub.encode(frame, "roster"))
+                roster_version = frame.roster_version
+            meta = (frame.scene["tracked_body"], frame.scene["integrator"], frame.scene["quality"])
+            if meta != scene_meta:
+                await websocket.send_text(hub.encode(frame, "scene"))
+                scene_meta = meta
+            if delta_encoder is not None:
+                started = time.perf_counter()
+                payload = delta_encoder.encode(frame)
+                ENCODE_SECONDS.observe(time.perf_counter() - started, ("delta",))
+            else:
+                payload = hub.encode(frame, "binary", velocities, precision == 32)
+            await send_frame(websocket, payload, view, labels)
+            view.record_cost(time.perf_counter() - started)
+    except WebSocketDisconnect:
+        logger.info("WebSocket client disconnected")
     except Exception as e:
         logger.error(f"WebSocket error: {e}")
-    finally:
         await websocket.close()
+    finally:
+        hub.unsubscribe(frames)
+        simulation.views.discard(view)
+        receiver.cancel()
+        simulation.touch()
+
+@app.get("/broadcast/stats")
+async def get_broadcast_stats(simulation: SimulationSession = Depends(get_session)):
+    return dict(simulation.hub.stats(), views=[view.stats() for view in simulation.views])
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    for gauge in (BODIES, KEPLER_BODIES, QUALITY_TIER, SUBSCRIBERS, TRAJECTORY_BYTES, EPHEMERIS_BYTES):
+        gauge.clear()
+    for simulation in sessions.sessions.values():
+        labels = (simulation.name,)
+        BODIES.set(len(simulation.bodies), labels)
+        KEPLER_BODIES.set(simulation.kepler_bodies, labels)
+        QUALITY_TIER.set(simulation.quality.level, labels)
+        SUBSCRIBERS.set(simulation.subscriber_count, labels)
+        TRAJECTORY_BYTES.set(simulation.bodies.trajectories.nbytes, labels)
+        EPHEMERIS_BYTES.set(simulation.ephemeris.nbytes, labels)
+    ACTIVE_SESSIONS.set(len(sessions.sessions))
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/metrics/trace")
+async def get_trace():
+    return trace.to_dict()
+
+@app.post("/metrics/trace/{capacity}")
+async def set_trace_capacity(capacity: int):
+    if not 0 <= capacity <= MAX_TRACE_CAPACITY:
+        raise HTTPException(status_code=422, detail=f"capacity must be between 0 and {MAX_TRACE_CAPACITY}")
+    trace.resize(capacity)
+    logger.info(f"Tick trace capacity set to {capacity}")
+    return {"capacity": trace.capacity}
+
+@app.get("/sessions")
+async def list_sessions():
+    return sessions.stats()
+
+@app.post("/sessions/{name}")
+async def create_session(name: str, source: Optional[str] = None, record_ephemeris: Optional[bool] = None,
+                         resolve_collisions: Optional[bool] = None):
+    if not SESSION_NAME.match(name):
+        raise HTTPException(status_code=422, detail="Session name must be 1-64 letters, digits, '-' or '_'")
+    path = os.path.join("config", os.path.basename(source or "solar_system.json"))
+    if not os.path.isfile(path):
+        raise HTTPException(status_code=404, detail="Source file not found")
+    loop = asyncio.get_running_loop()
+    try:
+        bodies = await loop.run_in_executor(
+            None, lambda: load_bodies_from_json(path, trajectories=new_trajectory_buffer()))
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=f"Invalid source file: {e}")
+    try:
+        simulation = await sessions.create(name, bodies)
+    except ValueError:
+        raise HTTPException(status_code=409, detail="Session already exists")
+    except RuntimeError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    if record_ephemeris is not None:
+        simulation.set_recording(record_ephemeris)
+    if resolve_collisions is not None:
+        simulation.set_resolve_collisions(resolve_collisions)
+    return simulation.stats()
+
+@app.post("/sessions/{name}/suspend")
+async def suspend_session(name: str):
+    try:
+        await sessions.suspend(name)
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Session not found")
+    return {"suspended": name}
+
+@app.delete("/sessions/{name}")
+async def delete_session(name: str):
+    try:
+        await sessions.delete(name)
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Session not found")
+    return {"deleted": name}
 
 @app.get("/", response_class=HTMLResponse)
 async def serve_frontend():
@@ -148,68 +362,274 @@ async def serve_frontend():
         raise HTTPException(status_code=500, detail="Error reading index.html")
 
 @app.get("/bodies", response_model=List[BodyData])
-async def get_bodies():
+async def get_bodies(simulation: SimulationSession = Depends(get_session)):
+    bodies = simulation.bodies
     logger.info(f"Returning {len(bodies)} bodies")
-    return [body.to_dict() for body in bodies]
+    return bodies.to_records()
+
+@app.delete("/bodies/{body_name}")
+async def remove_body(body_name: str, simulation: SimulationSession = Depends(get_session)):
+    bodies = simulation.bodies
+    ephemeris = simulation.ephemeris
+    body = bodies.get(body_name)
+    if body is None:
+        logger.error(f"Body {body_name} not found")
+        raise HTTPException(status_code=404, detail="Body not found")
+    bodies.remove(body)
+    simulation.events.prune(bodies)
+    ephemeris.record_state(bodies)
+    logger.info(f"Removed body: {body_name}")
+    return {"removed": body_name}
 
 @app.get("/scene", response_model=SceneData)
-async def get_scene():
+async def get_scene(simulation: SimulationSession = Depends(get_session)):
+    scene = simulation.scene
     return {
         "scale": scene.scale,
         "offset": scene.offset.tolist(),
         "pause": scene.pause,
         "time_scale": scene.time_scale,
-        "tracked_body": scene.tracked_body
+        "tracked_body": scene.tracked_body,
+        "integrator": scene.integrator,
+        "force_mode": scene.force_mode,
+        "theta": scene.theta,
+        "test_particles": scene.test_particles,
+        "test_particle_mass": scene.test_particle_mass,
+        "playback": scene.playback,
+        "playback_time": scene.playback_time,
+        "playback_speed": scene.playback_speed,
+        "hybrid": scene.hybrid,
+        "kepler_tolerance": scene.kepler_tolerance,
+        "recording": scene.recording,
+        "resolve_collisions": scene.resolve_collisions
     }
 
 @app.post("/scene/pause")
-async def toggle_pause():
+async def toggle_pause(simulation: SimulationSession = Depends(get_session)):
+    scene = simulation.scene
     scene.pause = not scene.pause
     logger.info(f"Pause toggled to {scene.pause}")
     return {"pause": scene.pause}
 
 @app.post("/scene/time_scale/{factor}")
-async def adjust_time_scale(factor: float):
+async def adjust_time_scale(factor: float, simulation: SimulationSession = Depends(get_session)):
+    scene = simulation.scene
     scene.time_scale = max(0.1, min(scene.time_scale * factor, 50))
     logger.info(f"Time scale adjusted to {scene.time_scale}")
     return {"time_scale": scene.time_scale}
 
+@app.post("/scene/integrator/{name}")
+async def set_integrator(name: str, simulation: SimulationSession = Depends(get_session)):
+    scene = simulation.scene
+    if name not in INTEGRATORS:
+        logger.error(f"Unknown integrator {name}")
+        raise HTTPException(status_code=404, detail="Integrator not found")
+    simulation.set_integrator(name)
+    logger.info(f"Integrator set to {name}")
+    return {"integrator": scene.integrator}
+
+@app.post("/scene/force_mode/{mode}")
+async def set_force_mode(mode: str, theta: Optional[float] = None, test_particles: Optional[bool] = None,
+                         test_particle_mass: Optional[float] = None, hybrid: Optional[bool] = None,
+                         kepler_tolerance: Optional[float] = None,
+                         simulation: SimulationSession = Depends(get_session)):
+    scene = simulation.scene
+    if mode not in FORCE_MODES:
+        logger.error(f"Unknown force mode {mode}")
+        raise HTTPException(status_code=404, detail="Force mode not found")
+    if theta is not None and theta <= 0:
+        raise HTTPException(status_code=422, detail="theta must be positive")
+    if test_particle_mass is not None and test_particle_mass < 0:
+        raise HTTPException(status_code=422, detail="test_particle_mass must be non-negative")
+    if kepler_tolerance is not None and kepler_tolerance <= 0:
+        raise HTTPException(status_code=422, detail="kepler_tolerance must be positive")
+    scene.force_mode = mode
+    if theta is not None:
+        scene.theta = theta
+    if test_particles is not None:
+        scene.test_particles = test_particles
+    if test_particle_mass is not None:
+        scene.test_particle_mass = test_particle_mass
+    if hybrid is not None:
+        scene.hybrid = hybrid
+    if kepler_tolerance is not None:
+        scene.kepler_tolerance = kepler_tolerance
+    simulation.update_force_model()
+    logger.info(f"Force mode set to {mode} (theta={scene.theta}, test_particles={scene.test_particles}, "
+                f"hybrid={scene.hybrid})")
+    return {
+        "force_mode": scene.force_mode,
+        "theta": scene.theta,
+        "test_particles": scene.test_particles,
+        "test_particle_mass": scene.test_particle_mass,
+        "hybrid": scene.hybrid,
+        "kepler_tolerance": scene.kepler_tolerance
+    }
+
+@app.get("/quality")
+async def get_quality(simulation: SimulationSession = Depends(get_session)):
+    return dict(simulation.quality.stats(),
+                slow_clients=sum(1 for view in simulation.views if view.frame_stride > 1))
+
+@app.post("/quality/{tier}")
+async def set_quality(tier: str, simulation: SimulationSession = Depends(get_session)):
+    if tier != "auto" and tier not in QUALITY_NAMES:
+        logger.error(f"Unknown quality tier {tier}")
+        raise HTTPException(status_code=404, detail="Quality tier not found")
+    simulation.quality.pin(None if tier == "auto" else tier)
+    simulation.apply_quality()
+    logger.info(f"Quality set to {tier}")
+    return {"tier": simulation.quality.tier["name"], "pinned": simulation.quality.pinned is not None}
+
+@app.post("/scene/seek/{epoch}")
+async def seek(epoch: float, simulation: SimulationSession = Depends(get_session)):
+    scene = simulation.scene
+    ephemeris = simulation.ephemeris
+    if ephemeris.start_time is None or not ephemeris.start_time <= epoch <= ephemeris.end_time:
+        raise HTTPException(status_code=404, detail="Epoch not cached")
+    scene.playback = True
+    scene.playback_time = epoch
+    logger.info(f"Playback seek to {epoch}")
+    return {"playback": scene.playback, "playback_time": scene.playback_time}
+
+@app.post("/scene/playback/{speed}")
+async def set_playback_speed(speed: float, simulation: SimulationSession = Depends(get_session)):
+    bodies = simulation.bodies
+    scene = simulation.scene
+    ephemeris = simulation.ephemeris
+    if ephemeris.start_time is None:
+        raise HTTPException(status_code=404, detail="Ephemeris cache is empty")
+    if not scene.playback:
+        scene.playback = True
+        scene.playback_time = bodies.time
+    scene.playback_speed = speed
+    logger.info(f"Playback speed set to {speed}")
+    return {"playback": scene.playback, "playback_time": scene.playback_time, "playback_speed": speed}
+
+@app.post("/scene/live")
+async def resume_live(simulation: SimulationSession = Depends(get_session)):
+    bodies = simulation.bodies
+    scene = simulation.scene
+    scene.playback = False
+    logger.info("Playback stopped, back to live simulation")
+    return {"playback": scene.playback, "time": bodies.time}
+
+@app.get("/ephemeris")
+async def get_ephemeris(simulation: SimulationSession = Depends(get_session)):
+    return simulation.ephemeris.stats()
+
+@app.post("/ephemeris/recording/{enabled}")
+async def set_ephemeris_recording(enabled: bool, simulation: SimulationSession = Depends(get_session)):
+    simulation.set_recording(enabled)
+    logger.info(f"Ephemeris recording set to {enabled}")
+    return {"recording": enabled, "bytes": simulation.ephemeris.nbytes, "max_bytes": simulation.ephemeris.max_bytes}
+
+@app.post("/ephemeris/precompute")
+async def precompute_ephemeris(duration: float, simulation: SimulationSession = Depends(get_session)):
+    bodies = simulation.bodies
+    scene = simulation.scene
+    ephemeris = simulation.ephemeris
+    force_model = simulation.force_model
+    if duration <= 0:
+        raise HTTPException(status_code=422, detail="duration must be positive")
+    if duration / ephemeris.cadence > MAX_PROPAGATE_SAMPLES:
+        raise HTTPException(status_code=422, detail=f"At most {MAX_PROPAGATE_SAMPLES} samples per request")
+    if duration / simulation.dt > MAX_PROPAGATE_STEPS:
+        raise HTTPException(status_code=422, detail=f"At most {MAX_PROPAGATE_STEPS} integration steps per request")
+    roster_version = bodies.roster_version
+    start_time, positions, velocities = ephemeris.resume_state(bodies)
+    masses = force_model.source_masses(bodies)
+    loop = asyncio.get_running_loop()
+    samples = await loop.run_in_executor(None, lambda: list(propagate_samples(
+        masses, positions, velocities, duration, ephemeris.cadence, simulation.dt, scene.integrator, force_model)))
+    if bodies.roster_version != roster_version:
+        raise HTTPException(status_code=409, detail="Body roster changed during precompute")
+    ephemeris.record(bodies, [start_time + elapsed for elapsed, _, _ in samples],
+                     [sample_positions for _, sample_positions, _ in samples],
+                     [sample_velocities for _, _, sample_velocities in samples])
+    logger.info(f"Ephemeris precomputed up to {ephemeris.end_time}")
+    return {"start_time": ephemeris.start_time, "end_time": ephemeris.end_time, "samples": ephemeris.samples,
+            "bytes": ephemeris.nbytes, "full": ephemeris.full}
+
+def apply_view(simulation, view_id, message):
+    view = simulation.find_view(view_id)
+    if view is None:
+        logger.error(f"View {view_id} not found")
+        raise HTTPException(status_code=404, detail="View not found")
+    try:
+        view.apply(message)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    return view
+
 @app.post("/scene/zoom/{factor}")
-async def zoom(factor: float):
+async def zoom(factor: float, view: Optional[int] = None, simulation: SimulationSession = Depends(get_session)):
+    if view is not None:
+        target = apply_view(simulation, view, {"type": "zoom", "factor": factor})
+        logger.info(f"Zoom of view {view} adjusted to scale {target.scale}")
+        return {"scale": target.scale, "scope": "view", "view": view}
+    scene = simulation.scene
     scene.scale *= factor
-    logger.info(f"Zoom adjusted to scale {scene.scale}")
-    return {"scale": scene.scale}
+    logger.info(f"Default zoom adjusted to scale {scene.scale}")
+    return {"scale": scene.scale, "scope": "defaults"}
 
 @app.post("/scene/pan")
-async def pan(data: PanData):
+async def pan(data: PanData, view: Optional[int] = None, simulation: SimulationSession = Depends(get_session)):
+    scene = simulation.scene
     logger.info(f"Pan requested: dx={data.dx}, dy={data.dy}")
     if data.dx is None or data.dy is None:
         logger.error("Invalid dx or dy values")
         raise HTTPException(status_code=422, detail="dx and dy must be numbers")
+    if view is not None:
+        target = apply_view(simulation, view, {"type": "pan", "dx": data.dx, "dy": data.dy})
+        return {"offset": target.offset.tolist(), "scope": "view", "view": view}
     scene.offset[0] += data.dx
     scene.offset[1] += data.dy
-    logger.debug(f"New offset: {scene.offset.tolist()}")
-    return {"offset": scene.offset.tolist()}
+    logger.debug(f"New default offset: {scene.offset.tolist()}")
+    return {"offset": scene.offset.tolist(), "scope": "defaults"}
 
 @app.post("/scene/track/{body_name}")
-async def track_body(body_name: str):
+async def track_body(body_name: str, view: Optional[int] = None,
+                     simulation: SimulationSession = Depends(get_session)):
+    bodies = simulation.bodies
+    scene = simulation.scene
     logger.info(f"Requested tracking for body: {body_name}")
-    for body in bodies:
-        if body.name == body_name:
-            scene.tracked_body = body_name
-            logger.info(f"Tracking set to {body_name}")
-            return {"tracked_body": scene.tracked_body}
-    logger.error(f"Body {body_name} not found")
-    raise HTTPException(status_code=404, detail="Body not found")
+    if bodies.index_of(body_name) is None:
+        logger.error(f"Body {body_name} not found")
+        raise HTTPException(status_code=404, detail="Body not found")
+    if view is not None:
+        apply_view(simulation, view, {"type": "track", "body": body_name})
+        logger.info(f"View {view} tracking set to {body_name}")
+        return {"tracked_body": body_name, "scope": "view", "view": view}
+    scene.tracked_body = body_name
+    logger.info(f"Default tracking set to {body_name}")
+    return {"tracked_body": scene.tracked_body, "scope": "defaults"}
 
 @app.post("/scene/untrack")
-async def untrack_body():
+async def untrack_body(view: Optional[int] = None, simulation: SimulationSession = Depends(get_session)):
+    if view is not None:
+        apply_view(simulation, view, {"type": "untrack"})
+        logger.info(f"View {view} tracking disabled")
+        return {"tracked_body": None, "scope": "view", "view": view}
+    scene = simulation.scene
     scene.tracked_body = None
-    logger.info("Tracking disabled")
-    return {"tracked_body": None}
+    logger.info("Default tracking disabled")
+    return {"tracked_body": None, "scope": "defaults"}
 
 @app.post("/spacecraft/launch", response_model=BodyData)
-async def launch_spacecraft(data: SpacecraftLaunch):
+async def launch_spacecraft(data: SpacecraftLaunch, simulation: SimulationSession = Depends(get_session)):
+    bodies = simulation.bodies
+    ephemeris = simulation.ephemeris
+    if bodies.index_of(data.name) is not None:
+        logger.error(f"Body {data.name} already exists")
+        raise HTTPException(status_code=409, detail="Body with this name already exists")
+    target = None
+    if data.target is not None:
+        target = bodies.get(data.target)
+        if target is None:
+            raise HTTPException(status_code=404, detail="Target not found")
+        if data.approach_distance is not None and data.approach_distance <= 0:
+            raise HTTPException(status_code=422, detail="approach_distance must be positive")
     spacecraft = Spacecraft(
         name=data.name,
         type="spacecraft",
@@ -221,63 +641,197 @@ async def launch_spacecraft(data: SpacecraftLaunch):
         mission=data.mission
     )
     bodies.append(spacecraft)
+    ephemeris.record_state(bodies)
+    if target is not None:
+        simulation.events.watch(data.name, target.name, data.approach_distance or target.radius * APPROACH_RADII)
     logger.info(f"Launched spacecraft: {data.name}")
     return spacecraft.to_dict()
 
+@app.post("/spacecraft/ensemble")
+async def launch_ensemble(data: EnsembleRequest, simulation: SimulationSession = Depends(get_session)):
+    bodies = simulation.bodies
+    scene = simulation.scene
+    force_model = simulation.force_model
+    if data.duration <= 0 or (data.dt is not None and data.dt <= 0):
+        raise HTTPException(status_code=422, detail="duration and dt must be positive")
+    parent = bodies.get(data.parent)
+    if parent is None:
+        logger.error(f"Body {data.parent} not found")
+        raise HTTPException(status_code=404, detail="Body not found")
+    launch_offsets = default_offsets(parent.radius) if data.offsets is None else data.offsets
+    if not launch_offsets or not data.velocities or \
+            any(len(vector) != 2 for vector in launch_offsets + data.velocities):
+        raise HTTPException(status_code=422, detail="offsets and velocities must be non-empty lists of 2D vectors")
+    if data.samples is not None:
+        if data.samples <= 0:
+            raise HTTPException(status_code=422, detail="samples must be positive")
+        offsets, velocities = random_variants(data.samples, launch_offsets, data.velocities, data.seed)
+    else:
+        offsets, velocities = grid_variants(launch_offsets, data.velocities)
+    if len(offsets) > MAX_ENSEMBLE_VARIANTS:
+        raise HTTPException(status_code=422, detail=f"At most {MAX_ENSEMBLE_VARIANTS} variants per request")
+    integrator_name = data.integrator or scene.integrator
+    if integrator_name not in INTEGRATORS:
+        logger.error(f"Unknown integrator {integrator_name}")
+        raise HTTPException(status_code=404, detail="Integrator not found")
+    workers = max(1, min(data.workers, os.cpu_count() or 1))
+    try:
+        state = ensemble_state(bodies, data.parent, data.target, force_model)
+    except KeyError as e:
+        logger.error(f"Body {e} not found")
+        raise HTTPException(status_code=404, detail="Body not found")
+    loop = asyncio.get_running_loop()
+    try:
+        variants = await loop.run_in_executor(
+            None, run_ensemble, state, offsets, velocities, data.duration, data.dt or simulation.dt,
+            integrator_name, force_model, workers)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    logger.info(f"Ensemble of {len(variants)} launches from {data.parent} towards {data.target} finished")
+    best = min(range(len(variants)), key=lambda row: variants[row]["closest_approach"])
+    return {"parent": data.parent, "target": data.target, "duration": data.duration, "best": best,
+            "variants": variants}
+
 @app.get("/study/atmosphere/{body_name}")
-async def study_atmosphere(body_name: str):
-    for body in bodies:
-        if body.name == body_name and body.type == "planet":
-            if hasattr(body, 'atmosphere'):
-                return {"result": f"Изучение атмосферы {body.name}: {body.atmosphere}"}
-            return {"result": f"У {body.name} нет атмосферы."}
-    raise HTTPException(status_code=404, detail="Planet not found")
+async def study_atmosphere(body_name: str, simulation: SimulationSession = Depends(get_session)):
+    bodies = simulation.bodies
+    body = bodies.get(body_name)
+    if body is None or body.type != "planet":
+        raise HTTPException(status_code=404, detail="Planet not found")
+    if hasattr(body, 'atmosphere'):
+        return {"result": f"Изучение атмосферы {body.name}: {body.atmosphere}"}
+    return {"result": f"У {body.name} нет атмосферы."}
 
 @app.get("/study/surface/{body_name}")
-async def study_surface(body_name: str):
-    for body in bodies:
-        if body.name == body_name and body.type == "planet":
-            if hasattr(body, 'surface'):
-                return {"result": f"Изучение поверхности {body.name}: {body.surface}"}
-            return {"result": f"Данные о поверхности {body.name} отсутствуют."}
-    raise HTTPException(status_code=404, detail="Planet not found")
+async def study_surface(body_name: str, simulation: SimulationSession = Depends(get_session)):
+    bodies = simulation.bodies
+    body = bodies.get(body_name)
+    if body is None or body.type != "planet":
+        raise HTTPException(status_code=404, detail="Planet not found")
+    if hasattr(body, 'surface'):
+        return {"result": f"Изучение поверхности {body.name}: {body.surface}"}
+    return {"result": f"Данные о поверхности {body.name} отсутствуют."}
 
 @app.get("/collect/data/{body_name}")
-async def collect_data(body_name: str):
-    for body in bodies:
-        if body.name == body_name:
-            result = {
-                "name": body.name,
-                "mass": body.mass,
-                "position": body.position.tolist(),
-                "velocity": body.velocity.tolist(),
-                "type": body.type
-            }
-            if hasattr(body, 'atmosphere'):
-                result["atmosphere"] = body.atmosphere
-            if hasattr(body, 'surface'):
-                result["surface"] = body.surface
-            if hasattr(body, 'temperature'):
-                result["temperature"] = body.temperature
-            if hasattr(body, 'parent_planet'):
-                result["parent_planet"] = body.parent_planet
-            if hasattr(body, 'tail_length'):
-                result["tail_length"] = body.tail_length
-            if hasattr(body, 'composition'):
-                result["composition"] = body.composition
-            if hasattr(body, 'mission'):
-                result["mission"] = body.mission
-            return result
-    raise HTTPException(status_code=404, detail="Body not found")
+async def collect_data(body_name: str, simulation: SimulationSession = Depends(get_session)):
+    bodies = simulation.bodies
+    body = bodies.get(body_name)
+    if body is None:
+        raise HTTPException(status_code=404, detail="Body not found")
+    orbit = orbit_records(bodies, [bodies.index_of(body_name)])[0]
+    del orbit["name"]
+    return dict(body.to_dict(), orbit=orbit)
+
+@app.get("/orbits")
+async def get_orbits(type: Optional[str] = None, points: int = 0,
+                     simulation: SimulationSession = Depends(get_session)):
+    if not 0 <= points <= MAX_ORBIT_POINTS:
+        raise HTTPException(status_code=422, detail=f"points must be between 0 and {MAX_ORBIT_POINTS}")
+    bodies = simulation.bodies
+    indices = None if type is None else bodies.indices_of_type(type)
+    return {"time": bodies.time, "orbits": orbit_records(bodies, indices, points)}
 
 @app.get("/trajectory/{body_name}")
-async def get_trajectory(body_name: str):
-    for body in bodies:
-        if body.name == body_name:
-            return {"trajectory": [pos.tolist() for pos in body.trajectory]}
-    raise HTTPException(status_code=404, detail="Body not found")
+async def get_trajectory(body_name: str, since: Optional[float] = None, max_points: Optional[int] = None,
+                         simulation: SimulationSession = Depends(get_session)):
+    bodies = simulation.bodies
+    index = bodies.index_of(body_name)
+    if index is None:
+        raise HTTPException(status_code=404, detail="Body not found")
+    points, times = bodies.trajectories.view(index, since, max_points)
+    return {"trajectory": points.tolist(), "times": times.tolist(), "time": bodies.time}
+
+@app.get("/events")
+async def get_events(since: int = 0, kind: Optional[str] = None, body: Optional[str] = None, limit: int = 1000,
+                     simulation: SimulationSession = Depends(get_session)):
+    if kind is not None and kind not in EVENT_KINDS:
+        raise HTTPException(status_code=422, detail=f"kind must be one of {', '.join(EVENT_KINDS)}")
+    detector = simulation.events
+    events = detector.since(since, kind, body, max(1, limit))
+    return {"events": events, "next": events[-1]["id"] if events else max(since, detector.next_id - 1)}
+
+@app.get("/events/stats")
+async def get_event_stats(simulation: SimulationSession = Depends(get_session)):
+    return simulation.events.stats()
+
+@app.post("/events/watches")
+async def add_watch(data: WatchRequest, simulation: SimulationSession = Depends(get_session)):
+    bodies = simulation.bodies
+    if bodies.get(data.body) is None or bodies.get(data.target) is None:
+        raise HTTPException(status_code=404, detail="Body not found")
+    if data.body == data.target:
+        raise HTTPException(status_code=422, detail="body and target must differ")
+    if data.distance is not None and data.distance <= 0:
+        raise HTTPException(status_code=422, detail="distance must be positive")
+    distance = data.distance or bodies.get(data.target).radius * APPROACH_RADII
+    watch = simulation.events.watch(data.body, data.target, distance)
+    return {"body": watch["body"], "target": watch["target"], "distance": watch["distance"]}
+
+@app.post("/events/resolve/{enabled}")
+async def set_collision_resolution(enabled: bool, simulation: SimulationSession = Depends(get_session)):
+    simulation.set_resolve_collisions(enabled)
+    logger.info(f"Collision resolution set to {enabled}")
+    return {"resolve_collisions": enabled}
+
+@app.delete("/events/watches/{body}/{target}")
+async def remove_watch(body: str, target: str, simulation: SimulationSession = Depends(get_session)):
+    if not simulation.events.unwatch(body, target):
+        raise HTTPException(status_code=404, detail="Watch not found")
+    return {"removed": [body, target]}
+
+@app.post("/propagate")
+async def propagate_ephemeris(data: PropagateRequest, simulation: SimulationSession = Depends(get_session)):
+    bodies = simulation.bodies
+    scene = simulation.scene
+    force_model = simulation.force_model
+    if data.duration <= 0 or data.cadence <= 0 or (data.dt is not None and data.dt <= 0):
+        raise HTTPException(status_code=422, detail="duration, cadence and dt must be positive")
+    step = data.dt or simulation.dt
+    if data.cadence < step:
+        raise HTTPException(status_code=422, detail="cadence must not be shorter than dt")
+    if data.duration / data.cadence > MAX_PROPAGATE_SAMPLES:
+        raise HTTPException(status_code=422, detail=f"At most {MAX_PROPAGATE_SAMPLES} samples per request")
+    if data.duration / step > MAX_PROPAGATE_STEPS:
+        raise HTTPException(status_code=422, detail=f"At most {MAX_PROPAGATE_STEPS} integration steps per request")
+    if data.format not in BATCH_FORMATS:
+        raise HTTPException(status_code=422, detail="Unknown output format")
+    integrator_name = data.integrator or scene.integrator
+    if integrator_name not in INTEGRATORS:
+        logger.error(f"Unknown integrator {integrator_name}")
+        raise HTTPException(status_code=404, detail="Integrator not found")
+    source = bodies
+    if data.source:
+        path = os.path.join("config", os.path.basename(data.source))
+        if not os.path.isfile(path):
+            raise HTTPException(status_code=404, detail="Source file not found")
+        try:
+            source = load_bodies_from_json(path)
+        except ValueError as e:
+            raise HTTPException(status_code=422, detail=f"Invalid source file: {e}")
+    chunks = stream_ephemeris(source, data.duration, data.cadence, step, integrator_name,
+                              force_model, data.format, data.velocities)
+    logger.info(f"Propagating {len(source)} bodies for {data.duration}s with {integrator_name}")
+    return StreamingResponse(chunks, media_type=BATCH_MEDIA_TYPES[data.format])
 
 @app.post("/save")
-async def save_state():
-    save_bodies_to_json("config/solar_system_state.json", bodies)
-    return {"message": "State saved successfully"}
+async def save_state(simulation: SimulationSession = Depends(get_session)):
+    entry = await simulation.snapshots.save_async(simulation.bodies)
+    logger.info(f"Saved snapshot {entry['file']}")
+    return {"message": "State saved successfully", "snapshot": entry}
+
+@app.get("/snapshots")
+async def get_snapshots(simulation: SimulationSession = Depends(get_session)):
+    return simulation.snapshots.stats()
+
+@app.post("/restore/{name}")
+async def restore_snapshot(name: str, simulation: SimulationSession = Depends(get_session)):
+    bodies = simulation.bodies
+    path = simulation.snapshots.path_of(name)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Snapshot not found")
+    loop = asyncio.get_running_loop()
+    restored = await loop.run_in_executor(
+        None, lambda: load_bodies_from_snapshot(path, trajectories=new_trajectory_buffer()))
+    simulation.replace_bodies(restored)
+    logger.info(f"Restored {len(restored)} bodies from {path} at t={restored.time} in session {simulation.name}")
+    return {"restored": os.path.basename(path), "time": restored.time, "bodies": len(restored)}
@@ -0,0 +1,104 @@
+import argparse
+import json
+import struct
+import sys
+import numpy as np
+from operations.orbit_simulation import propagate
+from utils.broadcast import encode_json
+from utils.forces import FORCE_MODES, ForceModel
+from utils.integrators import INTEGRATORS, create_integrator
+from utils.json_load import load_bodies_from_json
+
+BATCH_FORMATS = ("ndjson", "binary")
+BATCH_MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "binary": "application/octet-stream",
+}
+PREAMBLE = struct.Struct("<I")
+SAMPLE_HEADER = struct.Struct("<d")
+
+
+def propagate_samples(source_masses, positions, velocities, duration, cadence, dt=3600, integrator="rk4",
+                      force_model=None):
+    if isinstance(integrator, str):
+        integrator = create_integrator(integrator)
+    elapsed = 0.0
+    yield elapsed, positions, velocities
+    while elapsed < duration * (1 - 1e-12):
+        interval = min(cadence, duration - elapsed)
+        positions, velocities, _, integrator = propagate(
+            source_masses, positions, velocities, dt, interval / dt, integrator, force_model, record=False)
+        elapsed += interval
+        yield elapsed, positions, velocities
+
+
+def encode_ndjson(names, samples, start_time=0.0, velocities=False):
+    yield encode_json({"type": "roster", "bodies": names, "start_time": start_time}) + "\n"
+    for elapsed, positions, sample_velocities in samples:
+        record = {"time": start_time + elapsed, "positions": positions.tolist()}
+        if velocities:
+            record["velocities"] = sample_velocities.tolist()
+        yield encode_json(record) + "\n"
+
+
+def encode_binary(names, samples, start_time=0.0, velocities=False):
+    roster = json.dumps({"bodies": names, "start_time": start_time, "velocities": velocities}).encode()
+    yield PREAMBLE.pack(len(roster)) + roster
+    for elapsed, positions, sample_velocities in samples:
+        parts = [SAMPLE_HEADER.pack(start_time + elapsed), np.ascontiguousarray(positions, dtype="<f8").tobytes()]
+        if velocities:
+            parts.append(np.ascontiguousarray(sample_velocities, dtype="<f8").tobytes())
+        yield b"".join(parts)
+
+
+BATCH_ENCODERS = {
+    "ndjson": encode_ndjson,
+    "binary": encode_binary,
+}
+
+
+def stream_ephemeris(bodies, duration, cadence, dt=3600, integrator="rk4", force_model=None, fmt="ndjson",
+                     velocities=False):
+    if fmt not in BATCH_ENCODERS:
+        raise ValueError(f"Unknown output format: {fmt}")
+    force_model = force_model or ForceModel()
+    positions, initial_velocities = bodies.get_state()
+    samples = propagate_samples(force_model.source_masses(bodies), positions, initial_velocities,
+                                duration, cadence, dt, integrator, force_model)
+    return BATCH_ENCODERS[fmt]([body.name for body in bodies], samples, bodies.time, velocities)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Propagate a body system headlessly and write sampled ephemerides")
+    parser.add_argument("file", nargs="?", default="config/solar_system.json")
+    parser.add_argument("--duration", type=float, required=True, help="simulated seconds")
+    parser.add_argument("--cadence", type=float, default=86400, help="seconds between output samples")
+    parser.add_argument("--dt", type=float, default=3600)
+    parser.add_argument("--integrator", choices=sorted(INTEGRATORS), default="rk4")
+    parser.add_argument("--force-mode", choices=FORCE_MODES, default="direct")
+    parser.add_argument("--theta", type=float, default=0.5)
+    parser.add_argument("--format", choices=BATCH_FORMATS, default="ndjson")
+    parser.add_argument("--velocities", action="store_true")
+    parser.add_argument("--output", default="-")
+    args = parser.parse_args(argv)
+    if args.duration <= 0 or args.cadence <= 0 or args.dt <= 0:
+        parser.error("duration, cadence and dt must be positive")
+    if args.cadence < args.dt:
+        parser.error("cadence must not be shorter than dt")
+    bodies = load_bodies_from_json(args.file)
+    chunks = stream_ephemeris(bodies, args.duration, args.cadence, args.dt, args.integrator,
+                              ForceModel(args.force_mode, args.theta), args.format, args.velocities)
+    binary = args.format == "binary"
+    if args.output == "-":
+        output = sys.stdout.buffer if binary else sys.stdout
+        for chunk in chunks:
+            output.write(chunk)
+        output.flush()
+    else:
+        with open(args.output, "wb" if binary else "w") as output:
+            for chunk in chunks:
+                output.write(chunk)
+
+
+if __name__ == "__main__":
+    main()
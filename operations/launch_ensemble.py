@@ -0,0 +1,186 @@
+import itertools
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from utils.events import closest_approach
+from utils.forces import ForceModel
+from utils.integrators import create_integrator
+from utils.orbital_elements import elements_about_attractors
+from utils.physics import CHUNK_ELEMENTS
+
+ELEMENT_FIELDS = ("semi_major_axis", "eccentricity", "periapsis", "apoapsis", "period")
+LAUNCH_ALTITUDE = 2e5
+ENSEMBLE_WORKERS = os.cpu_count() or 1
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def shared_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(max_workers=ENSEMBLE_WORKERS)
+        return _executor
+
+
+def shutdown_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=True, cancel_futures=True)
+            _executor = None
+
+
+def default_offsets(radius, altitude=LAUNCH_ALTITUDE):
+    return [[radius + altitude, 0.0]]
+
+
+def grid_variants(offsets, velocities):
+    pairs = list(itertools.product(offsets, velocities))
+    return (np.array([offset for offset, _ in pairs], dtype=float).reshape(-1, 2),
+            np.array([velocity for _, velocity in pairs], dtype=float).reshape(-1, 2))
+
+
+def random_variants(count, offsets, velocities, seed=None):
+    rng = np.random.default_rng(seed)
+    offsets = np.asarray(offsets, dtype=float).reshape(-1, 2)
+    velocities = np.asarray(velocities, dtype=float).reshape(-1, 2)
+    return (rng.uniform(offsets.min(axis=0), offsets.max(axis=0), size=(count, 2)),
+            rng.uniform(velocities.min(axis=0), velocities.max(axis=0), size=(count, 2)))
+
+
+def first_contacts(start, end, body_start, body_end, contact):
+    hit = np.full(len(start), -1)
+    when = np.ones(len(start))
+    if len(body_start) == 0:
+        return hit, when
+    chunk = max(1, CHUNK_ELEMENTS // len(body_start))
+    for first in range(0, len(start), chunk):
+        rows = slice(first, first + chunk)
+        fraction, distance = closest_approach(start[rows, np.newaxis] - body_start,
+                                              end[rows, np.newaxis] - body_end)
+        fraction = np.where(distance <= contact, fraction, np.inf)
+        column = fraction.argmin(axis=1)
+        found = np.isfinite(fraction[np.arange(len(column)), column])
+        hit[rows][found] = column[found]
+        when[rows][found] = fraction[found, column[found]]
+    return hit, when
+
+
+def propagate_probes(source_masses, radii, positions, velocities, probe_positions, probe_velocities, target,
+                     duration, dt=3600, integrator="rk4", force_model=None):
+    force_model = force_model or ForceModel()
+    count = len(positions)
+    probes = np.arange(count, count + len(probe_positions))
+    massive = np.flatnonzero(np.asarray(source_masses) > 0)
+    contact = np.asarray(radii, dtype=float)[massive]
+    masses = np.concatenate([source_masses, np.zeros(len(probes))])
+    positions = np.concatenate([positions, probe_positions])
+    velocities = np.concatenate([velocities, probe_velocities])
+    accelerate = force_model.accelerator(masses)
+    integrator = create_integrator(integrator) if isinstance(integrator, str) else integrator
+    closest = np.linalg.norm(positions[probes] - positions[target], axis=1)
+    closest_time = np.zeros(len(probes))
+    impact = np.full(len(probes), -1)
+    impact_time = np.full(len(probes), np.nan)
+    final_positions = np.zeros((len(probes), 2))
+    final_velocities = np.zeros((len(probes), 2))
+    flying = np.arange(len(probes))
+    elapsed = 0.0
+    previous, previous_velocities = positions, velocities
+    for h, positions, velocities in integrator.advance(accelerate, positions, velocities, duration, dt):
+        rows = probes[flying]
+        start, end = previous[rows], positions[rows]
+        fraction, distance = closest_approach(start - previous[target], end - positions[target])
+        closer = distance < closest[flying]
+        closest[flying[closer]] = distance[closer]
+        closest_time[flying[closer]] = elapsed + fraction[closer] * h
+        hit, when = first_contacts(start, end, previous[massive], positions[massive], contact)
+        landed = hit >= 0
+        if landed.any():
+            stopped = flying[landed]
+            impact[stopped] = massive[hit[landed]]
+            impact_time[stopped] = elapsed + when[landed] * h
+            final_positions[stopped] = start[landed] + when[landed, np.newaxis] * (end[landed] - start[landed])
+            final_velocities[stopped] = previous_velocities[rows[landed]] + when[landed, np.newaxis] * (
+                velocities[rows[landed]] - previous_velocities[rows[landed]])
+            flying = flying[~landed]
+        elapsed += h
+        previous, previous_velocities = positions, velocities
+    final_positions[flying] = positions[probes[flying]]
+    final_velocities[flying] = velocities[probes[flying]]
+    elements = elements_about_attractors(masses, positions, velocities, probes)
+    return {
+        "closest_approach": closest,
+        "closest_approach_time": closest_time,
+        "impact": impact,
+        "impact_time": impact_time,
+        "final_positions": final_positions,
+        "final_velocities": final_velocities,
+        "attractor": elements["attractor"],
+        **{field: elements[field] for field in ELEMENT_FIELDS}
+    }
+
+
+def ensemble_state(bodies, parent, target, force_model=None):
+    parent_index = bodies.index_of(parent)
+    target_index = bodies.index_of(target)
+    if parent_index is None or target_index is None:
+        raise KeyError(parent if parent_index is None else target)
+    force_model = force_model or ForceModel()
+    positions, velocities = bodies.get_state()
+    return {
+        "names": [body.name for body in bodies],
+        "source_masses": force_model.source_masses(bodies),
+        "radii": bodies.radii.copy(),
+        "positions": positions,
+        "velocities": velocities,
+        "parent": parent_index,
+        "target": target_index
+    }
+
+
+def run_ensemble(state, offsets, velocities, duration, dt=3600, integrator="rk4", force_model=None, workers=1):
+    names = state["names"]
+    parent_index = state["parent"]
+    target_index = state["target"]
+    radii = state["radii"]
+    if (np.linalg.norm(offsets, axis=1) <= radii[parent_index]).any():
+        raise ValueError(f"Launch offsets must lie outside {names[parent_index]} "
+                         f"(radius {radii[parent_index]:.0f} m)")
+    force_model = force_model or ForceModel()
+    source_masses = state["source_masses"]
+    positions, body_velocities = state["positions"], state["velocities"]
+    probe_positions = positions[parent_index] + offsets
+    probe_velocities = body_velocities[parent_index] + velocities
+    chunks = [chunk for chunk in np.array_split(np.arange(len(offsets)), max(1, workers)) if len(chunk)]
+    arguments = [(source_masses, radii, positions, body_velocities, probe_positions[chunk], probe_velocities[chunk],
+                  target_index, duration, dt, integrator, force_model) for chunk in chunks]
+    if len(chunks) > 1:
+        results = list(shared_executor().map(propagate_probes, *zip(*arguments)))
+    else:
+        results = [propagate_probes(*arguments[0])] if chunks else []
+    variants = []
+    for result, chunk in zip(results, chunks):
+        for row, variant in enumerate(chunk):
+            attractor = int(result["attractor"][row])
+            impact = int(result["impact"][row])
+            entry = {
+                "offset": offsets[variant].tolist(),
+                "velocity": velocities[variant].tolist(),
+                "closest_approach": float(result["closest_approach"][row]),
+                "closest_approach_time": float(result["closest_approach_time"][row]),
+                "impact": impact >= 0,
+                "impact_body": names[impact] if impact >= 0 else None,
+                "impact_time": float(result["impact_time"][row]) if impact >= 0 else None,
+                "final_position": result["final_positions"][row].tolist(),
+                "final_velocity": result["final_velocities"][row].tolist(),
+                "attractor": names[attractor] if impact < 0 and 0 <= attractor < len(names) else None
+            }
+            for field in ELEMENT_FIELDS:
+                value = float(result[field][row])
+                entry[field] = value if np.isfinite(value) and entry["attractor"] else None
+            variants.append(entry)
+    return variants
@@ -1,5 +1,88 @@
-from utils.physics import rk4_step
+import collections
+import time
+import numpy as np
+from utils.integrators import create_integrator
+from utils.forces import ForceModel
+from utils.orbital_elements import kepler_bodies, kepler_propagate
+from utils.physics import CHUNK_ELEMENTS
 
-def simulate_orbits(bodies, dt, time_scale):
-    for _ in range(int(time_scale)):
-        rk4_step(bodies, dt)
\ No newline at end of file
+def propagate(source_masses, positions, velocities, dt, time_scale, integrator="rk4", force_model=None,
+              profile=None, record=True, timescales=False):
+    started = time.perf_counter()
+    if isinstance(integrator, str):
+        integrator = create_integrator(integrator)
+    force_model = force_model or ForceModel()
+    accelerate = force_model.accelerator(source_masses)
+    duration = dt * time_scale
+    history = collections.deque(maxlen=None if record else 1)
+    elapsed = 0.0
+    steps = 0
+    kepler = ()
+    min_timescale = np.inf
+    if force_model.hybrid:
+        kepler, attractors, mu = kepler_bodies(accelerate, source_masses, positions, velocities,
+                                               force_model.kepler_tolerance)
+    if len(kepler):
+        integrated = np.ones(len(positions), dtype=bool)
+        integrated[kepler] = False
+        integrated = np.flatnonzero(integrated)
+        relative_positions = positions[kepler] - positions[attractors]
+        relative_velocities = velocities[kepler] - velocities[attractors]
+        attractors = np.searchsorted(integrated, attractors)
+        classifier = accelerate
+        accelerate = force_model.accelerator(np.asarray(source_masses)[integrated])
+        accelerate.evaluations, accelerate.seconds = classifier.evaluations, classifier.seconds
+        if timescales:
+            min_timescale = accelerate.timescales(positions[integrated]).min(initial=np.inf)
+        integrated_steps = collections.deque(maxlen=history.maxlen)
+        for h, step_positions, step_velocities in integrator.advance(
+                accelerate, positions[integrated], velocities[integrated], duration, dt):
+            elapsed += h
+            steps += 1
+            integrated_steps.append((elapsed, step_positions, step_velocities))
+        integrated_steps = list(integrated_steps)
+        chunk = max(1, CHUNK_ELEMENTS // len(kepler))
+        for start in range(0, len(integrated_steps), chunk):
+            block = integrated_steps[start:start + chunk]
+            times = np.repeat([step_time for step_time, _, _ in block], len(kepler))
+            offsets, drifts = kepler_propagate(np.tile(mu, len(block)), np.tile(relative_positions, (len(block), 1)),
+                                               np.tile(relative_velocities, (len(block), 1)), times)
+            for step, (step_time, step_positions, step_velocities) in enumerate(block):
+                rows = slice(step * len(kepler), (step + 1) * len(kepler))
+                positions, velocities = np.empty_like(positions), np.empty_like(velocities)
+                positions[integrated], velocities[integrated] = step_positions, step_velocities
+                positions[kepler] = step_positions[attractors] + offsets[rows]
+                velocities[kepler] = step_velocities[attractors] + drifts[rows]
+                history.append((step_time, positions, velocities))
+    else:
+        if timescales:
+            min_timescale = accelerate.timescales(positions).min(initial=np.inf)
+        for h, positions, velocities in integrator.advance(accelerate, positions, velocities, duration, dt):
+            elapsed += h
+            steps += 1
+            history.append((elapsed, positions, velocities))
+    if profile is not None:
+        profile["seconds"] = time.perf_counter() - started
+        profile["force_seconds"] = accelerate.seconds
+        profile["force_evaluations"] = accelerate.evaluations
+        profile["steps"] = steps
+        profile["kepler_bodies"] = len(kepler)
+        if timescales:
+            integrated_positions = positions[integrated] if len(kepler) else positions
+            profile["min_timescale"] = float(min(min_timescale,
+                                                 accelerate.timescales(integrated_positions).min(initial=np.inf)))
+    return positions, velocities, list(history) if record else [], integrator
+
+def profiled_propagate(source_masses, positions, velocities, dt, time_scale, integrator="rk4", force_model=None,
+                       timescales=False):
+    profile = {}
+    result = propagate(source_masses, positions, velocities, dt, time_scale, integrator, force_model, profile,
+                       timescales=timescales)
+    return result + (profile,)
+
+def simulate_orbits(bodies, dt, time_scale, integrator="rk4", force_model=None):
+    force_model = force_model or ForceModel()
+    positions, velocities = bodies.get_state()
+    positions, velocities, history, _ = propagate(
+        force_model.source_masses(bodies), positions, velocities, dt, time_scale, integrator, force_model)
+    bodies.commit_state(positions, velocities, history)
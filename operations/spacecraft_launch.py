@@ -1,6 +1,9 @@
 from entities.spacecraft import Spacecraft
 
 def launch_spacecraft(bodies, name, mass, position, velocity, mission):
+    if bodies.index_of(name) is not None:
+        print(f"Ошибка: тело {name} уже существует.")
+        return
     spacecraft = Spacecraft(name, "spacecraft", mass, position, velocity, (255, 255, 255), 1, mission)
     bodies.append(spacecraft)
     print(f"Космический аппарат {name} запущен с миссией: {mission}")
\ No newline at end of file
@@ -0,0 +1,46 @@
+import numpy as np
+import pytest
+from utils.barnes_hut import barnes_hut_accelerations
+from utils.forces import ForceModel
+from utils.physics import compute_accelerations
+
+
+def random_system(count=300, seed=7):
+    rng = np.random.default_rng(seed)
+    masses = rng.uniform(1e20, 1e24, count)
+    positions = rng.normal(0.0, 1e11, (count, 2))
+    return masses, positions
+
+
+def relative_errors(approximate, exact):
+    return np.linalg.norm(approximate - exact, axis=1) / np.linalg.norm(exact, axis=1)
+
+
+def test_theta_zero_matches_direct_summation():
+    masses, positions = random_system()
+    exact = compute_accelerations(masses, positions)
+    approximate = barnes_hut_accelerations(masses, positions, theta=0.0)
+    assert relative_errors(approximate, exact).max() < 1e-9
+
+
+@pytest.mark.parametrize("leaf_size", [1, 8])
+def test_default_theta_stays_close_to_direct_summation(leaf_size):
+    masses, positions = random_system()
+    exact = compute_accelerations(masses, positions)
+    errors = relative_errors(barnes_hut_accelerations(masses, positions, theta=0.5, leaf_size=leaf_size), exact)
+    assert np.median(errors) < 1e-2
+    assert np.percentile(errors, 95) < 5e-2
+
+
+def test_targets_match_full_evaluation():
+    masses, positions = random_system()
+    targets = np.array([0, 5, 42, 299])
+    full = barnes_hut_accelerations(masses, positions, theta=0.5)
+    assert np.allclose(barnes_hut_accelerations(masses, positions, theta=0.5, targets=targets), full[targets])
+
+
+def test_accelerator_modes_agree():
+    masses, positions = random_system()
+    direct = ForceModel("direct").accelerator(masses)(positions)
+    tree = ForceModel("barnes_hut", theta=0.0).accelerator(masses)(positions)
+    assert relative_errors(tree, direct).max() < 1e-9
@@ -0,0 +1,148 @@
+import json
+import numpy as np
+import pytest
+from utils.frame_protocol import (DELTA_HEADER, DELTA_KIND, FLAG_CULLED, FLAG_FLOAT32, FLAG_PAUSED, FLAG_VELOCITIES,
+                                  FRAME_HEADER, FRAME_KIND, KEYFRAME_KIND, DeltaEncoder, Frame, encode_binary_frame,
+                                  encode_json_frame, encode_roster)
+
+SCALE = 250 / 1.496e11
+
+
+def make_frame(positions, velocities, indices=None, tracked_index=-1, roster_version=3, pause=False):
+    roster = [{"name": f"Body{index}", "type": "planet", "color": [255, 255, 255], "radius": 5,
+               "tail_length": None} for index in range(8)]
+    scene = {"scale": SCALE, "offset": [960.0, 480.0], "time_scale": 2.0, "pause": pause, "tracked_body": None,
+             "integrator": "rk4", "quality": "high", "time": 0.0}
+    return Frame(roster_version, roster, positions, velocities, scene, tracked_index=tracked_index,
+                 timestamp=1234.5, indices=indices)
+
+
+def orbit_state(count=8, phase=0.0):
+    radii = np.linspace(0.4, 5.0, count) * 1.496e11
+    angles = np.linspace(0.0, 2 * np.pi, count, endpoint=False) + phase * np.sqrt(1.496e11 / radii)
+    positions = np.stack([radii * np.cos(angles), radii * np.sin(angles)], axis=1)
+    velocities = np.stack([-np.sin(angles), np.cos(angles)], axis=1) * 3e4
+    return positions, velocities
+
+
+def decode_binary_frame(data):
+    kind, flags, _, roster_version, count, tracked_index, scale, offset_x, offset_y, time_scale = \
+        FRAME_HEADER.unpack_from(data)
+    dtype = np.dtype("<f4" if flags & FLAG_FLOAT32 else "<f8")
+    offset = FRAME_HEADER.size
+    size = count * 2 * dtype.itemsize
+    positions = np.frombuffer(data, dtype, count * 2, offset).reshape(count, 2)
+    offset += size
+    velocities = None
+    if flags & FLAG_VELOCITIES:
+        velocities = np.frombuffer(data, dtype, count * 2, offset).reshape(count, 2)
+        offset += size
+    indices = None
+    if flags & FLAG_CULLED:
+        indices = np.frombuffer(data, "<u4", count, offset)
+        offset += count * 4
+    assert offset == len(data)
+    return {"kind": kind, "flags": flags, "roster_version": roster_version, "tracked_index": tracked_index,
+            "scale": scale, "offset": (offset_x, offset_y), "time_scale": time_scale, "positions": positions,
+            "velocities": velocities, "indices": indices}
+
+
+class DeltaDecoder:
+    def __init__(self):
+        self.quantized = None
+
+    def decode(self, data):
+        header = DELTA_HEADER.unpack_from(data)
+        kind, flags, count = header[0], header[1], header[4]
+        origin = np.array(header[11:13])
+        quantum = header[13]
+        offset = DELTA_HEADER.size
+        velocities = None
+        indices = None
+        if kind == KEYFRAME_KIND:
+            self.quantized = np.frombuffer(data, "<i4", count * 2, offset).reshape(count, 2).astype(np.int64)
+            offset += count * 8
+            velocities = np.frombuffer(data, "<f4", count * 2, offset).reshape(count, 2)
+            offset += count * 8
+            if flags & FLAG_CULLED:
+                indices = np.frombuffer(data, "<u4", count, offset)
+                offset += count * 4
+        else:
+            assert kind == DELTA_KIND
+            self.quantized = self.quantized + np.frombuffer(data, "<i2", count * 2, offset).reshape(count, 2)
+            offset += count * 4
+        assert offset == len(data)
+        return kind, origin + self.quantized * quantum, quantum, velocities, indices
+
+
+@pytest.mark.parametrize("float32", [False, True])
+def test_binary_frame_round_trip(float32):
+    positions, velocities = orbit_state()
+    frame = make_frame(positions, velocities, tracked_index=2, pause=True)
+    decoded = decode_binary_frame(encode_binary_frame(frame, float32=float32))
+    assert decoded["kind"] == FRAME_KIND
+    assert decoded["flags"] & FLAG_PAUSED
+    assert decoded["roster_version"] == 3
+    assert decoded["tracked_index"] == 2
+    assert decoded["scale"] == SCALE
+    assert decoded["offset"] == (960.0, 480.0)
+    assert decoded["time_scale"] == 2.0
+    rtol = 1e-7 if float32 else 0.0
+    assert np.allclose(decoded["positions"], positions, rtol=rtol, atol=0.0)
+    assert np.allclose(decoded["velocities"], velocities, rtol=rtol, atol=0.0)
+    assert decoded["indices"] is None
+
+
+def test_binary_frame_without_velocities_and_culled():
+    positions, velocities = orbit_state()
+    indices = np.array([0, 3, 7], dtype=np.uint32)
+    frame = make_frame(positions[indices], velocities[indices], indices=indices)
+    decoded = decode_binary_frame(encode_binary_frame(frame, velocities=False))
+    assert decoded["velocities"] is None
+    assert np.array_equal(decoded["positions"], positions[indices])
+    assert np.array_equal(decoded["indices"], indices)
+
+
+def test_delta_frames_round_trip_within_a_quantum():
+    encoder = DeltaEncoder(keyframe_interval=5)
+    decoder = DeltaDecoder()
+    kinds = []
+    for step in range(12):
+        positions, velocities = orbit_state(phase=step * 1e-4)
+        kind, decoded, quantum, decoded_velocities, _ = decoder.decode(encoder.encode(make_frame(positions,
+                                                                                                 velocities)))
+        kinds.append(kind)
+        assert np.abs(decoded - positions).max() <= quantum / 2 * (1 + 1e-9)
+        if kind == KEYFRAME_KIND:
+            assert np.allclose(decoded_velocities, velocities, rtol=1e-6)
+    assert kinds == [KEYFRAME_KIND] + [DELTA_KIND] * 5 + [KEYFRAME_KIND] + [DELTA_KIND] * 5
+    assert (encoder.keyframes, encoder.deltas) == (2, 10)
+
+
+def test_delta_encoder_falls_back_to_keyframe():
+    encoder = DeltaEncoder()
+    decoder = DeltaDecoder()
+    positions, velocities = orbit_state()
+    decoder.decode(encoder.encode(make_frame(positions, velocities)))
+    moved = positions + 1e13
+    kind, decoded, quantum, _, _ = decoder.decode(encoder.encode(make_frame(moved, velocities)))
+    assert kind == KEYFRAME_KIND
+    assert np.abs(decoded - moved).max() <= quantum / 2 * (1 + 1e-9)
+    indices = np.array([1, 2], dtype=np.uint32)
+    kind, _, _, _, decoded_indices = decoder.decode(encoder.encode(make_frame(moved[indices], velocities[indices],
+                                                                              indices=indices)))
+    assert kind == KEYFRAME_KIND
+    assert np.array_equal(decoded_indices, indices)
+
+
+def test_json_frame_round_trip():
+    positions, velocities = orbit_state()
+    frame = make_frame(positions, velocities)
+    decoded = json.loads(encode_json_frame(frame))
+    assert decoded["scene"] == frame.scene
+    assert [body["name"] for body in decoded["bodies"]] == [entry["name"] for entry in frame.roster]
+    assert np.array_equal([body["position"] for body in decoded["bodies"]], positions)
+    assert np.array_equal([body["velocity"] for body in decoded["bodies"]], velocities)
+    roster = json.loads(encode_roster(frame))
+    assert roster == {"type": "roster", "version": 3, "bodies": frame.roster}
+
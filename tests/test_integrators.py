@@ -0,0 +1,59 @@
+import numpy as np
+import pytest
+from utils.forces import ForceModel
+from utils.integrators import INTEGRATORS, create_integrator
+from utils.orbital_elements import kepler_propagate
+from utils.physics import G, total_energy
+
+SUN_MASS = 1.989e30
+EARTH_MASS = 5.972e24
+AU = 1.496e11
+
+
+def two_body_orbit():
+    masses = np.array([SUN_MASS, EARTH_MASS])
+    mu = G * masses.sum()
+    speed = np.sqrt(mu / AU)
+    positions = np.array([[-AU * EARTH_MASS / masses.sum(), 0.0], [AU * SUN_MASS / masses.sum(), 0.0]])
+    velocities = np.array([[0.0, -speed * EARTH_MASS / masses.sum()], [0.0, speed * SUN_MASS / masses.sum()]])
+    period = 2 * np.pi * np.sqrt(AU ** 3 / mu)
+    return masses, mu, positions, velocities, period
+
+
+def run(name, masses, positions, velocities, duration, dt):
+    integrator = create_integrator(name)
+    accelerate = ForceModel().accelerator(masses)
+    elapsed = 0.0
+    for h, positions, velocities in integrator.advance(accelerate, positions, velocities, duration, dt):
+        elapsed += h
+    return elapsed, positions, velocities
+
+
+@pytest.mark.parametrize("name", sorted(INTEGRATORS))
+def test_circular_orbit_closes_after_one_period(name):
+    masses, mu, positions, velocities, period = two_body_orbit()
+    elapsed, final_positions, final_velocities = run(name, masses, positions, velocities, period, 3600)
+    assert elapsed == pytest.approx(period)
+    separation = final_positions[1] - final_positions[0]
+    assert np.linalg.norm(separation - (positions[1] - positions[0])) / AU < 1e-3
+    energy = total_energy(masses, positions, velocities)
+    assert abs(total_energy(masses, final_positions, final_velocities) / energy - 1) < 1e-5
+
+
+@pytest.mark.parametrize("name", sorted(INTEGRATORS))
+def test_eccentric_orbit_matches_kepler(name):
+    masses, mu, positions, velocities, period = two_body_orbit()
+    velocities = velocities * 1.2
+    duration = 0.3 * period
+    elapsed, final_positions, final_velocities = run(name, masses, positions, velocities, duration, 3600)
+    expected_position, expected_velocity = kepler_propagate(mu, positions[1:] - positions[:1],
+                                                            velocities[1:] - velocities[:1], duration)
+    separation = final_positions[1] - final_positions[0]
+    assert np.linalg.norm(separation - expected_position[0]) / AU < 1e-4
+    relative_velocity = final_velocities[1] - final_velocities[0]
+    assert np.linalg.norm(relative_velocity - expected_velocity[0]) / np.linalg.norm(expected_velocity[0]) < 1e-4
+
+
+def test_unknown_integrator_is_rejected():
+    with pytest.raises(ValueError):
+        create_integrator("euler")
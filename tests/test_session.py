@@ -0,0 +1,51 @@
+import asyncio
+import os
+import pytest
+from utils.physics_worker import PhysicsWorker
+from utils.simulation_session import SimulationSession, load_default_bodies
+
+CONFIG = os.path.join(os.path.dirname(__file__), os.pardir, "config", "solar_system.json")
+TICKS = 30
+
+
+async def run_session(session, ticks):
+    for _ in range(ticks):
+        frame = await session.tick()
+    return frame
+
+
+@pytest.mark.parametrize("integrator", ["rk4", "leapfrog", "block"])
+def test_default_scene_keeps_all_bodies(tmp_path, integrator):
+    bodies = load_default_bodies(CONFIG)
+    assert len(bodies) == 17
+    physics = PhysicsWorker("thread")
+    try:
+        session = SimulationSession("default", bodies, physics, directory=str(tmp_path / "sessions"),
+                                    cache_directory=str(tmp_path / "cache"))
+        session.set_integrator(integrator)
+        frame = asyncio.run(run_session(session, TICKS))
+    finally:
+        physics.shutdown()
+    assert not session.scene.resolve_collisions
+    assert session.bodies.time >= TICKS * session.dt
+    assert len(session.bodies) == 17
+    assert len(frame.positions) == 17
+    assert session.bodies.get("Phobos") is not None
+
+
+def test_collision_resolution_is_opt_in(tmp_path):
+    physics = PhysicsWorker("thread")
+    try:
+        sessions = [SimulationSession(f"resolve-{enabled}", load_default_bodies(CONFIG), physics,
+                                      directory=str(tmp_path / "sessions"), cache_directory=str(tmp_path / "cache"),
+                                      resolve_collisions=enabled) for enabled in (False, True)]
+        for session in sessions:
+            asyncio.run(run_session(session, TICKS))
+    finally:
+        physics.shutdown()
+    for session in sessions:
+        merges = [event["bodies"] for event in session.events.events if event["kind"] == "merge"]
+        assert merges == [["Mars", "Phobos"]]
+    assert sessions[0].bodies.get("Phobos") is not None
+    assert sessions[1].bodies.get("Phobos") is None
+    assert len(sessions[1].bodies) == 16
@@ -0,0 +1,118 @@
+import json
+import numpy as np
+from utils.physics import G, compute_accelerations
+
+
+class QuadTree:
+    def __init__(self, masses, positions, leaf_size=8, max_depth=48):
+        self.masses = masses
+        self.positions = positions
+        self.leaf_size = leaf_size
+        self.centers = []
+        self.middles = []
+        self.node_masses = []
+        self.sizes = []
+        self.children = []
+        self.leaves = []
+        count = len(masses)
+        if count == 0:
+            return
+        low = positions.min(axis=0)
+        high = positions.max(axis=0)
+        size = max(float(np.max(high - low)), 1.0)
+        self._build(np.arange(count), (low + high) / 2, size, max_depth)
+
+    def _add_node(self, indices, middle, size):
+        node_mass = float(self.masses[indices].sum())
+        if node_mass > 0:
+            center = self.masses[indices] @ self.positions[indices] / node_mass
+        else:
+            center = self.positions[indices].mean(axis=0)
+        self.centers.append(center)
+        self.middles.append(middle)
+        self.node_masses.append(node_mass)
+        self.sizes.append(size)
+        self.children.append(None)
+        self.leaves.append(None)
+        return len(self.centers) - 1
+
+    def _build(self, indices, middle, size, max_depth):
+        root = self._add_node(indices, middle, size)
+        stack = [(root, indices, middle, size, 0)]
+        while stack:
+            node, indices, middle, size, depth = stack.pop()
+            if len(indices) <= self.leaf_size or depth >= max_depth:
+                self.leaves[node] = indices
+                continue
+            points = self.positions[indices]
+            east = points[:, 0] >= middle[0]
+            north = points[:, 1] >= middle[1]
+            quarter = size / 4
+            children = []
+            for is_east in (False, True):
+                for is_north in (False, True):
+                    child_indices = indices[(east == is_east) & (north == is_north)]
+                    if len(child_indices) == 0:
+                        continue
+                    child_size = size / 2
+                    child_middle = middle + np.array([quarter if is_east else -quarter,
+                                                      quarter if is_north else -quarter])
+                    child = self._add_node(child_indices, child_middle, child_size)
+                    children.append(child)
+                    stack.append((child, child_indices, child_middle, child_size, depth + 1))
+            self.children[node] = children
+
+    def accelerations(self, target_positions, theta=0.5):
+        accelerations = np.zeros((len(target_positions), 2))
+        if len(self.centers) == 0 or len(target_positions) == 0:
+            return accelerations
+        theta_sq = theta * theta
+        stack = [(0, np.arange(len(target_positions)))]
+        while stack:
+            node, rows = stack.pop()
+            leaf = self.leaves[node]
+            if leaf is not None:
+                accelerations[rows] += compute_accelerations(
+                    self.masses[leaf], self.positions[leaf], target_positions=target_positions[rows])
+                continue
+            r = self.centers[node] - target_positions[rows]
+            dist_sq = np.einsum("ij,ij->i", r, r)
+            outside = np.max(np.abs(target_positions[rows] - self.middles[node]), axis=1) > self.sizes[node] / 2
+            far = outside & (self.sizes[node] ** 2 < theta_sq * dist_sq)
+            if np.any(far):
+                accelerations[rows[far]] += (G * self.node_masses[node] * dist_sq[far] ** -1.5)[:, np.newaxis] * r[far]
+            near = rows[~far]
+            if len(near):
+                for child in self.children[node]:
+                    stack.append((child, near))
+        return accelerations
+
+
+def barnes_hut_accelerations(masses, positions, theta=0.5, targets=None, leaf_size=8, target_positions=None):
+    masses = np.asarray(masses, dtype=float)
+    if target_positions is None:
+        target_positions = positions if targets is None else positions[targets]
+    tree = QuadTree(masses, positions, leaf_size=leaf_size)
+    return tree.accelerations(target_positions, theta)
+
+
+def validate_barnes_hut(file_path="config/solar_system.json", theta=0.5, leaf_size=1):
+    with open(file_path, "r") as file:
+        data = json.load(file)
+    masses = np.array([body["mass"] for body in data], dtype=float)
+    positions = np.array([body["position"] for body in data], dtype=float)
+    direct = compute_accelerations(masses, positions)
+    approximate = barnes_hut_accelerations(masses, positions, theta=theta, leaf_size=leaf_size)
+    errors = np.linalg.norm(approximate - direct, axis=1) / np.maximum(np.linalg.norm(direct, axis=1), 1e-300)
+    return {
+        "bodies": len(data),
+        "theta": theta,
+        "max_relative_error": float(errors.max()),
+        "mean_relative_error": float(errors.mean()),
+        "worst_body": data[int(errors.argmax())]["name"]
+    }
+
+
+if __name__ == "__main__":
+    for theta in (0.3, 0.5, 0.8):
+        print(validate_barnes_hut(theta=theta))
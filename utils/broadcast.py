@@ -0,0 +1,86 @@
+import asyncio
+import json
+import logging
+import time
+from utils.metrics import ENCODE_SECONDS, FRAMES_DROPPED
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+
+def encode_json(frame):
+    if orjson is not None:
+        return orjson.dumps(frame, option=orjson.OPT_SERIALIZE_NUMPY).decode()
+    return json.dumps(frame, separators=(",", ":"))
+
+
+class BroadcastHub:
+    def __init__(self, encoders=None, labels=()):
+        self.encoders = encoders or {"json": encode_json}
+        self.labels = labels
+        self.latest = None
+        self.frames = 0
+        self.encode_calls = 0
+        self.deliveries = 0
+        self.dropped_frames = 0
+        self._subscribers = set()
+
+    @property
+    def subscriber_count(self):
+        return len(self._subscribers)
+
+    @property
+    def encodes_saved(self):
+        return max(0, self.deliveries - self.encode_calls)
+
+    def subscribe(self):
+        queue = asyncio.Queue(maxsize=1)
+        self._subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, queue):
+        self._subscribers.discard(queue)
+
+    def close(self):
+        for queue in self._subscribers:
+            while not queue.empty():
+                queue.get_nowait()
+            queue.put_nowait(None)
+        self._subscribers = set()
+
+    def publish(self, frame):
+        self.frames += 1
+        self.latest = frame
+        for queue in self._subscribers:
+            if queue.full():
+                queue.get_nowait()
+                self.dropped_frames += 1
+                FRAMES_DROPPED.inc(1, self.labels)
+            queue.put_nowait(frame)
+
+    def encode(self, frame, fmt, *options):
+        key = (fmt,) + options
+        payload = frame.encoded.get(key)
+        if payload is None:
+            started = time.perf_counter()
+            payload = self.encoders[fmt](frame, *options)
+            ENCODE_SECONDS.observe(time.perf_counter() - started, (fmt,))
+            frame.encoded[key] = payload
+            self.encode_calls += 1
+        self.deliveries += 1
+        return payload
+
+    def stats(self):
+        return {
+            "subscribers": self.subscriber_count,
+            "frames": self.frames,
+            "encode_calls": self.encode_calls,
+            "deliveries": self.deliveries,
+            "encodes_saved": self.encodes_saved,
+            "dropped_frames": self.dropped_frames,
+            "encoder": "orjson" if orjson is not None else "json"
+        }
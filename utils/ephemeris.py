@@ -0,0 +1,252 @@
+import glob
+import logging
+import os
+import numpy as np
+from utils.frame_protocol import static_table
+
+logger = logging.getLogger(__name__)
+
+STATE_WIDTH = 4
+EPHEMERIS_MAX_BYTES = 256 << 20
+SEGMENT_INITIAL_BYTES = 1 << 20
+
+
+def hermite(t0, positions0, velocities0, t1, positions1, velocities1, time):
+    h = t1 - t0
+    s = (time - t0) / h
+    s2 = s * s
+    s3 = s2 * s
+    positions = ((2 * s3 - 3 * s2 + 1) * positions0 + (s3 - 2 * s2 + s) * h * velocities0
+                 + (-2 * s3 + 3 * s2) * positions1 + (s3 - s2) * h * velocities1)
+    velocities = ((6 * s2 - 6 * s) / h * positions0 + (3 * s2 - 4 * s + 1) * velocities0
+                  + (-6 * s2 + 6 * s) / h * positions1 + (3 * s2 - 2 * s) * velocities1)
+    return positions, velocities
+
+
+class EphemerisSegment:
+    def __init__(self, path, roster_version, roster, capacity=1024):
+        self.path = path
+        self.roster_version = roster_version
+        self.roster = roster
+        self._index_by_name = {entry["name"]: index for index, entry in enumerate(roster)}
+        self.count = 0
+        self._open(capacity, "w+")
+
+    def _open(self, capacity, mode):
+        self.capacity = capacity
+        self.times = np.memmap(self.path + ".times", dtype="<f8", mode=mode, shape=(capacity,))
+        self.states = np.memmap(self.path + ".states", dtype="<f8", mode=mode,
+                                shape=(capacity, len(self.roster), STATE_WIDTH))
+
+    @property
+    def start_time(self):
+        return float(self.times[0]) if self.count else None
+
+    @property
+    def end_time(self):
+        return float(self.times[self.count - 1]) if self.count else None
+
+    @property
+    def nbytes(self):
+        return self.times.nbytes + self.states.nbytes
+
+    @property
+    def row_bytes(self):
+        return 8 * (1 + len(self.roster) * STATE_WIDTH)
+
+    @property
+    def disk_bytes(self):
+        return sum(os.stat(self.path + suffix).st_blocks * 512 for suffix in (".times", ".states")
+                   if os.path.exists(self.path + suffix))
+
+    def index_of(self, name):
+        return self._index_by_name.get(name)
+
+    def append(self, times, positions, velocities, max_capacity=None):
+        count = len(times)
+        if self.count + count > self.capacity:
+            capacity = self.capacity
+            while capacity < self.count + count:
+                capacity *= 2
+            if max_capacity is not None:
+                capacity = max(min(capacity, max_capacity), self.count + count)
+            self.flush()
+            self._open(capacity, "r+")
+        rows = slice(self.count, self.count + count)
+        self.times[rows] = times
+        self.states[rows, :, :2] = positions
+        self.states[rows, :, 2:] = velocities
+        self.count += count
+
+    def truncate(self, time):
+        self.count = int(np.searchsorted(self.times[:self.count], time, side="right"))
+
+    def state(self, row):
+        return self.states[row, :, :2].copy(), self.states[row, :, 2:].copy()
+
+    def sample(self, time):
+        if self.count == 1:
+            return self.state(0)
+        times = self.times[:self.count]
+        row = int(np.clip(np.searchsorted(times, time, side="right") - 1, 0, self.count - 2))
+        first = self.states[row]
+        second = self.states[row + 1]
+        time = min(max(time, times[0]), times[-1])
+        return hermite(times[row], first[:, :2], first[:, 2:], times[row + 1], second[:, :2], second[:, 2:], time)
+
+    def flush(self):
+        self.times.flush()
+        self.states.flush()
+
+    def close(self):
+        del self.times
+        del self.states
+        for suffix in (".times", ".states"):
+            if os.path.exists(self.path + suffix):
+                os.remove(self.path + suffix)
+
+
+class EphemerisCache:
+    def __init__(self, directory, cadence=3600.0, max_bytes=EPHEMERIS_MAX_BYTES, recording=True):
+        self.directory = directory
+        self.cadence = cadence
+        self.max_bytes = max_bytes
+        self.recording = recording
+        self.segments = []
+        self.invalidations = 0
+        self.full = False
+        self._serial = 0
+        os.makedirs(directory, exist_ok=True)
+        for path in glob.glob(os.path.join(directory, "segment_*")):
+            os.remove(path)
+
+    @property
+    def samples(self):
+        return sum(segment.count for segment in self.segments)
+
+    @property
+    def nbytes(self):
+        return sum(segment.nbytes for segment in self.segments)
+
+    @property
+    def disk_bytes(self):
+        return sum(segment.disk_bytes for segment in self.segments)
+
+    @property
+    def start_time(self):
+        return next((segment.start_time for segment in self.segments if segment.count), None)
+
+    @property
+    def end_time(self):
+        return next((segment.end_time for segment in reversed(self.segments) if segment.count), None)
+
+    def _segment_for(self, bodies):
+        if self.segments and self.segments[-1].roster_version == bodies.roster_version:
+            return self.segments[-1]
+        row_bytes = 8 * (1 + len(bodies) * STATE_WIDTH)
+        available = self.max_bytes - self.nbytes
+        if available < row_bytes:
+            return None
+        self._serial += 1
+        path = os.path.join(self.directory, f"segment_{self._serial:06d}")
+        capacity = max(1, min(1024, SEGMENT_INITIAL_BYTES // row_bytes, available // row_bytes))
+        segment = EphemerisSegment(path, bodies.roster_version, static_table(bodies), capacity=capacity)
+        self.segments.append(segment)
+        return segment
+
+    def _stop(self):
+        self.full = True
+        logger.warning(f"Ephemeris cache is full ({self.nbytes} of {self.max_bytes} bytes), recording stopped")
+
+    def record(self, bodies, times, positions, velocities):
+        if len(bodies) == 0 or len(times) == 0 or self.full:
+            return
+        segment = self._segment_for(bodies)
+        if segment is None:
+            return self._stop()
+        last = segment.end_time if segment.count else -np.inf
+        rows = []
+        for row, time in enumerate(times):
+            if time >= last + self.cadence or (not rows and segment.count == 0):
+                rows.append(row)
+                last = time
+        if not rows:
+            return
+        max_capacity = (self.max_bytes - self.nbytes + segment.nbytes) // segment.row_bytes
+        if segment.count + len(rows) > max_capacity:
+            return self._stop()
+        segment.append(np.asarray(times)[rows], np.stack([positions[row] for row in rows]),
+                       np.stack([velocities[row] for row in rows]), max_capacity)
+
+    def record_history(self, bodies, start_time, history):
+        if not self.recording or not history:
+            return
+        self.record(bodies, [start_time + step_time for step_time, _, _ in history],
+                    [step_positions for _, step_positions, _ in history],
+                    [step_velocities for _, _, step_velocities in history])
+
+    def record_state(self, bodies):
+        if not self.recording:
+            return
+        positions, velocities = bodies.get_state()
+        self.record(bodies, [bodies.time], [positions], [velocities])
+
+    def invalidate(self, time):
+        while self.segments and (self.segments[-1].count == 0 or self.segments[-1].start_time > time):
+            self.segments.pop().close()
+        if self.segments:
+            self.segments[-1].truncate(time)
+        self.full = False
+        self.invalidations += 1
+
+    def clear(self):
+        while self.segments:
+            self.segments.pop().close()
+        self.full = False
+        self.invalidations += 1
+
+    def find(self, time):
+        candidates = [segment for segment in self.segments if segment.count]
+        for segment in reversed(candidates):
+            if segment.start_time <= time:
+                return segment
+        return candidates[0] if candidates else None
+
+    def sample(self, time):
+        segment = self.find(time)
+        if segment is None:
+            return None, None, None
+        positions, velocities = segment.sample(time)
+        return segment, positions, velocities
+
+    def resume_state(self, bodies):
+        segment = self.segments[-1] if self.segments else None
+        if segment is None or segment.roster_version != bodies.roster_version or segment.count == 0 \
+                or segment.end_time <= bodies.time:
+            positions, velocities = bodies.get_state()
+            return bodies.time, positions, velocities
+        positions, velocities = segment.state(segment.count - 1)
+        return segment.end_time, positions, velocities
+
+    def stats(self):
+        return {
+            "cadence": self.cadence,
+            "recording": self.recording,
+            "full": self.full,
+            "samples": self.samples,
+            "bytes": self.nbytes,
+            "disk_bytes": self.disk_bytes,
+            "max_bytes": self.max_bytes,
+            "start_time": self.start_time,
+            "end_time": self.end_time,
+            "invalidations": self.invalidations,
+            "segments": [{
+                "roster_version": segment.roster_version,
+                "bodies": len(segment.roster),
+                "samples": segment.count,
+                "capacity": segment.capacity,
+                "bytes": segment.nbytes,
+                "start_time": segment.start_time,
+                "end_time": segment.end_time
+            } for segment in self.segments]
+        }
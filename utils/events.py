@@ -0,0 +1,355 @@
+import collections
+import logging
+import numpy as np
+from utils.forces import TEST_PARTICLE_TYPES
+from utils.physics import G
+
+logger = logging.getLogger(__name__)
+
+EVENT_KINDS = ("merge", "impact", "flyby")
+EVENT_CAPACITY = 10000
+APPROACH_RADII = 10.0
+PATH_SAMPLES = 8
+CONFIRM_SOURCES = 6
+CONFIRM_STEP = 0.05
+CONFIRM_MAX_SUBSTEPS = 1024
+
+
+def grid_pairs(low, high, max_cells=64):
+    empty = np.empty(0, dtype=np.int64)
+    count = len(low)
+    if count < 2:
+        return empty, empty
+    extents = (high - low).max(axis=1)
+    cell = max(2 * float(np.median(extents)), float(extents.max()) / max_cells)
+    if cell <= 0:
+        return empty, empty
+    first_cell = np.floor(low / cell).astype(np.int64)
+    last_cell = np.floor(high / cell).astype(np.int64)
+    spans = last_cell - first_cell + 1
+    cells = spans[:, 0] * spans[:, 1]
+    owners = np.repeat(np.arange(count), cells)
+    local = np.arange(len(owners)) - np.repeat(np.cumsum(cells) - cells, cells)
+    cx = first_cell[owners, 0] + local // spans[owners, 1]
+    cy = first_cell[owners, 1] + local % spans[owners, 1]
+    cx -= cx.min()
+    cy -= cy.min()
+    rows = int(cy.max()) + 1
+    if (int(cx.max()) + 1) * rows < 2 ** 62:
+        keys = cx * rows + cy
+        order = np.argsort(keys)
+        owners, keys = owners[order], keys[order]
+        boundary = np.flatnonzero(keys[1:] != keys[:-1]) + 1
+    else:
+        order = np.lexsort((cy, cx))
+        owners, cx, cy = owners[order], cx[order], cy[order]
+        boundary = np.flatnonzero((cx[1:] != cx[:-1]) | (cy[1:] != cy[:-1])) + 1
+    ends = np.repeat(np.append(boundary, len(owners)), np.diff(np.concatenate([[0], boundary, [len(owners)]])))
+    counts = ends - np.arange(1, len(owners) + 1)
+    total = int(counts.sum())
+    if total == 0:
+        return empty, empty
+    first = np.repeat(np.arange(len(owners)), counts)
+    second = first + 1 + np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+    i, j = owners[first], owners[second]
+    pairs = np.unique(np.minimum(i, j) * count + np.maximum(i, j))
+    i, j = pairs // count, pairs % count
+    overlap = (i != j) & (low[i, 0] <= high[j, 0]) & (low[j, 0] <= high[i, 0]) & \
+        (low[i, 1] <= high[j, 1]) & (low[j, 1] <= high[i, 1])
+    return i[overlap], j[overlap]
+
+
+def closest_approach(start, end):
+    delta = end - start
+    length = np.einsum("...k,...k->...", delta, delta)
+    fraction = np.zeros_like(length)
+    np.divide(-np.einsum("...k,...k->...", start, delta), length, out=fraction, where=length > 0)
+    fraction = np.clip(fraction, 0.0, 1.0)
+    offset = start + fraction[..., np.newaxis] * delta
+    return fraction, np.sqrt(np.einsum("...k,...k->...", offset, offset))
+
+
+def hermite_path(positions, velocities, durations, samples=PATH_SAMPLES):
+    s = np.linspace(0.0, 1.0, samples + 1)[:, np.newaxis]
+    scale = durations[:, np.newaxis, np.newaxis]
+    start, end = positions[..., :-1, np.newaxis, :], positions[..., 1:, np.newaxis, :]
+    start_velocity = velocities[..., :-1, np.newaxis, :] * scale
+    end_velocity = velocities[..., 1:, np.newaxis, :] * scale
+    return ((2 * s ** 3 - 3 * s ** 2 + 1) * start + (s ** 3 - 2 * s ** 2 + s) * start_velocity +
+            (3 * s ** 2 - 2 * s ** 3) * end + (s ** 3 - s ** 2) * end_velocity)
+
+
+def segment_minimum(path):
+    fraction, distance = closest_approach(path[..., :-1, :], path[..., 1:, :])
+    sample = distance.argmin(axis=-1)[..., np.newaxis]
+    samples = distance.shape[-1]
+    minimum = np.take_along_axis(distance, sample, axis=-1)[..., 0]
+    return (sample[..., 0] + np.take_along_axis(fraction, sample, axis=-1)[..., 0]) / samples, minimum
+
+
+def relative_paths(paths, velocities, i, j):
+    return (np.stack([positions[j] - positions[i] for positions in paths], axis=-2),
+            np.stack([step_velocities[j] - step_velocities[i] for step_velocities in velocities], axis=-2))
+
+
+def find_collisions(radii, paths, velocities, durations):
+    low = paths[0].copy()
+    high = paths[0].copy()
+    for positions in paths[1:]:
+        np.minimum(low, positions, out=low)
+        np.maximum(high, positions, out=high)
+    low -= radii[:, np.newaxis]
+    high += radii[:, np.newaxis]
+    i, j = grid_pairs(low, high)
+    if len(i) == 0:
+        return [], 0
+    relative, relative_velocity = relative_paths(paths, velocities, i, j)
+    fraction, distance = segment_minimum(hermite_path(relative, relative_velocity, durations))
+    hits = distance <= (radii[i] + radii[j])[:, np.newaxis]
+    collisions = []
+    for pair in np.flatnonzero(hits.any(axis=1)):
+        step = int(np.argmax(hits[pair]))
+        collisions.append((step, float(fraction[pair, step]), int(i[pair]), int(j[pair]),
+                           float(distance[pair, step])))
+    collisions.sort()
+    return collisions, len(i)
+
+
+def find_flybys(watches, radii, paths, velocities, durations):
+    flybys = []
+    for i, j, threshold in watches:
+        relative, relative_velocity = relative_paths(paths, velocities, i, j)
+        range_rate = np.einsum("kd,kd->k", relative, relative_velocity)
+        minima = (range_rate[:-1] < 0) & (range_rate[1:] >= 0)
+        if not minima.any():
+            continue
+        fraction, distance = segment_minimum(hermite_path(relative, relative_velocity, durations))
+        contact = radii[i] + radii[j]
+        for step in np.flatnonzero(minima & (distance <= threshold) & (distance > contact)):
+            flybys.append((int(step), float(fraction[step]), i, j, float(distance[step]), threshold))
+    return flybys
+
+
+def group_accelerations(masses, positions):
+    r = positions[:, np.newaxis, :, :] - positions[:, :, np.newaxis, :]
+    dist_sq = np.einsum("cabk,cabk->cab", r, r)
+    inverse = np.zeros_like(dist_sq)
+    np.divide(1.0, dist_sq * np.sqrt(dist_sq), out=inverse, where=dist_sq > 0)
+    return G * np.einsum("cab,cabk->cak", masses[:, np.newaxis, :] * inverse, r)
+
+
+def group_timescales(masses, positions):
+    r = positions[:, :2, np.newaxis, :] - positions[:, np.newaxis, :, :]
+    dist_sq = np.einsum("cabk,cabk->cab", r, r)
+    gm = G * (masses[:, :2, np.newaxis] + masses[:, np.newaxis, :])
+    ratio = np.full_like(dist_sq, np.inf)
+    np.divide(dist_sq ** 1.5, gm, out=ratio, where=(dist_sq > 0) & (gm > 0))
+    return np.sqrt(ratio.min(axis=(1, 2)))
+
+
+def confirm_collisions(masses, radii, paths, velocities, durations, candidates, sources=CONFIRM_SOURCES,
+                       step=CONFIRM_STEP, max_substeps=CONFIRM_MAX_SUBSTEPS):
+    if not candidates:
+        return []
+    massive = np.flatnonzero(masses > 0)
+    members = np.empty((len(candidates), 2 + sources), dtype=np.int64)
+    group_masses = np.zeros(members.shape)
+    for row, (start, _, i, j, _) in enumerate(candidates):
+        offsets = paths[start][massive] - paths[start][i]
+        dist_sq = np.einsum("kd,kd->k", offsets, offsets)
+        strength = np.full(len(massive), -1.0)
+        np.divide(masses[massive], dist_sq, out=strength, where=(massive != i) & (massive != j) & (dist_sq > 0))
+        order = np.argsort(-strength)[:sources]
+        chosen = massive[order[strength[order] > 0]]
+        members[row] = i
+        members[row, 1] = j
+        members[row, 2:2 + len(chosen)] = chosen
+        group_masses[row, :2 + len(chosen)] = masses[members[row, :2 + len(chosen)]]
+    starts = [start for start, _, _, _, _ in candidates]
+    positions = np.stack([paths[start][row] for start, row in zip(starts, members)])
+    velocities = np.stack([velocities[start][row] for start, row in zip(starts, members)])
+    spans = durations[starts]
+    contact = radii[members[:, 0]] + radii[members[:, 1]]
+    elapsed = np.zeros(len(candidates))
+    results = [None] * len(candidates)
+    pending = np.ones(len(candidates), dtype=bool)
+    for _ in range(max_substeps):
+        h = np.minimum(spans - elapsed, group_timescales(group_masses, positions) * step)
+        h[~pending] = 0.0
+        h = h[:, np.newaxis, np.newaxis]
+        k1v = group_accelerations(group_masses, positions)
+        k2v = group_accelerations(group_masses, positions + velocities * (h / 2))
+        k3v = group_accelerations(group_masses, positions + (velocities + k1v * (h / 2)) * (h / 2))
+        k4v = group_accelerations(group_masses, positions + (velocities + k2v * (h / 2)) * h)
+        new_positions = positions + h * (velocities + h / 6 * (k1v + k2v + k3v))
+        new_velocities = velocities + h / 6 * (k1v + 2 * k2v + 2 * k3v + k4v)
+        fraction, distance = closest_approach(positions[:, 1] - positions[:, 0],
+                                              new_positions[:, 1] - new_positions[:, 0])
+        hits = pending & (distance <= contact)
+        for row in np.flatnonzero(hits):
+            s = fraction[row]
+            position = positions[row, :2] + s * (new_positions[row, :2] - positions[row, :2])
+            velocity = velocities[row, :2] + s * (new_velocities[row, :2] - velocities[row, :2])
+            results[row] = ((elapsed[row] + s * h[row, 0, 0]) / spans[row], float(distance[row]),
+                            float(np.linalg.norm(velocity[1] - velocity[0])), position[0], position[1])
+        elapsed += h[:, 0, 0]
+        pending &= ~hits & (elapsed < spans * (1 - 1e-12))
+        if not pending.any():
+            break
+        positions, velocities = new_positions, new_velocities
+    return results
+
+
+def find_events(query, start_positions, start_velocities, history, source_masses=None):
+    radii = query["radii"]
+    if not history or len(start_positions) != len(radii):
+        return [], 0, 0
+    masses = query["masses"]
+    particles = query["particles"]
+    times = np.array([0.0] + [step_time for step_time, _, _ in history])
+    durations = np.diff(times)
+    paths = [start_positions] + [positions for _, positions, _ in history]
+    velocities = [start_velocities] + [step_velocities for _, _, step_velocities in history]
+    found = []
+    for step, fraction, i, j, distance, threshold in find_flybys(query["watches"], radii, paths, velocities,
+                                                                 durations):
+        position = paths[step][i] + fraction * (paths[step + 1][i] - paths[step][i])
+        start_velocity, end_velocity = (step_velocities[j] - step_velocities[i]
+                                        for step_velocities in velocities[step:step + 2])
+        speed = float(np.linalg.norm(start_velocity + fraction * (end_velocity - start_velocity)))
+        found.append(("flyby", float(times[step] + fraction * durations[step]), i, j, distance, speed,
+                      position.tolist(), {"threshold": threshold}))
+    candidates, candidate_pairs = find_collisions(radii, paths, velocities, durations)
+    confirmed = confirm_collisions(masses if source_masses is None else np.asarray(source_masses, dtype=float),
+                                   radii, paths, velocities, durations, candidates)
+    hits = sorted(((float(times[candidate[0]] + result[0] * durations[candidate[0]]),) + candidate[2:4] + result[1:]
+                   for candidate, result in zip(candidates, confirmed) if result is not None), key=lambda hit: hit[0])
+    removed = set()
+    for event_time, i, j, distance, speed, position_i, position_j in hits:
+        if i in removed or j in removed:
+            continue
+        if particles[i] or particles[j]:
+            if particles[j] and (not particles[i] or masses[j] <= masses[i]):
+                i, j, position_i = j, i, position_j
+            found.append(("impact", event_time, i, j, distance, speed, position_i.tolist(), {}))
+            removed.add(i)
+        else:
+            if masses[j] > masses[i]:
+                i, j, position_i = j, i, position_j
+            found.append(("merge", event_time, i, j, distance, speed, position_i.tolist(), {}))
+            removed.add(j)
+    return found, candidate_pairs, len(candidates) - len(hits)
+
+
+class EventDetector:
+    def __init__(self, capacity=EVENT_CAPACITY, resolve_collisions=False):
+        self.events = collections.deque(maxlen=capacity)
+        self.watches = {}
+        self.resolve_collisions = resolve_collisions
+        self.next_id = 1
+        self.candidate_pairs = 0
+        self.rejected_collisions = 0
+        self.seconds = 0.0
+
+    def watch(self, body, target, distance):
+        watch = {"body": body, "target": target, "distance": float(distance)}
+        self.watches[(body, target)] = watch
+        logger.info(f"Watching {body} approaching {target} within {distance:.3e} m")
+        return watch
+
+    def unwatch(self, body, target):
+        return self.watches.pop((body, target), None) is not None
+
+    def prune(self, bodies):
+        for body, target in list(self.watches):
+            if bodies.index_of(body) is None or bodies.index_of(target) is None:
+                del self.watches[(body, target)]
+                logger.info(f"Watch {body} approaching {target} dropped, body removed")
+
+    def since(self, event_id=0, kind=None, body=None, limit=None):
+        events = [event for event in self.events
+                  if event["id"] > event_id and (kind is None or event["kind"] == kind)
+                  and (body is None or body in event["bodies"])]
+        return events if limit is None else events[:limit]
+
+    def _emit(self, kind, time, first, second, distance, speed, position, **fields):
+        event = {
+            "id": self.next_id,
+            "kind": kind,
+            "time": time,
+            "bodies": [first.name, second.name],
+            "distance": distance,
+            "relative_speed": speed,
+            "position": position,
+            "mission": getattr(first, "mission", None) or getattr(second, "mission", None)
+        }
+        event.update(fields)
+        self.next_id += 1
+        self.events.append(event)
+        return event
+
+    def query(self, bodies):
+        particles = bodies.masses == 0
+        for type in TEST_PARTICLE_TYPES:
+            particles[bodies.indices_of_type(type)] = True
+        watches = []
+        for watch in self.watches.values():
+            i, j = bodies.index_of(watch["body"]), bodies.index_of(watch["target"])
+            if i is not None and j is not None:
+                watches.append((i, j, watch["distance"]))
+        return {"radii": bodies.radii.copy(), "masses": bodies.masses.copy(), "particles": particles,
+                "watches": watches}
+
+    def record(self, bodies, start_time, found, candidate_pairs=0, rejected=0, seconds=0.0):
+        self.candidate_pairs += candidate_pairs
+        self.rejected_collisions += rejected
+        self.seconds += seconds
+        events = []
+        for kind, event_time, i, j, distance, speed, position, fields in found:
+            first, second = bodies[i], bodies[j]
+            if kind == "merge":
+                fields = dict(fields, survivor=first.name)
+            events.append(self._emit(kind, start_time + event_time, first, second, distance, speed, position,
+                                     **fields))
+        for event in events:
+            logger.info(f"Event {event['kind']}: {' / '.join(event['bodies'])} at t={event['time']:.0f}s")
+        return events
+
+    def resolve(self, bodies, events):
+        if not self.resolve_collisions:
+            return False
+        changed = False
+        for event in events:
+            if event["kind"] == "merge":
+                survivor, absorbed = bodies.get(event["bodies"][0]), bodies.get(event["bodies"][1])
+                if survivor is None or absorbed is None:
+                    continue
+                mass = survivor.mass + absorbed.mass
+                if mass > 0:
+                    survivor.position = (survivor.position * survivor.mass + absorbed.position * absorbed.mass) / mass
+                    survivor.velocity = (survivor.velocity * survivor.mass + absorbed.velocity * absorbed.mass) / mass
+                survivor.mass = mass
+                survivor.radius = (survivor.radius ** 3 + absorbed.radius ** 3) ** (1 / 3)
+                bodies.remove(absorbed)
+                changed = True
+            elif event["kind"] == "impact":
+                impactor = bodies.get(event["bodies"][0])
+                if impactor is not None:
+                    bodies.remove(impactor)
+                    changed = True
+        if changed:
+            self.prune(bodies)
+        return changed
+
+    def stats(self):
+        counts = collections.Counter(event["kind"] for event in self.events)
+        return {
+            "events": len(self.events),
+            "next_id": self.next_id,
+            "kinds": {kind: counts.get(kind, 0) for kind in EVENT_KINDS},
+            "watches": list(self.watches.values()),
+            "candidate_pairs": self.candidate_pairs,
+            "rejected_collisions": self.rejected_collisions,
+            "seconds": self.seconds,
+            "resolve_collisions": self.resolve_collisions
+        }
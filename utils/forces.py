@@ -0,0 +1,73 @@
+import time
+import numpy as np
+from utils.physics import compute_accelerations, dynamical_timescales
+from utils.barnes_hut import barnes_hut_accelerations
+
+FORCE_MODES = ("direct", "barnes_hut")
+TEST_PARTICLE_TYPES = ("spacecraft", "asteroid", "comet")
+KEPLER_TOLERANCE = 1e-3
+
+
+class ForceModel:
+    def __init__(self, mode="direct", theta=0.5, leaf_size=8, test_particles=True,
+                 test_particle_types=TEST_PARTICLE_TYPES, test_particle_mass=0.0, hybrid=False,
+                 kepler_tolerance=KEPLER_TOLERANCE):
+        if mode not in FORCE_MODES:
+            raise ValueError(f"Unknown force mode: {mode}")
+        self.mode = mode
+        self.theta = theta
+        self.leaf_size = leaf_size
+        self.test_particles = test_particles
+        self.test_particle_types = tuple(test_particle_types)
+        self.test_particle_mass = test_particle_mass
+        self.hybrid = hybrid
+        self.kepler_tolerance = kepler_tolerance
+
+    def source_masses(self, bodies):
+        masses = bodies.masses.copy()
+        if not self.test_particles:
+            return masses
+        masses[masses < self.test_particle_mass] = 0.0
+        for type in self.test_particle_types:
+            masses[bodies.indices_of_type(type)] = 0.0
+        return masses
+
+    def accelerator(self, masses):
+        return Accelerator(self, masses)
+
+    def to_dict(self):
+        return {"mode": self.mode, "theta": self.theta, "test_particles": self.test_particles, "hybrid": self.hybrid,
+                "kepler_tolerance": self.kepler_tolerance}
+
+
+class Accelerator:
+    def __init__(self, force_model, masses):
+        self.force_model = force_model
+        self.masses = np.asarray(masses, dtype=float)
+        self.sources = np.flatnonzero(self.masses > 0)
+        self.all_sources = len(self.sources) == len(self.masses)
+        self.source_masses = self.masses if self.all_sources else self.masses[self.sources]
+        self.evaluations = 0
+        self.seconds = 0.0
+
+    def _source_positions(self, positions):
+        return positions if self.all_sources else positions[self.sources]
+
+    def __call__(self, positions, targets=None):
+        started = time.perf_counter()
+        target_positions = positions if targets is None else positions[targets]
+        source_positions = self._source_positions(positions)
+        if self.force_model.mode == "barnes_hut":
+            accelerations = barnes_hut_accelerations(self.source_masses, source_positions, self.force_model.theta,
+                                                     leaf_size=self.force_model.leaf_size,
+                                                     target_positions=target_positions)
+        else:
+            accelerations = compute_accelerations(self.source_masses, source_positions,
+                                                  target_positions=target_positions)
+        self.evaluations += 1
+        self.seconds += time.perf_counter() - started
+        return accelerations
+
+    def timescales(self, positions):
+        return dynamical_timescales(self.source_masses, self._source_positions(positions),
+                                    target_positions=positions, target_masses=self.masses)
@@ -0,0 +1,185 @@
+import struct
+import numpy as np
+from utils.broadcast import encode_json
+
+BINARY_SUBPROTOCOL = "solar.bin.v1"
+DELTA_SUBPROTOCOL = "solar.delta.v1"
+SUBPROTOCOLS = (DELTA_SUBPROTOCOL, BINARY_SUBPROTOCOL)
+
+FRAME_KIND = 1
+KEYFRAME_KIND = 2
+DELTA_KIND = 3
+FLAG_VELOCITIES = 1
+FLAG_FLOAT32 = 2
+FLAG_PAUSED = 4
+FLAG_CULLED = 8
+
+FRAME_HEADER = struct.Struct("<BBHIIidddd")
+DELTA_HEADER = struct.Struct("<BBHIIidddddddd")
+DELTA_LIMIT = np.iinfo(np.int16).max
+
+
+class Frame:
+    def __init__(self, roster_version, roster, positions, velocities, scene, tracked_index=-1, timestamp=0.0,
+                 indices=None, index_of=None):
+        self.roster_version = roster_version
+        self.roster = roster
+        self.positions = positions
+        self.velocities = velocities
+        self.scene = scene
+        self.tracked_index = tracked_index
+        self.timestamp = timestamp
+        self.indices = indices
+        self.index_of = index_of
+        self.spatial_index = None
+        self.views = {}
+        self.encoded = {}
+
+    def entries(self):
+        if self.indices is None:
+            return self.roster
+        return [self.roster[index] for index in self.indices]
+
+
+def static_table(bodies):
+    return [{
+        "name": body.name,
+        "type": body.type,
+        "color": color,
+        "radius": radius,
+        "tail_length": getattr(body, 'tail_length', None)
+    } for body, color, radius in zip(bodies, bodies.colors.tolist(), bodies.radii.tolist())]
+
+
+def encode_json_frame(frame):
+    positions = frame.positions.tolist()
+    velocities = frame.velocities.tolist()
+    return encode_json({
+        "bodies": [dict(entry, position=position, velocity=velocity)
+                   for entry, position, velocity in zip(frame.entries(), positions, velocities)],
+        "scene": frame.scene
+    })
+
+
+def encode_roster(frame):
+    return encode_json({
+        "type": "roster",
+        "version": frame.roster_version,
+        "bodies": frame.roster
+    })
+
+
+def encode_scene(frame):
+    return encode_json({
+        "type": "scene",
+        "tracked_body": frame.scene["tracked_body"],
+        "integrator": frame.scene["integrator"],
+        "quality": frame.scene.get("quality")
+    })
+
+
+def encode_binary_frame(frame, velocities=True, float32=False):
+    dtype = np.dtype("<f4" if float32 else "<f8")
+    flags = 0
+    if velocities:
+        flags |= FLAG_VELOCITIES
+    if float32:
+        flags |= FLAG_FLOAT32
+    if frame.scene["pause"]:
+        flags |= FLAG_PAUSED
+    if frame.indices is not None:
+        flags |= FLAG_CULLED
+    header = FRAME_HEADER.pack(
+        FRAME_KIND, flags, 0, frame.roster_version, len(frame.positions), frame.tracked_index,
+        frame.scene["scale"], frame.scene["offset"][0], frame.scene["offset"][1], frame.scene["time_scale"])
+    parts = [header, np.ascontiguousarray(frame.positions, dtype=dtype).tobytes()]
+    if velocities:
+        parts.append(np.ascontiguousarray(frame.velocities, dtype=dtype).tobytes())
+    if frame.indices is not None:
+        parts.append(np.ascontiguousarray(frame.indices, dtype="<u4").tobytes())
+    return b"".join(parts)
+
+
+def _same_indices(first, second):
+    if first is None or second is None:
+        return first is second
+    return np.array_equal(first, second)
+
+
+class DeltaEncoder:
+    def __init__(self, keyframe_interval=20, subpixels=16, center=(960, 480)):
+        self.keyframe_interval = keyframe_interval
+        self.subpixels = subpixels
+        self.center = center
+        self.keyframes = 0
+        self.deltas = 0
+        self._quantized = None
+        self._origin = None
+        self._quantum = None
+        self._scale = None
+        self._roster_version = None
+        self._indices = None
+        self._since_keyframe = 0
+
+    def _anchor(self, frame):
+        scene = frame.scene
+        if frame.tracked_index >= 0:
+            origin = frame.positions[frame.tracked_index]
+        else:
+            origin = (np.asarray(self.center, dtype=float) - scene["offset"]) / scene["scale"]
+        self._origin = np.array(origin, dtype=float)
+        self._quantum = 1.0 / (scene["scale"] * self.subpixels)
+        self._scale = scene["scale"]
+        self._roster_version = frame.roster_version
+        self._indices = frame.indices
+
+    def _quantize(self, positions):
+        limit = np.iinfo(np.int32).max
+        return np.clip(np.rint((positions - self._origin) / self._quantum), -limit, limit).astype(np.int32)
+
+    def _header(self, frame, kind):
+        scene = frame.scene
+        flags = FLAG_PAUSED if scene["pause"] else 0
+        if frame.indices is not None:
+            flags |= FLAG_CULLED
+        return DELTA_HEADER.pack(
+            kind, flags, 0, frame.roster_version, len(frame.positions), frame.tracked_index,
+            frame.timestamp, scene["scale"], scene["offset"][0], scene["offset"][1], scene["time_scale"],
+            self._origin[0], self._origin[1], self._quantum)
+
+    def _needs_keyframe(self, frame):
+        return (self._quantized is None
+                or frame.roster_version != self._roster_version
+                or frame.scene["scale"] != self._scale
+                or self._since_keyframe >= self.keyframe_interval
+                or not _same_indices(frame.indices, self._indices))
+
+    def encode(self, frame):
+        if not self._needs_keyframe(frame):
+            quantized = self._quantize(frame.positions)
+            delta = quantized.astype(np.int64) - self._quantized
+            if np.abs(delta).max(initial=0) <= DELTA_LIMIT:
+                self._quantized = quantized
+                self._since_keyframe += 1
+                self.deltas += 1
+                return self._header(frame, DELTA_KIND) + delta.astype("<i2").tobytes()
+        self._anchor(frame)
+        self._quantized = self._quantize(frame.positions)
+        self._since_keyframe = 0
+        self.keyframes += 1
+        parts = [
+            self._header(frame, KEYFRAME_KIND),
+            self._quantized.astype("<i4").tobytes(),
+            np.ascontiguousarray(frame.velocities, dtype="<f4").tobytes()
+        ]
+        if frame.indices is not None:
+            parts.append(np.ascontiguousarray(frame.indices, dtype="<u4").tobytes())
+        return b"".join(parts)
+
+
+FRAME_ENCODERS = {
+    "json": encode_json_frame,
+    "roster": encode_roster,
+    "scene": encode_scene,
+    "binary": encode_binary_frame,
+}
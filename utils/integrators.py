@@ -0,0 +1,219 @@
+import numpy as np
+
+
+def rk4_step(accelerate, positions, velocities, dt):
+    k1_r = velocities
+    k1_v = accelerate(positions)
+    k2_r = velocities + k1_v * (dt / 2)
+    k2_v = accelerate(positions + k1_r * (dt / 2))
+    k3_r = velocities + k2_v * (dt / 2)
+    k3_v = accelerate(positions + k2_r * (dt / 2))
+    k4_r = velocities + k3_v * dt
+    k4_v = accelerate(positions + k3_r * dt)
+    new_positions = positions + (k1_r + 2*k2_r + 2*k3_r + k4_r) * (dt / 6)
+    new_velocities = velocities + (k1_v + 2*k2_v + 2*k3_v + k4_v) * (dt / 6)
+    return new_positions, new_velocities
+
+
+def _fixed_steps(duration, dt):
+    steps = int(duration // dt)
+    for _ in range(steps):
+        yield dt
+    remainder = duration - steps * dt
+    if remainder > 1e-9 * dt:
+        yield remainder
+
+
+class RK4Integrator:
+    name = "rk4"
+
+    def advance(self, accelerate, positions, velocities, duration, dt):
+        for h in _fixed_steps(duration, dt):
+            positions, velocities = rk4_step(accelerate, positions, velocities, h)
+            yield h, positions, velocities
+
+
+class LeapfrogIntegrator:
+    name = "leapfrog"
+
+    def __init__(self):
+        self._positions = None
+        self._accelerations = None
+
+    def _accelerations_at(self, accelerate, positions):
+        if self._positions is not None and self._positions.shape == positions.shape \
+                and np.array_equal(self._positions, positions):
+            return self._accelerations
+        return accelerate(positions)
+
+    def advance(self, accelerate, positions, velocities, duration, dt):
+        accelerations = self._accelerations_at(accelerate, positions)
+        for h in _fixed_steps(duration, dt):
+            half_velocities = velocities + accelerations * (h / 2)
+            positions = positions + half_velocities * h
+            accelerations = accelerate(positions)
+            velocities = half_velocities + accelerations * (h / 2)
+            self._positions = positions.copy()
+            self._accelerations = accelerations
+            yield h, positions, velocities
+
+
+class DormandPrinceIntegrator:
+    name = "rk45"
+
+    A = (
+        (),
+        (1/5,),
+        (3/40, 9/40),
+        (44/45, -56/15, 32/9),
+        (19372/6561, -25360/2187, 64448/6561, -212/729),
+        (9017/3168, -355/33, 46732/5247, 49/176, -5103/18656),
+        (35/384, 0, 500/1113, 125/192, -2187/6784, 11/84),
+    )
+    B = (35/384, 0, 500/1113, 125/192, -2187/6784, 11/84, 0)
+    E = (71/57600, 0, -71/16695, 71/1920, -17253/339200, 22/525, -1/40)
+
+    def __init__(self, rtol=1e-9, position_atol=1e3, velocity_atol=1e-3,
+                 safety=0.9, min_factor=0.2, max_factor=5.0, min_step=1.0):
+        self.rtol = rtol
+        self.position_atol = position_atol
+        self.velocity_atol = velocity_atol
+        self.safety = safety
+        self.min_factor = min_factor
+        self.max_factor = max_factor
+        self.min_step = min_step
+        self.step_size = None
+        self.rejected_steps = 0
+
+    def _try_step(self, accelerate, positions, velocities, accelerations, h):
+        k_r = [velocities]
+        k_v = [accelerations]
+        for a_row in self.A[1:]:
+            stage_positions = positions
+            stage_velocities = velocities
+            for a, dr, dv in zip(a_row, k_r, k_v):
+                if a:
+                    stage_positions = stage_positions + dr * (a * h)
+                    stage_velocities = stage_velocities + dv * (a * h)
+            k_r.append(stage_velocities)
+            k_v.append(accelerate(stage_positions))
+        new_positions = positions + h * sum(b * dr for b, dr in zip(self.B, k_r) if b)
+        new_velocities = velocities + h * sum(b * dv for b, dv in zip(self.B, k_v) if b)
+        error_r = h * sum(e * dr for e, dr in zip(self.E, k_r) if e)
+        error_v = h * sum(e * dv for e, dv in zip(self.E, k_v) if e)
+        scale_r = self.position_atol + self.rtol * np.maximum(np.abs(positions), np.abs(new_positions))
+        scale_v = self.velocity_atol + self.rtol * np.maximum(np.abs(velocities), np.abs(new_velocities))
+        error = max(np.max(np.abs(error_r) / scale_r, initial=0.0),
+                    np.max(np.abs(error_v) / scale_v, initial=0.0))
+        return new_positions, new_velocities, k_v[-1], error
+
+    def advance(self, accelerate, positions, velocities, duration, dt):
+        elapsed = 0.0
+        h = self.step_size or dt
+        accelerations = accelerate(positions)
+        while elapsed < duration * (1 - 1e-12):
+            h_try = min(max(h, self.min_step), duration - elapsed)
+            new_positions, new_velocities, new_accelerations, error = self._try_step(
+                accelerate, positions, velocities, accelerations, h_try)
+            if error == 0:
+                factor = self.max_factor
+            else:
+                factor = min(self.max_factor, max(self.min_factor, self.safety * error ** -0.2))
+            if error <= 1 or h_try <= self.min_step:
+                elapsed += h_try
+                positions, velocities, accelerations = new_positions, new_velocities, new_accelerations
+                if h_try == h:
+                    h = h_try * factor
+                    self.step_size = h
+                else:
+                    self.step_size = max(h, h_try * factor)
+                yield h_try, positions, velocities
+            else:
+                self.rejected_steps += 1
+                h = h_try * factor
+
+
+class BlockTimestepIntegrator:
+    name = "block"
+
+    def __init__(self, eta=0.1, max_level=8, block_factor=8):
+        self.eta = eta
+        self.max_level = max_level
+        self.block_factor = block_factor
+        self.levels = None
+        self.substeps = 0
+        self._positions = None
+        self._accelerations = None
+
+    def _accelerations_at(self, accelerate, positions):
+        if self._positions is not None and self._positions.shape == positions.shape \
+                and np.array_equal(self._positions, positions):
+            return self._accelerations.copy()
+        return accelerate(positions)
+
+    def _levels(self, accelerate, positions, h):
+        timescales = accelerate.timescales(positions) * self.eta
+        levels = np.zeros(len(positions), dtype=np.int64)
+        finite = np.isfinite(timescales) & (timescales > 0)
+        levels[finite] = np.ceil(np.log2(np.maximum(h / timescales[finite], 1.0)))
+        return np.clip(levels, 0, self.max_level)
+
+    def _block(self, accelerate, positions, velocities, accelerations, h):
+        levels = self._levels(accelerate, positions, h)
+        top = int(levels.max(initial=0))
+        substeps = 1 << top
+        h_min = h / substeps
+        count = len(positions)
+        active = [np.flatnonzero(levels >= top - depth) for depth in range(top + 1)]
+        kicks = [(h_min * 2.0 ** (top - levels[indices]))[:, np.newaxis] for indices in active]
+        sources = getattr(accelerate, "sources", None)
+        lazy = sources is not None and top > 0 and len(sources) + len(active[top - 1]) < count
+        if lazy:
+            moving = [np.union1d(sources, indices) for indices in active]
+            synced = np.zeros(count)
+        positions = positions.copy()
+        velocities = velocities + accelerations * (kicks[top] / 2)
+        for k in range(1, substeps + 1):
+            ending = (k & -k).bit_length() - 1
+            indices = active[ending]
+            if not lazy:
+                positions += velocities * h_min
+            else:
+                drifting = moving[ending]
+                positions[drifting] += velocities[drifting] * ((k - synced[drifting]) * h_min)[:, np.newaxis]
+                synced[drifting] = k
+            kick = kicks[ending] if k < substeps else kicks[ending] / 2
+            if len(indices) == count:
+                accelerations = accelerate(positions)
+                velocities += accelerations * kick
+            else:
+                step_accelerations = accelerate(positions, indices)
+                accelerations[indices] = step_accelerations
+                velocities[indices] += step_accelerations * kick
+        self.levels = levels
+        self.substeps += substeps
+        return positions, velocities, accelerations
+
+    def advance(self, accelerate, positions, velocities, duration, dt):
+        accelerations = self._accelerations_at(accelerate, positions)
+        for h in _fixed_steps(duration, dt * self.block_factor):
+            positions, velocities, accelerations = self._block(accelerate, positions, velocities, accelerations, h)
+            self._positions = positions.copy()
+            self._accelerations = accelerations.copy()
+            yield h, positions, velocities
+
+
+INTEGRATORS = {
+    RK4Integrator.name: RK4Integrator,
+    LeapfrogIntegrator.name: LeapfrogIntegrator,
+    DormandPrinceIntegrator.name: DormandPrinceIntegrator,
+    BlockTimestepIntegrator.name: BlockTimestepIntegrator,
+}
+
+
+def create_integrator(name, **options):
+    try:
+        integrator_class = INTEGRATORS[name]
+    except KeyError:
+        raise ValueError(f"Unknown integrator: {name}")
+    return integrator_class(**options)
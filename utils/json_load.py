@@ -1,4 +1,8 @@
+import inspect
 import json
+import logging
+import numpy as np
+from entities.body_system import BodySystem
 from entities.star import Star
 from entities.planet import Planet
 from entities.moon import Moon
@@ -6,31 +10,105 @@ from entities.comet import Comet
 from entities.asteroid import Asteroid
 from entities.spacecraft import Spacecraft
 
+logger = logging.getLogger(__name__)
 
-def load_bodies_from_json(file_path):
+BODY_TYPES = {}
+BODY_SCHEMAS = {}
+
+
+def register_body_type(type, cls):
+    fields = tuple(name for name in inspect.signature(cls.__init__).parameters if name != "self")
+    BODY_TYPES[type] = cls
+    BODY_SCHEMAS[type] = frozenset(fields)
+    return cls
+
+
+for _type, _cls in (("star", Star), ("planet", Planet), ("moon", Moon), ("comet", Comet), ("asteroid", Asteroid),
+                    ("spacecraft", Spacecraft)):
+    register_body_type(_type, _cls)
+
+
+def _describe(index, record):
+    name = record.get("name") if isinstance(record, dict) else None
+    return f"record {index}" + (f" ({name})" if name else "")
+
+
+def validate_records(records):
+    if not isinstance(records, list):
+        raise ValueError("Body file must contain a list of records")
+    accepted = []
+    names = set()
+    for index, record in enumerate(records):
+        if not isinstance(record, dict):
+            raise ValueError(f"{_describe(index, record)} is not an object")
+        if "type" not in record:
+            raise ValueError(f"{_describe(index, record)}: missing field type")
+        schema = BODY_SCHEMAS.get(record["type"])
+        if schema is None:
+            logger.warning(f"Skipping {_describe(index, record)}: unknown type {record.get('type')}")
+            continue
+        keys = record.keys()
+        if keys != schema:
+            missing = sorted(schema - keys)
+            unknown = sorted(keys - schema)
+            raise ValueError(f"{_describe(index, record)}: missing fields {missing}, unknown fields {unknown}")
+        if not isinstance(record["name"], str) or not record["name"]:
+            raise ValueError(f"{_describe(index, record)}: name must be a non-empty string")
+        if record["name"] in names:
+            raise ValueError(f"{_describe(index, record)}: duplicate name")
+        names.add(record["name"])
+        accepted.append(record)
+    return accepted
+
+
+def _valid(values, shape, minimum, maximum):
+    return values.shape == shape and bool(np.isfinite(values).all() and (values >= minimum).all() and
+                                          (values <= maximum).all())
+
+
+def _column(records, field, width=None, minimum=-np.inf, maximum=np.inf):
+    shape = () if width is None else (width,)
+    if not records:
+        return np.zeros((0,) + shape)
+    try:
+        values = np.array([record[field] for record in records], dtype=float)
+    except (TypeError, ValueError):
+        values = None
+    if values is not None and _valid(values, (len(records),) + shape, minimum, maximum):
+        return values.reshape((len(records),) + shape)
+    for index, record in enumerate(records):
+        try:
+            if _valid(np.asarray(record[field], dtype=float), shape, minimum, maximum):
+                continue
+        except (TypeError, ValueError):
+            pass
+        raise ValueError(f"{_describe(index, record)}: invalid {field} {record[field]!r}")
+    raise ValueError(f"invalid {field} values")
+
+
+def build_bodies(records, masses, positions, velocities, trajectories=None, ephemeris=None):
+    radii = _column(records, "radius", minimum=0)
+    colors = _column(records, "color", 3, minimum=0, maximum=255).astype(np.uint8)
+    bodies = [BODY_TYPES[record["type"]].from_fields(record, mass, position, velocity)
+              for record, mass, position, velocity in zip(records, masses.tolist(), positions, velocities)]
+    return BodySystem.from_arrays(bodies, masses, positions, velocities, radii, colors, trajectories=trajectories,
+                                  ephemeris=ephemeris)
+
+
+def load_bodies_from_records(records, trajectories=None, ephemeris=None):
+    records = validate_records(records)
+    masses = _column(records, "mass", minimum=0)
+    positions = _column(records, "position", 2)
+    velocities = _column(records, "velocity", 2)
+    return build_bodies(records, masses, positions, velocities, trajectories, ephemeris)
+
+
+def load_bodies_from_json(file_path, trajectories=None, ephemeris=None):
     with open(file_path, "r") as file:
         data = json.load(file)
-    bodies = []
-    for body_data in data:
-        if body_data["type"] == "star":
-            bodies.append(Star(**body_data))
-        elif body_data["type"] == "planet":
-            bodies.append(Planet(**body_data))
-        elif body_data["type"] == "moon":
-            bodies.append(Moon(**body_data))
-        elif body_data["type"] == "comet":
-            bodies.append(Comet(**body_data))
-        elif body_data["type"] == "asteroid":
-            bodies.append(Asteroid(**body_data))
-        elif body_data["type"] == "spacecraft":
-            bodies.append(Spacecraft(**body_data))
-    return bodies
+    return load_bodies_from_records(data, trajectories=trajectories, ephemeris=ephemeris)
 
 
 def save_bodies_to_json(file_path, bodies):
-    data = []
-    for body in bodies:
-        data.append(body.to_dict())
-    
     with open(file_path, "w") as file:
-        json.dump(data, file, indent=4)
\ No newline at end of file
+        json.dump(bodies.to_records(), file, indent=4)
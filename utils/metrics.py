@@ -0,0 +1,171 @@
+import bisect
+import collections
+import math
+import time
+
+TIME_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+
+def _format_value(value):
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value))
+
+
+def _format_labels(names, values):
+    if not names:
+        return ""
+    pairs = []
+    for name, value in zip(names, values):
+        escaped = str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        pairs.append(f'{name}="{escaped}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.values = {}
+
+    def set(self, value, labels=()):
+        self.values[labels] = value
+
+    def clear(self):
+        self.values.clear()
+
+    def samples(self):
+        for labels, value in self.values.items():
+            yield self.name, self.labels, labels, value
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount=1.0, labels=()):
+        self.values[labels] = self.values.get(labels, 0.0) + amount
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=TIME_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, labels=()):
+        state = self.values.get(labels)
+        if state is None:
+            state = self.values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        state[0][bisect.bisect_left(self.buckets, value)] += 1
+        state[1] += value
+        state[2] += 1
+
+    def samples(self):
+        names = self.labels + ("le",)
+        for labels, (counts, total, count) in self.values.items():
+            cumulative = 0
+            for bound, bucket in zip(self.buckets + (math.inf,), counts):
+                cumulative += bucket
+                yield self.name + "_bucket", names, labels + (_format_value(bound),), cumulative
+            yield self.name + "_sum", self.labels, labels, total
+            yield self.name + "_count", self.labels, labels, count
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.metrics = {}
+
+    def register(self, metric):
+        if metric.name in self.metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, help, labels=()):
+        return self.register(Counter(name, help, labels))
+
+    def gauge(self, name, help, labels=()):
+        return self.register(Gauge(name, help, labels))
+
+    def histogram(self, name, help, labels=(), buckets=TIME_BUCKETS):
+        return self.register(Histogram(name, help, labels, buckets))
+
+    def render(self):
+        lines = []
+        for metric in self.metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, label_names, label_values, value in metric.samples():
+                lines.append(f"{name}{_format_labels(label_names, label_values)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+class TickTrace:
+    def __init__(self, capacity=0):
+        self.records = collections.deque(maxlen=max(capacity, 1))
+        self.enabled = capacity > 0
+        self.recorded = 0
+
+    @property
+    def capacity(self):
+        return self.records.maxlen if self.enabled else 0
+
+    def resize(self, capacity):
+        self.records = collections.deque(self.records if capacity > 0 else (), maxlen=max(capacity, 1))
+        self.enabled = capacity > 0
+
+    def record(self, **fields):
+        if not self.enabled:
+            return
+        fields["wall_time"] = time.time()
+        self.records.append(fields)
+        self.recorded += 1
+
+    def to_dict(self):
+        return {"capacity": self.capacity, "recorded": self.recorded, "ticks": list(self.records)}
+
+
+REGISTRY = MetricsRegistry()
+
+TICK_SECONDS = REGISTRY.histogram(
+    "solar_tick_seconds", "Time spent in one simulation tick", ("session",))
+TICK_JITTER_SECONDS = REGISTRY.histogram(
+    "solar_tick_jitter_seconds", "Lateness of the tick start against its deadline", ("session",))
+TICK_OVERRUNS = REGISTRY.counter(
+    "solar_tick_overruns_total", "Ticks that finished after the next deadline", ("session",))
+PHYSICS_STEP_SECONDS = REGISTRY.histogram(
+    "solar_physics_step_seconds", "Wall time of one physics step including the worker round trip",
+    ("session", "integrator"))
+PHYSICS_STAGE_SECONDS = REGISTRY.counter(
+    "solar_physics_stage_seconds_total", "Physics time per integrator stage (force, integrate, commit, events)",
+    ("session", "integrator", "stage"))
+FORCE_EVALUATIONS = REGISTRY.counter(
+    "solar_force_evaluations_total", "Force evaluations performed by the integrators", ("session", "mode"))
+INTEGRATOR_STEPS = REGISTRY.counter(
+    "solar_integrator_steps_total", "Integrator steps accepted", ("session", "integrator"))
+EVENTS = REGISTRY.counter(
+    "solar_events_total", "Collision and close-approach events detected", ("session", "kind"))
+ENCODE_SECONDS = REGISTRY.histogram(
+    "solar_frame_encode_seconds", "Time to serialize one frame", ("format",))
+SEND_SECONDS = REGISTRY.histogram(
+    "solar_frame_send_seconds", "Time to send one frame to one client", ("protocol",))
+FRAMES_SENT = REGISTRY.counter(
+    "solar_frames_sent_total", "Frames sent to clients", ("session", "protocol"))
+FRAMES_DROPPED = REGISTRY.counter(
+    "solar_frames_dropped_total", "Frames dropped for slow clients", ("session",))
+BODIES = REGISTRY.gauge("solar_bodies", "Number of bodies", ("session",))
+QUALITY_TIER = REGISTRY.gauge("solar_quality_tier", "Current quality degradation tier (0 is full quality)",
+                              ("session",))
+KEPLER_BODIES = REGISTRY.gauge("solar_kepler_bodies", "Bodies advanced analytically in the last step", ("session",))
+SUBSCRIBERS = REGISTRY.gauge("solar_subscribers", "Connected frame subscribers", ("session",))
+TRAJECTORY_BYTES = REGISTRY.gauge("solar_trajectory_bytes", "Memory held by trajectory buffers", ("session",))
+EPHEMERIS_BYTES = REGISTRY.gauge("solar_ephemeris_bytes", "Size of the ephemeris cache files", ("session",))
+ACTIVE_SESSIONS = REGISTRY.gauge("solar_sessions_active", "Sessions currently in memory")
@@ -0,0 +1,175 @@
+import numpy as np
+from utils.physics import G
+
+ORBIT_FIELDS = ("semi_major_axis", "eccentricity", "argument_of_periapsis", "true_anomaly", "mean_anomaly",
+                "periapsis", "apoapsis", "period", "specific_energy", "angular_momentum")
+
+
+def dominant_attractors(masses, positions, target_positions, target_masses=None):
+    masses = np.asarray(masses, dtype=float)
+    count = len(target_positions)
+    if count == 0 or len(masses) == 0:
+        return np.full(count, -1, dtype=np.int64)
+    if target_masses is None:
+        target_masses = np.zeros(count)
+    r = positions[np.newaxis, :, :] - target_positions[:, np.newaxis, :]
+    dist_sq = np.einsum("ijk,ijk->ij", r, r)
+    strength = np.zeros_like(dist_sq)
+    eligible = (dist_sq > 0) & (masses[np.newaxis, :] > np.asarray(target_masses, dtype=float)[:, np.newaxis])
+    np.divide(masses[np.newaxis, :], dist_sq ** 1.5, out=strength, where=eligible)
+    attractors = strength.argmax(axis=1)
+    attractors[~eligible.any(axis=1)] = -1
+    return attractors
+
+
+def orbital_elements(mu, relative_positions, relative_velocities):
+    mu = np.asarray(mu, dtype=float)
+    distance = np.linalg.norm(relative_positions, axis=1)
+    speed_sq = np.einsum("ij,ij->i", relative_velocities, relative_velocities)
+    radial = np.einsum("ij,ij->i", relative_positions, relative_velocities)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        energy = speed_sq / 2 - mu / distance
+        semi_major_axis = -mu / (2 * energy)
+        eccentricity_vector = ((speed_sq - mu / distance)[:, np.newaxis] * relative_positions
+                               - radial[:, np.newaxis] * relative_velocities) / mu[:, np.newaxis]
+        eccentricity = np.linalg.norm(eccentricity_vector, axis=1)
+        angular_momentum = (relative_positions[:, 0] * relative_velocities[:, 1]
+                            - relative_positions[:, 1] * relative_velocities[:, 0])
+        periapsis = angular_momentum ** 2 / mu / (1 + eccentricity)
+        bound = energy < 0
+        apoapsis = np.where(bound, semi_major_axis * (1 + eccentricity), np.inf)
+        period = np.where(bound, 2 * np.pi * np.sqrt(np.abs(semi_major_axis) ** 3 / mu), np.inf)
+        argument_of_periapsis = np.arctan2(eccentricity_vector[:, 1], eccentricity_vector[:, 0])
+        direction = np.where(angular_momentum < 0, -1.0, 1.0)
+        true_anomaly = direction * (np.arctan2(relative_positions[:, 1], relative_positions[:, 0])
+                                    - argument_of_periapsis)
+        true_anomaly = np.mod(true_anomaly + np.pi, 2 * np.pi) - np.pi
+        eccentric_anomaly = np.arctan2(np.sqrt(np.clip(1 - eccentricity ** 2, 0.0, None)) * np.sin(true_anomaly),
+                                       eccentricity + np.cos(true_anomaly))
+        mean_anomaly = np.where(bound, eccentric_anomaly - eccentricity * np.sin(eccentric_anomaly), np.nan)
+    return {
+        "semi_major_axis": semi_major_axis,
+        "eccentricity": eccentricity,
+        "argument_of_periapsis": argument_of_periapsis,
+        "true_anomaly": true_anomaly,
+        "mean_anomaly": mean_anomaly,
+        "periapsis": periapsis,
+        "apoapsis": apoapsis,
+        "period": period,
+        "specific_energy": energy,
+        "angular_momentum": angular_momentum,
+        "bound": bound
+    }
+
+
+def elements_about_attractors(masses, positions, velocities, targets, target_masses=None, attractors=None):
+    masses = np.asarray(masses, dtype=float)
+    dominant = dominant_attractors(masses, positions, positions[targets], target_masses)
+    attractors = dominant if attractors is None else np.where(attractors >= 0, attractors, dominant)
+    found = attractors >= 0
+    attractor_rows = np.where(found, attractors, 0)
+    mu = G * (masses[attractor_rows] + (0.0 if target_masses is None else np.asarray(target_masses, dtype=float)))
+    elements = orbital_elements(mu, positions[targets] - positions[attractor_rows],
+                                velocities[targets] - velocities[attractor_rows])
+    elements["attractor"] = attractors
+    return elements
+
+
+def body_elements(bodies, indices=None):
+    indices = np.arange(len(bodies)) if indices is None else np.asarray(indices, dtype=np.int64)
+    parents = [bodies.index_of(getattr(bodies[index], "parent_planet", None) or "") for index in indices.tolist()]
+    attractors = np.array([-1 if parent is None else parent for parent in parents], dtype=np.int64)
+    masses = bodies.masses
+    return elements_about_attractors(masses, bodies.positions, bodies.velocities, indices, masses[indices],
+                                     attractors)
+
+
+def orbit_paths(elements, centers, points):
+    anomaly = np.linspace(0.0, 2 * np.pi, points)
+    semi_major_axis = elements["semi_major_axis"][:, np.newaxis]
+    eccentricity = elements["eccentricity"][:, np.newaxis]
+    direction = np.where(elements["angular_momentum"] < 0, -1.0, 1.0)[:, np.newaxis]
+    with np.errstate(invalid="ignore"):
+        x = semi_major_axis * (np.cos(anomaly) - eccentricity)
+        y = direction * semi_major_axis * np.sqrt(1 - eccentricity ** 2) * np.sin(anomaly)
+    cos_w = np.cos(elements["argument_of_periapsis"])[:, np.newaxis]
+    sin_w = np.sin(elements["argument_of_periapsis"])[:, np.newaxis]
+    return centers[:, np.newaxis, :] + np.stack([x * cos_w - y * sin_w, x * sin_w + y * cos_w], axis=-1)
+
+
+def orbit_records(bodies, indices=None, points=0):
+    indices = np.arange(len(bodies)) if indices is None else np.asarray(indices, dtype=np.int64)
+    elements = body_elements(bodies, indices)
+    attractors = elements["attractor"]
+    found = attractors >= 0
+    columns = {field: np.where(found & np.isfinite(elements[field]), elements[field], np.nan).tolist()
+               for field in ORBIT_FIELDS}
+    bound = (found & elements["bound"]).tolist()
+    paths = None
+    if points:
+        paths = orbit_paths(elements, bodies.positions[np.where(found, attractors, 0)], points)
+    records = []
+    for row, (index, attractor) in enumerate(zip(indices.tolist(), attractors.tolist())):
+        record = {"name": bodies[index].name, "attractor": bodies[attractor].name if attractor >= 0 else None}
+        for field in ORBIT_FIELDS:
+            value = columns[field][row]
+            record[field] = None if value != value else value
+        record["bound"] = bound[row]
+        if paths is not None:
+            record["path"] = paths[row].tolist() if bound[row] else None
+        records.append(record)
+    return records
+
+
+def kepler_propagate(mu, relative_positions, relative_velocities, elapsed, tolerance=1e-12, iterations=32):
+    mu = np.asarray(mu, dtype=float)
+    distance = np.linalg.norm(relative_positions, axis=1)
+    speed_sq = np.einsum("ij,ij->i", relative_velocities, relative_velocities)
+    radial = np.einsum("ij,ij->i", relative_positions, relative_velocities)
+    semi_major_axis = 1 / (2 / distance - speed_sq / mu)
+    mean_motion = np.sqrt(mu / semi_major_axis ** 3)
+    e_cos = 1 - distance / semi_major_axis
+    e_sin = radial / np.sqrt(mu * semi_major_axis)
+    eccentricity = np.hypot(e_cos, e_sin)
+    start_anomaly = np.arctan2(e_sin, e_cos)
+    mean_anomaly = np.mod(mean_motion * elapsed, 2 * np.pi)
+    elapsed = mean_anomaly / mean_motion
+    target = start_anomaly - e_sin + mean_anomaly
+    anomaly = target + 0.85 * eccentricity * np.sign(np.sin(target))
+    for _ in range(iterations):
+        residual = anomaly - eccentricity * np.sin(anomaly) - target
+        anomaly -= residual / (1 - eccentricity * np.cos(anomaly))
+        if np.abs(residual).max(initial=0.0) < tolerance:
+            break
+    delta = anomaly - start_anomaly
+    sin_delta, cos_delta = np.sin(delta), np.cos(delta)
+    radius = semi_major_axis + (distance - semi_major_axis) * cos_delta + radial * np.sqrt(semi_major_axis / mu) * \
+        sin_delta
+    f = 1 - semi_major_axis / distance * (1 - cos_delta)
+    g = elapsed - (delta - sin_delta) / mean_motion
+    f_dot = -np.sqrt(mu * semi_major_axis) * sin_delta / (radius * distance)
+    g_dot = 1 - semi_major_axis / radius * (1 - cos_delta)
+    return (f[:, np.newaxis] * relative_positions + g[:, np.newaxis] * relative_velocities,
+            f_dot[:, np.newaxis] * relative_positions + g_dot[:, np.newaxis] * relative_velocities)
+
+
+def kepler_bodies(accelerate, masses, positions, velocities, tolerance):
+    masses = np.asarray(masses, dtype=float)
+    candidates = np.flatnonzero(masses == 0)
+    sources = np.flatnonzero(masses > 0)
+    empty = np.empty(0, dtype=np.int64)
+    if len(candidates) == 0 or len(sources) == 0:
+        return empty, empty, np.empty(0)
+    attractors = dominant_attractors(masses[sources], positions[sources], positions[candidates])
+    found = attractors >= 0
+    candidates, attractors = candidates[found], sources[attractors[found]]
+    mu = G * masses[attractors]
+    relative = positions[candidates] - positions[attractors]
+    distance_sq = np.einsum("ij,ij->i", relative, relative)
+    central = -mu[:, np.newaxis] * relative / distance_sq[:, np.newaxis] ** 1.5
+    accelerations = accelerate(positions, np.concatenate([candidates, attractors]))
+    perturbation = accelerations[:len(candidates)] - central - accelerations[len(candidates):]
+    elements = orbital_elements(mu, relative, velocities[candidates] - velocities[attractors])
+    ratio = np.linalg.norm(perturbation, axis=1) / np.linalg.norm(central, axis=1)
+    selected = elements["bound"] & (ratio < tolerance)
+    return candidates[selected], attractors[selected], mu[selected]
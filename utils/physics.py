@@ -1,33 +1,64 @@
 import numpy as np
 
 G = 6.67430e-11
+CHUNK_ELEMENTS = 1 << 20
 
-def compute_acceleration(bodies, index):
-    acceleration = np.zeros(2)
-    for i, body in enumerate(bodies):
-        if i != index:
-            r = body.position - bodies[index].position
-            r_norm = np.linalg.norm(r)
-            if r_norm > 0:
-                acceleration += G * body.mass / r_norm**3 * r
-    return acceleration
+def compute_accelerations(masses, positions, targets=None, chunk_elements=CHUNK_ELEMENTS, target_positions=None):
+    if target_positions is None:
+        target_positions = positions if targets is None else positions[targets]
+    count = len(target_positions)
+    accelerations = np.zeros((count, 2))
+    if count == 0 or len(masses) == 0:
+        return accelerations
+    gm = G * np.asarray(masses, dtype=float)
+    chunk = max(1, chunk_elements // len(masses))
+    for start in range(0, count, chunk):
+        stop = min(start + chunk, count)
+        r = positions[np.newaxis, :, :] - target_positions[start:stop, np.newaxis, :]
+        dist_sq = np.einsum("ijk,ijk->ij", r, r)
+        inv_r3 = np.zeros_like(dist_sq)
+        np.power(dist_sq, -1.5, out=inv_r3, where=dist_sq > 0)
+        accelerations[start:stop] = np.einsum("ij,ijk->ik", inv_r3 * gm, r)
+    return accelerations
 
-def rk4_step(bodies, dt):
-    new_positions = []
-    new_velocities = []
-    for i, body in enumerate(bodies):
-        k1_v = compute_acceleration(bodies, i) * dt
-        k1_r = body.velocity * dt
-        k2_v = compute_acceleration(bodies, i) * dt
-        k2_r = (body.velocity + k1_v / 2) * dt
-        k3_v = compute_acceleration(bodies, i) * dt
-        k3_r = (body.velocity + k2_v / 2) * dt
-        k4_v = compute_acceleration(bodies, i) * dt
-        k4_r = (body.velocity + k3_v) * dt
-        new_position = body.position + (k1_r + 2*k2_r + 2*k3_r + k4_r) / 6
-        new_velocity = body.velocity + (k1_v + 2*k2_v + 2*k3_v + k4_v) / 6
-        new_positions.append(new_position)
-        new_velocities.append(new_velocity)
-    for i, body in enumerate(bodies):
-        body.update_position(new_positions[i])
-        body.velocity = new_velocities[i]
\ No newline at end of file
+def dynamical_timescales(masses, positions, target_positions=None, target_masses=None,
+                         chunk_elements=CHUNK_ELEMENTS):
+    if target_positions is None:
+        target_positions = positions
+        target_masses = masses
+    count = len(target_positions)
+    timescales = np.full(count, np.inf)
+    if count == 0 or len(masses) == 0:
+        return timescales
+    masses = np.asarray(masses, dtype=float)
+    if target_masses is None:
+        target_masses = np.zeros(count)
+    chunk = max(1, chunk_elements // len(masses))
+    for start in range(0, count, chunk):
+        stop = min(start + chunk, count)
+        r = positions[np.newaxis, :, :] - target_positions[start:stop, np.newaxis, :]
+        dist_sq = np.einsum("ijk,ijk->ij", r, r)
+        gm = G * (masses[np.newaxis, :] + np.asarray(target_masses[start:stop], dtype=float)[:, np.newaxis])
+        ratio = np.full_like(dist_sq, np.inf)
+        np.divide(dist_sq ** 1.5, gm, out=ratio, where=(dist_sq > 0) & (gm > 0))
+        timescales[start:stop] = np.sqrt(ratio.min(axis=1))
+    return timescales
+
+def total_energy(masses, positions, velocities, chunk_elements=CHUNK_ELEMENTS):
+    masses = np.asarray(masses, dtype=float)
+    count = len(masses)
+    kinetic = 0.5 * float(np.sum(masses * np.einsum("ij,ij->i", velocities, velocities)))
+    potential = 0.0
+    chunk = max(1, chunk_elements // max(count, 1))
+    for start in range(0, count, chunk):
+        stop = min(start + chunk, count)
+        r = positions[np.newaxis, :, :] - positions[start:stop, np.newaxis, :]
+        dist = np.sqrt(np.einsum("ijk,ijk->ij", r, r))
+        inverse = np.zeros_like(dist)
+        np.divide(1.0, dist, out=inverse, where=dist > 0)
+        potential -= 0.5 * G * float(masses[start:stop] @ inverse @ masses)
+    return kinetic + potential
+
+def angular_momentum(masses, positions, velocities):
+    masses = np.asarray(masses, dtype=float)
+    return float(np.sum(masses * (positions[:, 0] * velocities[:, 1] - positions[:, 1] * velocities[:, 0])))
@@ -0,0 +1,72 @@
+import asyncio
+import logging
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from operations.orbit_simulation import profiled_propagate
+from utils.events import find_events
+from utils.forces import ForceModel
+
+logger = logging.getLogger(__name__)
+
+WORKER_MODES = ("thread", "process")
+
+
+def profiled_step(source_masses, positions, velocities, dt, time_scale, integrator, force_model, query=None,
+                  timescales=False):
+    end_positions, end_velocities, history, integrator, profile = profiled_propagate(
+        source_masses, positions, velocities, dt, time_scale, integrator, force_model, timescales)
+    found = None
+    if query is not None:
+        started = time.perf_counter()
+        found = find_events(query, positions, velocities, history, source_masses)
+        profile["event_seconds"] = time.perf_counter() - started
+    return end_positions, end_velocities, history, integrator, profile, found
+
+
+class PhysicsWorker:
+    def __init__(self, mode="thread", max_workers=1):
+        if mode not in WORKER_MODES:
+            raise ValueError(f"Unknown physics worker mode: {mode}")
+        self.mode = mode
+        self.max_workers = max_workers
+        self.discarded_results = 0
+        self._executor = None
+
+    def start(self):
+        if self._executor is not None:
+            return
+        if self.mode == "process":
+            self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+        else:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="physics")
+        logger.info(f"Physics worker started in {self.mode} mode with {self.max_workers} workers")
+
+    def shutdown(self):
+        if self._executor is None:
+            return
+        self._executor.shutdown(wait=True, cancel_futures=True)
+        self._executor = None
+
+    async def step(self, bodies, dt, time_scale, integrator, force_model=None, profile=None, events=None,
+                   timescales=False):
+        self.start()
+        roster = list(bodies.bodies)
+        force_model = force_model or ForceModel()
+        masses = force_model.source_masses(bodies)
+        positions, velocities = bodies.get_state()
+        loop = asyncio.get_running_loop()
+        query = events.query(bodies) if events is not None else None
+        positions, velocities, history, integrator, worker_profile, found = await loop.run_in_executor(
+            self._executor, profiled_step, masses, positions, velocities, dt, time_scale, integrator, force_model,
+            query, timescales)
+        if profile is not None:
+            profile.update(worker_profile)
+        if bodies.bodies[:len(roster)] != roster:
+            self.discarded_results += 1
+            logger.warning("Body roster changed during physics step, result discarded")
+            return integrator, [], None
+        started = time.perf_counter()
+        bodies.commit_state(positions, velocities, history)
+        if profile is not None:
+            profile["commit_seconds"] = time.perf_counter() - started
+        return integrator, history, found
@@ -0,0 +1,140 @@
+import logging
+import numpy as np
+from utils.physics import total_energy
+
+logger = logging.getLogger(__name__)
+
+QUALITY_TIERS = (
+    {"name": "full", "slow_client_stride": 1, "trajectory_spacing": 1, "kepler_tolerance": None,
+     "max_step_factor": 1},
+    {"name": "slow_clients", "slow_client_stride": 2, "trajectory_spacing": 1, "kepler_tolerance": None,
+     "max_step_factor": 1},
+    {"name": "sparse_trajectories", "slow_client_stride": 4, "trajectory_spacing": 4, "kepler_tolerance": None,
+     "max_step_factor": 1},
+    {"name": "coarse_test_particles", "slow_client_stride": 4, "trajectory_spacing": 4, "kepler_tolerance": 1e-2,
+     "max_step_factor": 1},
+    {"name": "long_steps", "slow_client_stride": 4, "trajectory_spacing": 8, "kepler_tolerance": 1e-2,
+     "max_step_factor": 4}
+)
+QUALITY_NAMES = tuple(tier["name"] for tier in QUALITY_TIERS)
+ENERGY_BUDGET = 1e-6
+SLOW_CLIENT_SHARE = 0.25
+ENERGY_CHECK_SOURCES = 500
+TIMESCALE_SAFETY = 0.25
+
+
+def source_energy(masses, positions, velocities, limit=ENERGY_CHECK_SOURCES):
+    sources = masses > 0
+    if np.count_nonzero(sources) > limit:
+        return None
+    return total_energy(masses[sources], positions[sources], velocities[sources])
+
+
+def timescale_limit(timescale, dt, safety=TIMESCALE_SAFETY):
+    if timescale is None or not np.isfinite(timescale) or dt <= 0:
+        return None
+    return 1 << max(0, int(np.floor(np.log2(max(safety * timescale / dt, 1.0)))))
+
+
+def energy_drift(before, after):
+    if before is None or after is None or before == 0:
+        return None
+    return abs(after - before) / abs(before)
+
+
+class QualityGovernor:
+    def __init__(self, interval, degrade_load=0.9, recover_load=0.5, degrade_after=3, recover_after=40,
+                 smoothing=0.3, energy_budget=ENERGY_BUDGET, timescale_safety=TIMESCALE_SAFETY):
+        self.interval = interval
+        self.degrade_load = degrade_load
+        self.recover_load = recover_load
+        self.degrade_after = degrade_after
+        self.recover_after = recover_after
+        self.smoothing = smoothing
+        self.energy_budget = energy_budget
+        self.timescale_safety = timescale_safety
+        self.level = 0
+        self.pinned = None
+        self.load = 0.0
+        self.tick_seconds = 0.0
+        self.send_seconds = 0.0
+        self.step_factor = 1
+        self.energy_drift = None
+        self.min_timescale = None
+        self.timescale_limit = None
+        self.changes = 0
+        self._over = 0
+        self._under = 0
+
+    @property
+    def tier(self):
+        return QUALITY_TIERS[self.level]
+
+    @property
+    def slow_client_seconds(self):
+        return SLOW_CLIENT_SHARE * self.interval
+
+    def pin(self, name):
+        if name is None:
+            self.pinned = None
+            return
+        self.pinned = QUALITY_NAMES.index(name)
+        self._set_level(self.pinned)
+
+    def observe(self, tick_seconds, send_seconds):
+        self.tick_seconds = tick_seconds
+        self.send_seconds = send_seconds
+        self.load += ((tick_seconds + send_seconds) / self.interval - self.load) * self.smoothing
+        if self.pinned is not None:
+            return False
+        self._over = self._over + 1 if self.load > self.degrade_load else 0
+        self._under = self._under + 1 if self.load < self.recover_load else 0
+        if self._over >= self.degrade_after and self.level < len(QUALITY_TIERS) - 1:
+            return self._set_level(self.level + 1)
+        if self._under >= self.recover_after and self.level > 0:
+            return self._set_level(self.level - 1)
+        return False
+
+    def _set_level(self, level):
+        self._over = self._under = 0
+        if level == self.level:
+            return False
+        logger.info(f"Quality tier {self.tier['name']} -> {QUALITY_TIERS[level]['name']} (load {self.load:.2f})")
+        self.level = level
+        self.changes += 1
+        self.step_factor = 1
+        self.energy_drift = None
+        return True
+
+    def record_drift(self, drift, timescale=None, dt=None):
+        self.energy_drift = drift
+        limit = self.tier["max_step_factor"]
+        if timescale is not None:
+            self.min_timescale = timescale
+            self.timescale_limit = timescale_limit(timescale, dt, self.timescale_safety)
+            if self.timescale_limit is not None:
+                limit = min(limit, self.timescale_limit)
+        if drift is None or drift > self.energy_budget:
+            self.step_factor = max(1, self.step_factor // 2)
+        elif drift < self.energy_budget / 16 and self.step_factor < limit:
+            self.step_factor *= 2
+        self.step_factor = max(1, min(self.step_factor, limit))
+
+    def stats(self):
+        return {
+            "tier": self.tier["name"],
+            "level": self.level,
+            "pinned": self.pinned is not None,
+            "load": self.load,
+            "tick_seconds": self.tick_seconds,
+            "send_seconds": self.send_seconds,
+            "interval": self.interval,
+            "step_factor": self.step_factor,
+            "min_timescale": self.min_timescale,
+            "timescale_limit": self.timescale_limit,
+            "timescale_safety": self.timescale_safety,
+            "energy_drift": self.energy_drift,
+            "energy_budget": self.energy_budget,
+            "changes": self.changes,
+            "tiers": list(QUALITY_TIERS)
+        }
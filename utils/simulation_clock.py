@@ -0,0 +1,63 @@
+import asyncio
+import inspect
+import logging
+from utils.metrics import TICK_OVERRUNS
+
+logger = logging.getLogger(__name__)
+
+
+class SimulationClock:
+    def __init__(self, tick, hub, interval=0.05, labels=()):
+        self.tick = tick
+        self.labels = labels
+        self.hub = hub
+        self.interval = interval
+        self.tick_count = 0
+        self.overruns = 0
+        self.jitter = 0.0
+        self._task = None
+
+    @property
+    def running(self):
+        return self._task is not None and not self._task.done()
+
+    def start(self):
+        if self.running:
+            return
+        self._task = asyncio.create_task(self._run())
+        logger.info(f"Simulation clock started at {1 / self.interval:.0f} Hz")
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        logger.info("Simulation clock stopped")
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        next_tick = loop.time()
+        while True:
+            self.jitter = max(loop.time() - next_tick, 0.0)
+            if self.hub.subscriber_count:
+                try:
+                    frame = self.tick()
+                    if inspect.isawaitable(frame):
+                        frame = await frame
+                    self.hub.publish(frame)
+                    self.tick_count += 1
+                except Exception as e:
+                    logger.error(f"Simulation tick failed: {e}")
+            next_tick += self.interval
+            delay = next_tick - loop.time()
+            if delay < 0:
+                logger.debug(f"Simulation tick overran by {-delay:.3f}s")
+                self.overruns += 1
+                TICK_OVERRUNS.inc(1, self.labels)
+                next_tick = loop.time()
+                delay = 0
+            await asyncio.sleep(delay)
@@ -0,0 +1,515 @@
+import asyncio
+import json
+import logging
+import os
+import re
+import shutil
+import time
+import numpy as np
+from entities.body_system import BodySystem
+from utils.broadcast import BroadcastHub
+from utils.ephemeris import EPHEMERIS_MAX_BYTES, EphemerisCache
+from utils.events import EventDetector
+from utils.forces import KEPLER_TOLERANCE, ForceModel
+from utils.frame_protocol import FRAME_ENCODERS, Frame, static_table
+from utils.integrators import create_integrator
+from utils.json_load import load_bodies_from_json
+from utils.quality import QualityGovernor, energy_drift, source_energy
+from utils.metrics import (EVENTS, FORCE_EVALUATIONS, INTEGRATOR_STEPS, PHYSICS_STAGE_SECONDS, PHYSICS_STEP_SECONDS,
+                           TICK_JITTER_SECONDS, TICK_SECONDS)
+from utils.scene_interaction import SceneInteraction
+from utils.simulation_clock import SimulationClock
+from utils.snapshot_store import SnapshotStore
+from utils.trajectory import TrajectoryBuffer
+from utils.viewport import SCENE_CENTER
+
+logger = logging.getLogger(__name__)
+
+TRAJECTORY_LENGTH = 512
+TRAJECTORY_MIN_DISTANCE = 1e9
+EPHEMERIS_CADENCE = 3600
+SESSION_NAME = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+SCENE_FIELDS = ("scale", "pause", "time_scale", "tracked_body", "integrator", "force_mode", "theta",
+                "test_particles", "test_particle_mass", "playback", "playback_time", "playback_speed", "hybrid",
+                "kepler_tolerance", "recording", "resolve_collisions")
+
+
+def new_trajectory_buffer():
+    return TrajectoryBuffer(length=TRAJECTORY_LENGTH, min_distance=TRAJECTORY_MIN_DISTANCE)
+
+
+def default_scene(bodies, recording=False, resolve_collisions=False):
+    sun = bodies.get("Sun")
+    sun_position = sun.position if sun else np.array([0, 0], dtype=float)
+    return SceneInteraction(
+        scale=250 / 1.496e11,
+        offset=SCENE_CENTER - sun_position * (250 / 1.496e11),
+        tracked_body="Sun" if sun else None,
+        dragging=False,
+        last_mouse_pos=(0, 0),
+        pause=False,
+        time_scale=1,
+        integrator="rk4",
+        force_mode="direct",
+        theta=0.5,
+        test_particles=True,
+        test_particle_mass=0.0,
+        playback=False,
+        playback_time=0.0,
+        playback_speed=1.0,
+        hybrid=False,
+        kepler_tolerance=KEPLER_TOLERANCE,
+        recording=recording,
+        resolve_collisions=resolve_collisions
+    )
+
+
+def load_default_bodies(file_path="config/solar_system.json"):
+    try:
+        bodies = load_bodies_from_json(file_path, trajectories=new_trajectory_buffer())
+        logger.info(f"Loaded {len(bodies)} bodies from {file_path}")
+        logger.info(f"Bodies: {[body.name for body in bodies]}")
+        sun = bodies.get("Sun")
+        if sun:
+            logger.info(f"Sun position: {sun.position.tolist()}")
+        else:
+            logger.warning("Sun not found in bodies")
+        return bodies
+    except Exception as e:
+        logger.error(f"Failed to load {file_path}: {e}")
+        return BodySystem(trajectories=new_trajectory_buffer())
+
+
+class SimulationSession:
+    def __init__(self, name, bodies, physics, scene=None, dt=3600, directory="sessions",
+                 cache_directory="cache/ephemeris", interval=0.05, trace=None, record_ephemeris=False,
+                 ephemeris_max_bytes=EPHEMERIS_MAX_BYTES, resolve_collisions=False):
+        self.name = name
+        self.trace = trace
+        self.directory = os.path.join(directory, name)
+        self.physics = physics
+        self.dt = dt
+        self.scene = scene or default_scene(bodies, record_ephemeris, resolve_collisions)
+        self.ephemeris = EphemerisCache(os.path.join(cache_directory, name), cadence=EPHEMERIS_CADENCE,
+                                        max_bytes=ephemeris_max_bytes, recording=self.scene.recording)
+        self.snapshots = SnapshotStore(os.path.join(self.directory, "snapshots"))
+        self.bodies = bodies
+        self.bodies.ephemeris = self.ephemeris
+        self.ephemeris.record_state(bodies)
+        self.integrator = create_integrator(self.scene.integrator)
+        self.quality = QualityGovernor(interval)
+        self.force_model = None
+        self.tick_force_model = None
+        self.update_force_model()
+        self.events = EventDetector(resolve_collisions=self.scene.resolve_collisions)
+        self.kepler_bodies = 0
+        self.hub = BroadcastHub(FRAME_ENCODERS, labels=(name,))
+        self.views = set()
+        self.clock = SimulationClock(self.tick, self.hub, interval=interval, labels=(name,))
+        self.last_active = time.monotonic()
+        self._roster_version = None
+        self._roster = []
+
+    @property
+    def subscriber_count(self):
+        return self.hub.subscriber_count
+
+    def touch(self):
+        self.last_active = time.monotonic()
+
+    def idle_for(self):
+        return time.monotonic() - self.last_active
+
+    def update_force_model(self):
+        scene = self.scene
+        self.force_model = ForceModel(scene.force_mode, scene.theta, test_particles=scene.test_particles,
+                                      test_particle_mass=scene.test_particle_mass, hybrid=scene.hybrid,
+                                      kepler_tolerance=scene.kepler_tolerance)
+        tolerance = self.quality.tier["kepler_tolerance"]
+        if tolerance is None:
+            self.tick_force_model = self.force_model
+        else:
+            self.tick_force_model = ForceModel(scene.force_mode, scene.theta, test_particles=scene.test_particles,
+                                               test_particle_mass=scene.test_particle_mass, hybrid=True,
+                                               kepler_tolerance=max(scene.kepler_tolerance, tolerance))
+
+    def apply_quality(self):
+        self.bodies.trajectories.min_distance = TRAJECTORY_MIN_DISTANCE * self.quality.tier["trajectory_spacing"]
+        self.update_force_model()
+
+    def govern(self, tick_seconds):
+        quality = self.quality
+        if quality.observe(tick_seconds, sum(view.frame_cost / view.frame_stride for view in self.views)):
+            self.apply_quality()
+        stride = quality.tier["slow_client_stride"]
+        for view in self.views:
+            view.frame_stride = stride if view.frame_cost > quality.slow_client_seconds else 1
+
+    def set_recording(self, enabled):
+        self.scene.recording = enabled
+        self.ephemeris.recording = enabled
+        if enabled:
+            self.ephemeris.record_state(self.bodies)
+
+    def set_resolve_collisions(self, enabled):
+        self.scene.resolve_collisions = enabled
+        self.events.resolve_collisions = enabled
+
+    def set_integrator(self, name):
+        self.integrator = create_integrator(name)
+        self.scene.integrator = name
+
+    def scene_state(self):
+        state = {field: getattr(self.scene, field) for field in SCENE_FIELDS}
+        state["offset"] = self.scene.offset.tolist()
+        return state
+
+    def find_view(self, view_id):
+        return next((view for view in self.views if view.id == view_id), None)
+
+    def current_roster(self):
+        if self._roster_version != self.bodies.roster_version:
+            self._roster = static_table(self.bodies)
+            self._roster_version = self.bodies.roster_version
+        return self._roster
+
+    def build_frame(self, roster_version, roster, index_of, positions, velocities, simulation_time):
+        scene = self.scene
+        tracked_index = -1
+        if scene.tracked_body:
+            index = index_of(scene.tracked_body)
+            if index is None:
+                logger.warning(f"Tracked body {scene.tracked_body} not found")
+                scene.tracked_body = None
+            else:
+                scene.offset = SCENE_CENTER - positions[index] * scene.scale
+                tracked_index = index
+        return Frame(
+            roster_version=roster_version,
+            roster=roster,
+            positions=positions,
+            velocities=velocities,
+            scene={
+                "scale": scene.scale,
+                "offset": scene.offset.tolist(),
+                "pause": scene.pause,
+                "time_scale": scene.time_scale,
+                "tracked_body": scene.tracked_body,
+                "integrator": scene.integrator,
+                "force_mode": scene.force_mode,
+                "playback": scene.playback,
+                "time": simulation_time,
+                "quality": self.quality.tier["name"]
+            },
+            tracked_index=tracked_index,
+            timestamp=time.monotonic(),
+            index_of=index_of
+        )
+
+    def playback_frame(self):
+        scene = self.scene
+        ephemeris = self.ephemeris
+        segment, positions, velocities = ephemeris.sample(scene.playback_time)
+        if segment is None:
+            scene.playback = False
+            return None
+        frame = self.build_frame(segment.roster_version, segment.roster, segment.index_of, positions, velocities,
+                                 scene.playback_time)
+        if not scene.pause:
+            next_time = scene.playback_time + scene.playback_speed * self.dt
+            scene.playback_time = min(max(next_time, ephemeris.start_time), ephemeris.end_time)
+        return frame
+
+    def _record_physics(self, integrator, step_seconds, profile):
+        labels = (self.name, integrator)
+        PHYSICS_STEP_SECONDS.observe(step_seconds, labels)
+        if "seconds" not in profile:
+            return
+        force_seconds = profile["force_seconds"]
+        PHYSICS_STAGE_SECONDS.inc(force_seconds, labels + ("force",))
+        PHYSICS_STAGE_SECONDS.inc(max(profile["seconds"] - force_seconds, 0.0), labels + ("integrate",))
+        PHYSICS_STAGE_SECONDS.inc(profile.get("commit_seconds", 0.0), labels + ("commit",))
+        PHYSICS_STAGE_SECONDS.inc(profile.get("event_seconds", 0.0), labels + ("events",))
+        FORCE_EVALUATIONS.inc(profile["force_evaluations"], (self.name, self.force_model.mode))
+        INTEGRATOR_STEPS.inc(profile["steps"], labels)
+
+    def record_events(self, bodies, start_time, found, profile):
+        if found is None:
+            return []
+        events = self.events.record(bodies, start_time, *found, seconds=profile.get("event_seconds", 0.0))
+        if events:
+            for event in events:
+                EVENTS.inc(1, (self.name, event["kind"]))
+            if self.events.resolve(bodies, events):
+                self.ephemeris.record_state(bodies)
+        return events
+
+    async def tick(self):
+        start_time = time.perf_counter()
+        TICK_JITTER_SECONDS.observe(self.clock.jitter, (self.name,))
+        profile = {}
+        step_seconds = 0.0
+        frame = self.playback_frame() if self.scene.playback else None
+        if frame is None:
+            if not self.scene.pause:
+                effective_time_scale = min(self.scene.time_scale, 50)
+                step_factor = self.quality.step_factor
+                force_model = self.tick_force_model
+                submitted = self.integrator
+                bodies = self.bodies
+                simulation_time = bodies.time
+                energy = None
+                if self.quality.tier["max_step_factor"] > 1:
+                    energy = source_energy(force_model.source_masses(bodies), bodies.positions, bodies.velocities)
+                    if energy is None:
+                        self.quality.record_drift(None)
+                        step_factor = 1
+                advanced, history, found = await self.physics.step(bodies, self.dt * step_factor,
+                                                                   effective_time_scale / step_factor, submitted,
+                                                                   force_model, profile, self.events,
+                                                                   timescales=energy is not None)
+                if self.integrator is submitted:
+                    self.integrator = advanced
+                step_seconds = time.perf_counter() - start_time
+                self.kepler_bodies = profile.get("kepler_bodies", 0)
+                if bodies is self.bodies:
+                    if energy is not None and history:
+                        self.quality.record_drift(energy_drift(energy, source_energy(
+                            force_model.source_masses(bodies), bodies.positions, bodies.velocities)),
+                            profile.get("min_timescale"), self.dt)
+                    self.record_events(bodies, simulation_time, found, profile)
+                self._record_physics(submitted.name, step_seconds, profile)
+            bodies = self.bodies
+            positions, velocities = bodies.get_state()
+            frame = self.build_frame(bodies.roster_version, self.current_roster(), bodies.index_of, positions,
+                                     velocities, bodies.time)
+        elapsed = time.perf_counter() - start_time
+        TICK_SECONDS.observe(elapsed, (self.name,))
+        self.govern(elapsed)
+        if self.trace is not None and self.trace.enabled:
+            self.trace.record(
+                session=self.name,
+                tick=self.clock.tick_count,
+                time=frame.scene["time"],
+                jitter=self.clock.jitter,
+                tick_seconds=elapsed,
+                physics_seconds=step_seconds,
+                force_seconds=profile.get("force_seconds", 0.0),
+                force_evaluations=profile.get("force_evaluations", 0),
+                commit_seconds=profile.get("commit_seconds", 0.0),
+                event_seconds=profile.get("event_seconds", 0.0),
+                steps=profile.get("steps", 0),
+                kepler_bodies=profile.get("kepler_bodies", 0),
+                quality=self.quality.tier["name"],
+                step_factor=self.quality.step_factor,
+                bodies=len(frame.positions),
+                subscribers=self.subscriber_count,
+                dropped_frames=self.hub.dropped_frames,
+                playback=self.scene.playback
+            )
+        return frame
+
+    def replace_bodies(self, bodies):
+        bodies.roster_version = self.bodies.roster_version + 1
+        bodies.ephemeris = self.ephemeris
+        self.bodies = bodies
+        self.ephemeris.clear()
+        self.ephemeris.record_state(bodies)
+        self.events.prune(bodies)
+        self.scene.playback = False
+        self.apply_quality()
+
+    def start(self, autosave_interval=0):
+        self.clock.start()
+        if autosave_interval > 0:
+            self.snapshots.start_autosave(lambda: self.bodies, autosave_interval)
+
+    async def stop(self):
+        await self.snapshots.stop_autosave()
+        await self.clock.stop()
+        self.hub.close()
+
+    async def suspend(self):
+        await self.stop()
+        entry = await self.snapshots.save_async(self.bodies)
+        state = json.dumps(self.scene_state()).encode()
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self._write_scene, state)
+        self.ephemeris.clear()
+        logger.info(f"Session {self.name} suspended to {entry['file']}")
+
+    def _write_scene(self, state):
+        path = os.path.join(self.directory, "scene.json")
+        temporary = path + ".tmp"
+        with open(temporary, "wb") as file:
+            file.write(state)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temporary, path)
+
+    @classmethod
+    def resume(cls, name, physics, directory="sessions", **options):
+        session_directory = os.path.join(directory, name)
+        snapshots = SnapshotStore(os.path.join(session_directory, "snapshots"))
+        bodies = snapshots.load(trajectories=new_trajectory_buffer())
+        if bodies is None:
+            raise KeyError(name)
+        scene = default_scene(bodies, options.get("record_ephemeris", False), options.get("resolve_collisions", False))
+        try:
+            with open(os.path.join(session_directory, "scene.json"), "r") as file:
+                state = json.load(file)
+            for field in SCENE_FIELDS:
+                if field in state:
+                    setattr(scene, field, state[field])
+            scene.offset = np.array(state.get("offset", scene.offset), dtype=float)
+        except (OSError, ValueError):
+            logger.warning(f"Scene of session {name} not found, using defaults")
+        return cls(name, bodies, physics, scene=scene, directory=directory, **options)
+
+    def stats(self):
+        return {
+            "name": self.name,
+            "bodies": len(self.bodies),
+            "time": self.bodies.time,
+            "subscribers": self.subscriber_count,
+            "idle_seconds": self.idle_for(),
+            "pause": self.scene.pause,
+            "ephemeris_recording": self.ephemeris.recording,
+            "ephemeris_bytes": self.ephemeris.nbytes,
+            "ephemeris_disk_bytes": self.ephemeris.disk_bytes
+        }
+
+
+class SessionManager:
+    def __init__(self, physics, directory="sessions", default_name="default", default_loader=load_default_bodies,
+                 idle_timeout=600, max_active=16, autosave_interval=0, check_interval=30, **session_options):
+        self.physics = physics
+        self.default_loader = default_loader
+        self.directory = directory
+        self.default_name = default_name
+        self.idle_timeout = idle_timeout
+        self.max_active = max_active
+        self.autosave_interval = autosave_interval
+        self.check_interval = check_interval
+        self.session_options = session_options
+        self.sessions = {}
+        self.evictions = 0
+        self.resumes = 0
+        self._lock = asyncio.Lock()
+        self._task = None
+        os.makedirs(directory, exist_ok=True)
+
+    def suspended_names(self):
+        names = []
+        for name in sorted(os.listdir(self.directory)):
+            if name not in self.sessions and os.path.exists(os.path.join(self.directory, name, "scene.json")):
+                names.append(name)
+        return names
+
+    def _activate(self, session):
+        self.sessions[session.name] = session
+        session.start(self.autosave_interval)
+        return session
+
+    async def _make_room(self):
+        while len(self.sessions) >= self.max_active:
+            idle = [session for session in self.sessions.values() if session.subscriber_count == 0]
+            if not idle:
+                raise RuntimeError("Too many active sessions")
+            await self._suspend(min(idle, key=lambda session: session.last_active))
+
+    async def create(self, name, bodies):
+        async with self._lock:
+            if name in self.sessions or name in self.suspended_names():
+                raise ValueError(f"Session {name} already exists")
+            await self._make_room()
+            session = SimulationSession(name, bodies, self.physics, directory=self.directory,
+                                        **self.session_options)
+            logger.info(f"Session {name} created with {len(bodies)} bodies")
+            return self._activate(session)
+
+    async def get(self, name):
+        session = self.sessions.get(name)
+        if session is not None:
+            return session
+        async with self._lock:
+            session = self.sessions.get(name)
+            if session is not None:
+                return session
+            if name in self.suspended_names():
+                await self._make_room()
+                loop = asyncio.get_running_loop()
+                session = await loop.run_in_executor(None, lambda: SimulationSession.resume(
+                    name, self.physics, directory=self.directory, **self.session_options))
+                self.resumes += 1
+                logger.info(f"Session {name} resumed at t={session.bodies.time}")
+                return self._activate(session)
+            if name == self.default_name:
+                await self._make_room()
+                session = SimulationSession(name, self.default_loader(), self.physics, directory=self.directory,
+                                            **self.session_options)
+                return self._activate(session)
+        raise KeyError(name)
+
+    async def _suspend(self, session):
+        self.sessions.pop(session.name, None)
+        await session.suspend()
+        self.evictions += 1
+
+    async def suspend(self, name):
+        async with self._lock:
+            session = self.sessions.get(name)
+            if session is None:
+                raise KeyError(name)
+            await self._suspend(session)
+
+    async def delete(self, name):
+        async with self._lock:
+            session = self.sessions.pop(name, None)
+            if session is not None:
+                await session.stop()
+                session.ephemeris.clear()
+            elif name not in self.suspended_names():
+                raise KeyError(name)
+            shutil.rmtree(os.path.join(self.directory, name), ignore_errors=True)
+            logger.info(f"Session {name} deleted")
+
+    async def evict_idle(self):
+        async with self._lock:
+            for session in list(self.sessions.values()):
+                if session.subscriber_count == 0 and session.idle_for() > self.idle_timeout:
+                    await self._suspend(session)
+
+    def start(self):
+        if self._task is not None and not self._task.done():
+            return
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        for session in list(self.sessions.values()):
+            await session.stop()
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.check_interval)
+            try:
+                await self.evict_idle()
+            except Exception as e:
+                logger.error(f"Session eviction failed: {e}")
+
+    def stats(self):
+        return {
+            "active": [session.stats() for session in self.sessions.values()],
+            "suspended": self.suspended_names(),
+            "max_active": self.max_active,
+            "idle_timeout": self.idle_timeout,
+            "evictions": self.evictions,
+            "resumes": self.resumes
+        }
@@ -0,0 +1,162 @@
+import asyncio
+import json
+import logging
+import os
+import time
+import numpy as np
+from utils.json_load import BODY_TYPES, build_bodies, validate_records
+
+logger = logging.getLogger(__name__)
+
+NUMERIC_FIELDS = ("mass", "position", "velocity")
+
+
+def _replace_atomically(path, write):
+    temporary = path + ".tmp"
+    with open(temporary, "wb") as file:
+        write(file)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(temporary, path)
+
+
+def capture_snapshot(bodies):
+    positions, velocities = bodies.get_state()
+    records = [{key: value for key, value in record.items() if key not in NUMERIC_FIELDS}
+               for record in bodies.to_records()]
+    return {
+        "time": np.float64(bodies.time),
+        "roster_version": np.int64(bodies.roster_version),
+        "masses": bodies.masses.copy(),
+        "positions": positions,
+        "velocities": velocities,
+        "records": np.asarray(json.dumps(records))
+    }
+
+
+def load_bodies_from_snapshot(file_path, trajectories=None, ephemeris=None):
+    with np.load(file_path, allow_pickle=False) as data:
+        records = json.loads(str(data["records"]))
+        masses = data["masses"]
+        positions = data["positions"]
+        velocities = data["velocities"]
+        snapshot_time = float(data["time"])
+    keep = np.array([record.get("type") in BODY_TYPES for record in records], dtype=bool)
+    records = validate_records([dict(record, mass=None, position=None, velocity=None)
+                                for record, known in zip(records, keep) if known])
+    masses, positions, velocities = masses[keep], positions[keep], velocities[keep]
+    bodies = build_bodies(records, masses, positions, velocities, trajectories, ephemeris)
+    bodies.time = snapshot_time
+    return bodies
+
+
+class SnapshotStore:
+    def __init__(self, directory, keep=100):
+        self.directory = directory
+        self.keep = keep
+        self.saves = 0
+        self._lock = asyncio.Lock()
+        self._autosave_task = None
+        self._last_saved = None
+        os.makedirs(directory, exist_ok=True)
+        self.manifest_path = os.path.join(directory, "manifest.json")
+        self.manifest = self._read_manifest()
+
+    def _read_manifest(self):
+        try:
+            with open(self.manifest_path, "r") as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return {"snapshots": []}
+
+    def _write_manifest(self):
+        payload = json.dumps(self.manifest, separators=(",", ":")).encode()
+        _replace_atomically(self.manifest_path, lambda file: file.write(payload))
+
+    @property
+    def snapshots(self):
+        return self.manifest["snapshots"]
+
+    def path_of(self, name=None):
+        if not self.snapshots:
+            return None
+        if name is None or name == "latest":
+            name = self.snapshots[-1]["file"]
+        if not any(entry["file"] == name for entry in self.snapshots):
+            return None
+        return os.path.join(self.directory, name)
+
+    def _write(self, snapshot):
+        serial = self.snapshots[-1]["serial"] + 1 if self.snapshots else 1
+        name = f"snapshot_{serial:06d}.npz"
+        _replace_atomically(os.path.join(self.directory, name), lambda file: np.savez(file, **snapshot))
+        entry = {
+            "serial": serial,
+            "file": name,
+            "time": float(snapshot["time"]),
+            "bodies": len(snapshot["masses"]),
+            "created": time.time()
+        }
+        self.snapshots.append(entry)
+        expired = self.snapshots[:-self.keep] if self.keep else []
+        del self.snapshots[:len(expired)]
+        self._write_manifest()
+        for old in expired:
+            try:
+                os.remove(os.path.join(self.directory, old["file"]))
+            except OSError:
+                pass
+        self.saves += 1
+        return entry
+
+    async def save_async(self, bodies):
+        snapshot = capture_snapshot(bodies)
+        state = (bodies.time, bodies.roster_version)
+        async with self._lock:
+            loop = asyncio.get_running_loop()
+            entry = await loop.run_in_executor(None, self._write, snapshot)
+        self._last_saved = state
+        return entry
+
+    def load(self, name=None, trajectories=None, ephemeris=None):
+        path = self.path_of(name)
+        if path is None:
+            return None
+        return load_bodies_from_snapshot(path, trajectories=trajectories, ephemeris=ephemeris)
+
+    def start_autosave(self, bodies, interval):
+        if self._autosave_task is not None and not self._autosave_task.done():
+            return
+        self._autosave_task = asyncio.create_task(self._autosave(bodies, interval))
+        logger.info(f"Autosave started every {interval:.0f}s")
+
+    async def stop_autosave(self):
+        if self._autosave_task is None:
+            return
+        self._autosave_task.cancel()
+        try:
+            await self._autosave_task
+        except asyncio.CancelledError:
+            pass
+        self._autosave_task = None
+
+    async def _autosave(self, bodies, interval):
+        while True:
+            await asyncio.sleep(interval)
+            system = bodies() if callable(bodies) else bodies
+            if (system.time, system.roster_version) == self._last_saved:
+                continue
+            try:
+                entry = await self.save_async(system)
+                logger.info(f"Autosaved {entry['file']} at t={entry['time']}")
+            except Exception as e:
+                logger.error(f"Autosave failed: {e}")
+
+    def stats(self):
+        return {
+            "directory": self.directory,
+            "saves": self.saves,
+            "keep": self.keep,
+            "autosave": self._autosave_task is not None and not self._autosave_task.done(),
+            "snapshots": self.snapshots
+        }
@@ -0,0 +1,129 @@
+import numpy as np
+
+
+class TrajectoryBuffer:
+    def __init__(self, length=512, min_distance=0.0, min_interval=0.0, capacity=16):
+        self.length = length
+        self.min_distance = min_distance
+        self.min_interval = min_interval
+        self.points = np.zeros((capacity, length, 2))
+        self.times = np.zeros((capacity, length))
+        self.heads = np.zeros(capacity, dtype=np.int64)
+        self.counts = np.zeros(capacity, dtype=np.int64)
+
+    @property
+    def nbytes(self):
+        return self.points.nbytes + self.times.nbytes + self.heads.nbytes + self.counts.nbytes
+
+    def reserve(self, capacity):
+        if capacity <= len(self.heads):
+            return
+        points = np.zeros((capacity, self.length, 2))
+        times = np.zeros((capacity, self.length))
+        heads = np.zeros(capacity, dtype=np.int64)
+        counts = np.zeros(capacity, dtype=np.int64)
+        size = len(self.heads)
+        points[:size] = self.points
+        times[:size] = self.times
+        heads[:size] = self.heads
+        counts[:size] = self.counts
+        self.points, self.times, self.heads, self.counts = points, times, heads, counts
+
+    def reset(self, index):
+        self.heads[index] = 0
+        self.counts[index] = 0
+
+    def remove(self, index, count):
+        for array in (self.points, self.times, self.heads, self.counts):
+            array[index:count - 1] = array[index + 1:count]
+        self.reset(count - 1)
+
+    def _last(self, count):
+        last = (self.heads[:count] - 1) % self.length
+        rows = np.arange(count)
+        return self.points[rows, last], self.times[rows, last]
+
+    def record(self, positions, time):
+        self.record_many(positions[np.newaxis], [time])
+
+    def _crossed(self, progress, spacing):
+        marks = np.floor(progress / spacing)
+        return np.diff(marks, axis=0, prepend=0.0) > 0
+
+    def _stride(self, positions, times):
+        steps = len(positions)
+        if steps < 3 or (self.min_distance <= 0 and self.min_interval <= 0):
+            return 1
+        stride = steps
+        if self.min_distance > 0:
+            moved = positions[-1] - positions[-2]
+            fastest = float(np.sqrt(np.einsum("ij,ij->i", moved, moved).max(initial=0.0)))
+            if fastest > 0:
+                stride = min(stride, int(self.min_distance // fastest))
+        if self.min_interval > 0:
+            stride = min(stride, int(self.min_interval // max(float(np.diff(times).max()), 1e-300)))
+        return max(stride, 1)
+
+    def record_many(self, positions, times):
+        steps, count = positions.shape[:2]
+        if count == 0 or steps == 0:
+            return
+        times = np.asarray(times, dtype=float)
+        stride = self._stride(positions, times)
+        if stride > 1:
+            selected = np.unique(np.append(np.arange(steps - 1, -1, -stride), 0))
+            positions, times = positions[selected], times[selected]
+            steps = len(selected)
+        empty = self.counts[:count] == 0
+        mask = np.ones((steps, count), dtype=bool)
+        if self.min_distance > 0 or self.min_interval > 0:
+            last_points, last_times = self._last(count)
+            if self.min_distance > 0:
+                moved = np.empty_like(positions)
+                np.subtract(positions[0], last_points, out=moved[0])
+                np.subtract(positions[1:], positions[:-1], out=moved[1:])
+                lengths = np.sqrt(np.einsum("sij,sij->si", moved, moved))
+                lengths[0, empty] = 0.0
+                mask &= self._crossed(np.cumsum(lengths, axis=0, out=lengths), self.min_distance)
+            if self.min_interval > 0:
+                last_times = np.where(empty, times[0], last_times)
+                mask &= self._crossed(times[:, np.newaxis] - last_times, self.min_interval)
+        mask[0, empty] = True
+        rows, columns = np.nonzero(mask.T)
+        if len(rows) == 0:
+            return
+        recorded = np.bincount(rows, minlength=count)
+        rank = np.arange(len(rows)) - (np.cumsum(recorded) - recorded)[rows]
+        keep = rank >= recorded[rows] - self.length
+        rows, columns, rank = rows[keep], columns[keep], rank[keep]
+        slots = (self.heads[rows] + rank) % self.length
+        self.points[rows, slots] = positions[columns, rows]
+        self.times[rows, slots] = times[columns]
+        self.heads[:count] = (self.heads[:count] + recorded) % self.length
+        self.counts[:count] = np.minimum(self.counts[:count] + recorded, self.length)
+
+    def segments(self, index):
+        count = int(self.counts[index])
+        head = int(self.heads[index])
+        start = (head - count) % self.length
+        if start + count <= self.length:
+            return [slice(start, start + count)]
+        return [slice(start, self.length), slice(0, head)]
+
+    def view(self, index, since=None, max_points=None):
+        segments = self.segments(index)
+        if len(segments) == 1:
+            points = self.points[index, segments[0]]
+            times = self.times[index, segments[0]]
+        else:
+            points = np.concatenate([self.points[index, segment] for segment in segments])
+            times = np.concatenate([self.times[index, segment] for segment in segments])
+        if since is not None:
+            first = np.searchsorted(times, since, side="right")
+            points = points[first:]
+            times = times[first:]
+        if max_points is not None and len(points) > max_points > 0:
+            stride = -(-len(points) // max_points)
+            points = points[::-stride][::-1]
+            times = times[::-stride][::-1]
+        return points, times
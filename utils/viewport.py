@@ -0,0 +1,187 @@
+import itertools
+import logging
+import math
+import numpy as np
+from utils.frame_protocol import Frame
+
+logger = logging.getLogger(__name__)
+
+VIEW_WIDTH = 1920
+VIEW_HEIGHT = 960
+VIEW_MARGIN = 64
+MIN_PIXELS = 1.0
+MAX_VIEW_SIZE = 16384
+SCENE_CENTER = np.array([VIEW_WIDTH / 2, VIEW_HEIGHT / 2])
+_view_ids = itertools.count(1)
+
+
+class SpatialIndex:
+    def __init__(self, positions, priorities):
+        self.positions = positions
+        self.priorities = priorities
+        self.order = np.argsort(positions[:, 0], kind="stable")
+        self.xs = positions[self.order, 0]
+
+    def query(self, low, high):
+        start = int(np.searchsorted(self.xs, low[0], side="left"))
+        stop = int(np.searchsorted(self.xs, high[0], side="right"))
+        candidates = self.order[start:stop]
+        ys = self.positions[candidates, 1]
+        return candidates[(ys >= low[1]) & (ys <= high[1])]
+
+
+def spatial_index(frame):
+    if frame.spatial_index is None:
+        priorities = np.fromiter((entry["radius"] for entry in frame.roster), dtype=float, count=len(frame.roster))
+        frame.spatial_index = SpatialIndex(frame.positions, priorities)
+    return frame.spatial_index
+
+
+def _positive(value, name):
+    value = float(value)
+    if not math.isfinite(value) or value <= 0:
+        raise ValueError(f"{name} must be a positive number")
+    return value
+
+
+def _finite(value, name):
+    value = float(value)
+    if not math.isfinite(value):
+        raise ValueError(f"{name} must be a finite number")
+    return value
+
+
+class ClientView:
+    def __init__(self, scale, offset, tracked_body=None, width=VIEW_WIDTH, height=VIEW_HEIGHT, margin=VIEW_MARGIN,
+                 min_pixels=MIN_PIXELS):
+        self.id = next(_view_ids)
+        self.scale = scale
+        self.offset = np.array(offset, dtype=float)
+        self.tracked_body = tracked_body
+        self.width = width
+        self.height = height
+        self.margin = margin
+        self.min_pixels = min_pixels
+        self.sent = 0
+        self.culled = 0
+        self.frames = 0
+        self.send_seconds = 0.0
+        self.frame_cost = 0.0
+        self.frame_stride = 1
+        self.skipped = 0
+        self._ticks = 0
+
+    @classmethod
+    def from_scene(cls, scene, **options):
+        view = cls(scene.scale, scene.offset, scene.tracked_body, **options)
+        view.offset += view.center - SCENE_CENTER
+        return view
+
+    @property
+    def center(self):
+        return np.array([self.width / 2, self.height / 2])
+
+    def apply(self, message):
+        kind = message.get("type")
+        if kind == "pan":
+            self.offset[0] += _finite(message["dx"], "dx")
+            self.offset[1] += _finite(message["dy"], "dy")
+        elif kind == "zoom":
+            self.scale *= _positive(message["factor"], "factor")
+        elif kind == "track":
+            self.tracked_body = str(message["body"])
+        elif kind == "untrack":
+            self.tracked_body = None
+        elif kind == "resize":
+            center = self.center
+            self.width = min(_positive(message["width"], "width"), MAX_VIEW_SIZE)
+            self.height = min(_positive(message["height"], "height"), MAX_VIEW_SIZE)
+            self.offset += self.center - center
+        else:
+            raise ValueError(f"Unknown view message {kind}")
+
+    def _follow(self, frame):
+        if self.tracked_body is None:
+            return -1
+        index = frame.index_of(self.tracked_body) if frame.index_of else None
+        if index is None:
+            logger.warning(f"Tracked body {self.tracked_body} not found")
+            self.tracked_body = None
+            return -1
+        self.offset = self.center - frame.positions[index] * self.scale
+        return index
+
+    def visible(self, frame, tracked_index=-1):
+        index = spatial_index(frame)
+        low = (-self.margin - self.offset) / self.scale
+        high = (np.array([self.width, self.height]) + self.margin - self.offset) / self.scale
+        candidates = index.query(low, high)
+        if self.min_pixels > 0 and len(candidates):
+            screen = frame.positions[candidates] * self.scale + self.offset + self.margin
+            cells = np.maximum(np.floor(screen / self.min_pixels), 0).astype(np.int64)
+            rows = int((self.height + 2 * self.margin) / self.min_pixels) + 2
+            keys = cells[:, 0] * rows + cells[:, 1]
+            order = np.argsort(-index.priorities[candidates], kind="stable")
+            _, first = np.unique(keys[order], return_index=True)
+            candidates = candidates[order[first]]
+        if tracked_index >= 0:
+            candidates = np.append(candidates, tracked_index)
+        return np.unique(candidates)
+
+    def frame(self, frame):
+        tracked_index = self._follow(frame)
+        key = (self.scale, float(self.offset[0]), float(self.offset[1]), tracked_index, self.width, self.height,
+               self.margin, self.min_pixels)
+        view_frame = frame.views.get(key)
+        if view_frame is None:
+            indices = self.visible(frame, tracked_index)
+            local_tracked = int(np.searchsorted(indices, tracked_index)) if tracked_index >= 0 else -1
+            if len(indices) == len(frame.positions):
+                indices = None
+            view_frame = Frame(
+                roster_version=frame.roster_version,
+                roster=frame.roster,
+                positions=frame.positions if indices is None else frame.positions[indices],
+                velocities=frame.velocities if indices is None else frame.velocities[indices],
+                scene=dict(frame.scene, scale=self.scale, offset=self.offset.tolist(),
+                           tracked_body=self.tracked_body),
+                tracked_index=local_tracked,
+                timestamp=frame.timestamp,
+                indices=indices,
+                index_of=frame.index_of
+            )
+            frame.views[key] = view_frame
+        self.sent += len(view_frame.positions)
+        self.culled += len(frame.positions) - len(view_frame.positions)
+        return view_frame
+
+    def due(self):
+        self._ticks += 1
+        if self._ticks % self.frame_stride == 0:
+            return True
+        self.skipped += 1
+        return False
+
+    def record_send(self, seconds):
+        self.frames += 1
+        self.send_seconds += seconds
+
+    def record_cost(self, seconds, smoothing=0.2):
+        self.frame_cost += (seconds - self.frame_cost) * smoothing
+
+    def stats(self):
+        return {
+            "id": self.id,
+            "scale": self.scale,
+            "offset": self.offset.tolist(),
+            "tracked_body": self.tracked_body,
+            "width": self.width,
+            "height": self.height,
+            "sent": self.sent,
+            "culled": self.culled,
+            "frames": self.frames,
+            "send_seconds": self.send_seconds,
+            "frame_cost": self.frame_cost,
+            "frame_stride": self.frame_stride,
+            "skipped": self.skipped
+        }